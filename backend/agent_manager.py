@@ -1,4 +1,4 @@
-import json
+import asyncio
 import os
 
 # Import all agents including the new Lead Agent
@@ -6,101 +6,178 @@ from agents.creative_agent import creative_agent
 from agents.finance_agent import finance_agent
 from agents.inventory_agent import inventory_agent
 from agents.lead_agent import lead_agent
+from campaign_context import build_campaign_context
+from data_store import budget_file
+from llm_client import gemini_available
+from llm_executor import run_blocking
+from websocket_manager import ws_manager
 
-def run_agents(query, product):
-    """Enhanced agent manager with Lead Agent coordination"""
-    
-    print(f"🚀 Starting agent manager for: {query} - {product}")
-    
-    # Setup data directories
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    data_dir = os.path.join(base_dir, "data")
-    os.makedirs(data_dir, exist_ok=True)
-    
-    budget_path = os.path.join(data_dir, "budget.json")
-    inventory_path = os.path.join(data_dir, "inventory.json")
-    
-    # Create default files if they don't exist
-    if not os.path.exists(budget_path):
-        with open(budget_path, "w") as f:
-            json.dump({"total_budget": 15000}, f)
-    
-    if not os.path.exists(inventory_path):
-        with open(inventory_path, "w") as f:
-            json.dump({
-                "items": [
-                    {"product": "Wireless Headphones", "stock": 250, "regions": 4},
-                    {"product": "Smart Watch", "stock": 180, "regions": 3},
-                    {"product": "Bluetooth Speaker", "stock": 320, "regions": 5},
-                    {"product": "Inox Bottle", "stock": 400, "regions": 6}
-                ]
-            }, f)
-    
-    # Load data safely
+# Execution mode per request (default from AGENT_MODE):
+#   llm          - Gemini narrative, rule-based output only as a fallback
+#   fast         - rule-based output only, no LLM calls
+#   fast_narrate - rule-based output now; Gemini narratives are pushed to the
+#                  WebSocket client as agent_narrative messages afterwards
+AGENT_MODES = ("llm", "fast", "fast_narrate")
+AGENT_MODE = os.getenv("AGENT_MODE", "llm")
+# Agents that always take the rule-based path, e.g. AGENT_FAST_AGENTS=finance,inventory
+AGENT_FAST_AGENTS = frozenset(
+    name.strip().lower() for name in os.getenv("AGENT_FAST_AGENTS", "").split(",") if name.strip()
+)
+AGENT_KEYS = frozenset(("creative", "finance", "inventory", "lead"))
+
+# Background narrative tasks (kept referenced until they finish)
+_narrative_tasks = set()
+
+def fast_agents_for(mode):
+    """Agents that skip the LLM under a mode"""
+    if mode not in AGENT_MODES:
+        raise ValueError(f"mode must be one of {', '.join(AGENT_MODES)}")
+    return AGENT_KEYS if mode != "llm" else AGENT_FAST_AGENTS
+
+async def run_agent_safely(name, icon, agent_fn, args, fallback, stream=None, fast=False):
+    """Run a blocking agent off the event loop, returning its fallback on error.
+
+    With a client stream, status changes, LLM tokens and the final output
+    are pushed to that client as they happen. A fast agent makes no LLM
+    calls, so it runs on a worker thread (it still reads data files) rather
+    than taking an LLM executor slot.
+    """
+    agent_key = name.lower()
+    kwargs = {}
+    if stream:
+        stream.agent_status(agent_key, "working", 10, f"Running {name} Agent...")
+        if not fast:
+            kwargs["on_token"] = stream.token_callback(agent_key)
     try:
-        with open(budget_path) as f:
-            budget_data = json.load(f)
-        with open(inventory_path) as f:
-            inventory_data = json.load(f)
+        print(f"{icon} Running {name} Agent{' (fast)' if fast else ''}...")
+        if fast:
+            result = await asyncio.to_thread(agent_fn, *args, fast=True)
+        else:
+            result = await run_blocking(agent_fn, *args, **kwargs)
+        print(f"✅ {name} completed: {len(result)} chars")
+        status = "completed"
     except Exception as e:
-        print(f"Error loading data: {e}")
-        budget_data = {"total_budget": 15000}
-        inventory_data = {"items": [{"product": product, "stock": 300, "regions": 4}]}
+        print(f"❌ {name} Agent Error: {e}")
+        result = fallback
+        status = "fallback"
+    if stream:
+        stream.agent_result(agent_key, result)
+        stream.agent_status(agent_key, status, 100, f"{name} Agent finished")
+    return result
+
+def run_agents(query, product, mode=None):
+    """Synchronous entry point for scripts - wraps run_agents_async"""
+    return asyncio.run(run_agents_async(query, product, mode=mode))
+
+async def run_agents_async(query, product, client_id=None, mode=None):
+    """Enhanced agent manager with Lead Agent coordination.
+
+    Pass the WebSocket client_id of the caller to stream progress and
+    partial agent output to it while the campaign runs. mode is one of
+    AGENT_MODES (default AGENT_MODE).
+    """
+    
+    mode = mode or AGENT_MODE
+    fast_agents = fast_agents_for(mode)
+    print(f"🚀 Starting agent manager for: {query} - {product} ({mode})")
+    
+    # Cached, immutable snapshots - files are only re-read when they change on disk
+    budget_data = (await asyncio.to_thread(budget_file.snapshot)).data
     
     budget = budget_data.get("total_budget", 15000)
     
-    # Run all 4 agents with proper error handling
+    stream = ws_manager.open_stream(client_id) if client_id else None
     try:
-        print("🎨 Running Creative Agent...")
-        creative = creative_agent(query, product)
-        print(f"✅ Creative completed: {len(creative)} chars")
-    except Exception as e:
-        print(f"❌ Creative Agent Error: {e}")
-        creative = f"🎨 **CREATIVE STRATEGY**\n\nPremium {product} campaign targeting tech professionals.\n\n**Key Metrics:**\n• Target Reach: 45,000+ prospects\n• Timeline: 4-6 weeks"
+        result, context = await _run_pipeline(query, product, budget, stream, fast_agents)
+    finally:
+        if stream:
+            await stream.close()
     
-    try:
-        print("💰 Running Finance Agent...")
-        finance = finance_agent(query, product)
-        print(f"✅ Finance completed: {len(finance)} chars")
-    except Exception as e:
-        print(f"❌ Finance Agent Error: {e}")
-        finance = f"💰 **FINANCIAL ANALYSIS**\n\nBudget approved: ${budget:,}\n\n**ROI:** 3.2x expected"
+    print("✅ All 4 agents completed!")
+    print(f"📊 Result keys: {list(result.keys())}")
+    for key, value in result.items():
+        print(f"  {key}: {len(str(value))} chars")
     
-    try:
-        print("📦 Running Inventory Agent...")
-        inventory = inventory_agent(query, product)
-        print(f"✅ Inventory completed: {len(inventory)} chars")
-    except Exception as e:
-        print(f"❌ Inventory Agent Error: {e}")
-        inventory = f"📦 **INVENTORY STATUS**\n\nStock sufficient for campaign.\n\n**Status:** 🟢 EXCELLENT"
+    if mode == "fast_narrate":
+        if client_id and gemini_available():
+            task = asyncio.create_task(_narrate(client_id, query, product, context, result))
+            _narrative_tasks.add(task)
+            task.add_done_callback(_narrative_tasks.discard)
+        else:
+            print("⚠️ No WebSocket client or Gemini - skipping narratives")
     
-    try:
-        print("🎯 Running Lead Agent...")
-        lead = lead_agent(query, product, creative, finance, inventory)
-        print(f"✅ Lead completed: {len(lead)} chars")
-    except Exception as e:
-        print(f"❌ Lead Agent Error: {e}")
-        lead = f"🎯 **LEAD AGENT - COORDINATION**\n\n🟢 APPROVED FOR LAUNCH\n\nAll agents coordinated successfully."
+    return result
+
+async def _run_pipeline(query, product, budget, stream, fast_agents=frozenset()):
+    """Fan out the independent agents, then coordinate with the Lead Agent"""
+    if stream:
+        stream.collaboration_event("campaign_started", {"query": query, "product": product})
+    
+    # One retrieval + segmentation per request, shared by every agent and the final plan
+    context = await asyncio.to_thread(build_campaign_context, query, product, budget)
+    if stream:
+        stream.collaboration_event("context_ready", context.to_dict())
+    
+    # Creative, Finance and Inventory are independent - run them concurrently
+    creative, finance, inventory = await asyncio.gather(
+        run_agent_safely(
+            "Creative", "🎨", creative_agent, (query, product, context),
+            f"🎨 **CREATIVE STRATEGY**\n\nPremium {product} campaign targeting {context.primary_audience}.\n\n**Key Metrics:**\n• Target Reach: {context.estimated_reach:,}+ prospects\n• Timeline: 4-6 weeks",
+            stream, "creative" in fast_agents
+        ),
+        run_agent_safely(
+            "Finance", "💰", finance_agent, (query, product, context),
+            f"💰 **FINANCIAL ANALYSIS**\n\nBudget approved: ${budget:,}\n\n**ROI:** 3.2x expected",
+            stream, "finance" in fast_agents
+        ),
+        run_agent_safely(
+            "Inventory", "📦", inventory_agent, (query, product, context),
+            f"📦 **INVENTORY STATUS**\n\nStock sufficient for campaign.\n\n**Status:** 🟢 EXCELLENT",
+            stream, "inventory" in fast_agents
+        ),
+    )
+    
+    # Lead Agent needs all three reports, so it runs once they are in
+    lead = await run_agent_safely(
+        "Lead", "🎯", lead_agent, (query, product, creative, finance, inventory, context),
+        f"🎯 **LEAD AGENT - COORDINATION**\n\n🟢 APPROVED FOR LAUNCH\n\nAll agents coordinated successfully.",
+        stream, "lead" in fast_agents
+    )
     
     # Generate final plan
-    final_plan = generate_final_plan(creative, finance, inventory, query, product, budget)
+    final_plan = generate_final_plan(creative, finance, inventory, query, product, budget, context)
     
-    result = {
+    if stream:
+        stream.collaboration_event("campaign_completed", {"final_plan": final_plan})
+    
+    return {
         "Creative": creative,
         "Finance": finance, 
         "Inventory": inventory,
         "Lead": lead,
         "Final Plan": final_plan
-    }
-    
-    print("✅ All 4 agents completed!")
-    print(f"📊 Result keys: {list(result.keys())}")
-    for key, value in result.items():
-        print(f"  {key}: {len(str(value))} chars")
-    
-    return result
+    }, context
 
-def generate_final_plan(creative, finance, inventory, query, product, budget):
+async def _narrate(client_id, query, product, context, result):
+    """Generate Gemini narratives after a fast run and push each one to the client as it lands"""
+    async def narrate(agent_key, agent_fn, args):
+        try:
+            output = await run_blocking(agent_fn, *args)
+        except Exception as e:
+            print(f"❌ {agent_key} narrative failed: {e}")
+            return result[agent_key.capitalize()]
+        await ws_manager.send_to_client(client_id, {"type": "agent_narrative", "agent": agent_key, "output": output})
+        return output
+    
+    creative, finance, inventory = await asyncio.gather(
+        narrate("creative", creative_agent, (query, product, context)),
+        narrate("finance", finance_agent, (query, product, context)),
+        narrate("inventory", inventory_agent, (query, product, context)),
+    )
+    await narrate("lead", lead_agent, (query, product, creative, finance, inventory, context))
+    await ws_manager.send_to_client(client_id, {"type": "narrative_completed"})
+
+def generate_final_plan(creative, finance, inventory, query, product, budget, context=None):
     """Generate final plan"""
     has_approved = "approved" in finance.lower()
     has_stock = "EXCELLENT" in inventory or "sufficient" in inventory.lower()
@@ -112,8 +189,12 @@ def generate_final_plan(creative, finance, inventory, query, product, budget):
         status = "⚠️ REVIEW NEEDED"
         action = "Address issues first"
     
+    audience = ""
+    if context:
+        audience = f"\n👥 Target Reach: {context.estimated_reach:,} ({context.projected_conversions:,} projected conversions, {context.primary_audience})"
+    
     return f"""{status} - {query}
 
-💰 Budget: ${budget:,}
+💰 Budget: ${budget:,}{audience}
 🚀 Status: {action}
 📊 Expected ROI: 3.2x in 3-4 months"""
@@ -1,29 +1,16 @@
-import os
-from dotenv import load_dotenv
-import google.generativeai as genai
-from google.generativeai.generative_models import GenerativeModel
-
-load_dotenv()
-
-try:
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-    GEMINI_AVAILABLE = True
-    print("✅ Gemini AI configured successfully")
-except Exception as e:
-    GEMINI_AVAILABLE = False
-    print(f"⚠️ Gemini AI not available: {e}")
-
-def creative_agent(query, product):
+from llm_client import gemini_available, generate_text
+
+def creative_agent(query, product, context=None, on_token=None, fast=False):
     """Enhanced Creative Agent - CONCISE VERSION"""
     
     print(f"🎨 Creative Agent processing: {query} for {product}")
+    reach = context.estimated_reach if context else 45000
     
-    if GEMINI_AVAILABLE:
+    if not fast and gemini_available():
         try:
-            model = GenerativeModel('gemini-2.0-flash')
-            
+            audience = f"\n{context.prompt_summary()}" if context else ""
             prompt = f"""Product: {product}
-Campaign Goal: {query}
+Campaign Goal: {query}{audience}
 
 Create a CONCISE marketing strategy in exactly 3 sentences covering:
 1. Campaign theme and target audience  
@@ -32,21 +19,23 @@ Create a CONCISE marketing strategy in exactly 3 sentences covering:
 
 Be specific and data-driven."""
             
-            response = model.generate_content(prompt)
-            if response and response.text:
-                ai_suggestion = response.text.strip()
+            ai_suggestion = generate_text('gemini-2.0-flash', prompt, on_token=on_token)
+            if ai_suggestion:
                 print(f"✅ Gemini response received: {len(ai_suggestion)} chars")
-                return format_creative_output_concise(ai_suggestion)
+                return format_creative_output_concise(ai_suggestion, reach)
         except Exception as e:
             print(f"Gemini error: {e}")
 
     # Concise fallback
     print("📋 Using fallback creative strategy")
-    fallback_strategy = f"""Launch premium {product} campaign targeting tech professionals aged 25-35 with personalized messaging and 15% early-adopter discount. Deploy through LinkedIn, Instagram, and email marketing with A/B testing for optimization. Expected reach: 45,000+ prospects with 2.5-4% conversion rate generating 150+ qualified leads."""
+    if context:
+        fallback_strategy = f"""Launch premium {product} campaign targeting {context.primary_audience} (avg age {context.avg_age}) with personalized messaging and 15% early-adopter discount. Deploy through LinkedIn, Instagram, and email marketing with A/B testing for optimization. Expected reach: {reach:,}+ prospects with {context.conversion_rate:.1%} conversion rate generating {context.projected_conversions:,}+ qualified leads."""
+    else:
+        fallback_strategy = f"""Launch premium {product} campaign targeting tech professionals aged 25-35 with personalized messaging and 15% early-adopter discount. Deploy through LinkedIn, Instagram, and email marketing with A/B testing for optimization. Expected reach: 45,000+ prospects with 2.5-4% conversion rate generating 150+ qualified leads."""
     
-    return format_creative_output_concise(fallback_strategy)
+    return format_creative_output_concise(fallback_strategy, reach)
 
-def format_creative_output_concise(content):
+def format_creative_output_concise(content, reach=45000):
     """Format creative output - CONCISE VERSION"""
     
     formatted_output = f"""🎨 **CREATIVE STRATEGY**
@@ -54,7 +43,7 @@ def format_creative_output_concise(content):
 {content}
 
 **Key Metrics:**
-• Target Reach: 45,000+ prospects  
+• Target Reach: {reach:,}+ prospects  
 • Conversion Rate: 2.5-4%
 • Timeline: 4-6 weeks"""
 
@@ -1,19 +1,6 @@
-import os
-from dotenv import load_dotenv
-import google.generativeai as genai
-from google.generativeai.generative_models import GenerativeModel
+from llm_client import gemini_available, generate_text
 
-load_dotenv()
-
-try:
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-    GEMINI_AVAILABLE = True
-    print("✅ Gemini AI configured for Finance Agent")
-except Exception as e:
-    GEMINI_AVAILABLE = False
-    print(f"⚠️ Gemini AI not available: {e}")
-
-def finance_agent(query, product):
+def finance_agent(query, product, context=None, on_token=None, fast=False):
     """Enhanced Finance Agent - CONCISE VERSION"""
     
     print(f"💰 Finance Agent processing: {query} for {product}")
@@ -21,11 +8,10 @@ def finance_agent(query, product):
     # Estimate budget from query
     budget_amount = extract_budget_from_query(query)
     
-    if GEMINI_AVAILABLE:
+    if not fast and gemini_available():
         try:
-            model = GenerativeModel('gemini-2.0-flash')
-            
-            prompt = f"""Budget Analysis for {product} campaign: ${budget_amount:,}
+            audience = f"\nProjected conversions: {context.projected_conversions:,} from a reach of {context.estimated_reach:,}" if context else ""
+            prompt = f"""Budget Analysis for {product} campaign: ${budget_amount:,}{audience}
 
 Provide a CONCISE 2-sentence financial assessment covering:
 1. Budget allocation and approval status
@@ -33,9 +19,8 @@ Provide a CONCISE 2-sentence financial assessment covering:
 
 Be specific with numbers."""
             
-            response = model.generate_content(prompt)
-            if response and response.text:
-                ai_analysis = response.text.strip()
+            ai_analysis = generate_text('gemini-2.0-flash', prompt, on_token=on_token)
+            if ai_analysis:
                 print(f"✅ Gemini finance response: {len(ai_analysis)} chars")
                 return format_finance_output_concise(ai_analysis, budget_amount)
             
@@ -1,59 +1,43 @@
-import os
 from datetime import datetime
-from dotenv import load_dotenv
-import google.generativeai as genai
-from google.generativeai.generative_models import GenerativeModel
 
-load_dotenv()
+from inventory_index import get_inventory_index
+from llm_client import gemini_available, generate_text
 
-try:
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-    GEMINI_AVAILABLE = True
-    print("✅ Gemini AI configured for Inventory Agent")
-except Exception:
-    GEMINI_AVAILABLE = False
-    print("⚠️ Gemini AI not available for Inventory Agent")
-
-def inventory_agent(query, product):
+def inventory_agent(query, product, context=None, on_token=None, fast=False):
     """Enhanced Inventory Agent - CONCISE VERSION"""
     
     print(f"📦 Inventory Agent processing: {query} for {product}")
     
-    # Simplified product matching
-    if isinstance(query, dict):
-        # Old signature compatibility
-        product_name = str(product) if not isinstance(product, dict) else "Generic Product"
-        stock_level = 850
+    # Old signature compatibility: product may arrive as a dict
+    product_name = str(product) if not isinstance(product, dict) else "Generic Product"
+    
+    # Stock comes from the inventory index (stock - reserved across regions)
+    stock = get_inventory_index().product(product_name)
+    if stock is not None:
+        product_name = stock.product
+        available = stock.available
     else:
-        product_name = str(product)
-        # Determine stock level based on product type
-        if "headphones" in product_name.lower():
-            stock_level = 1200
-        elif "watch" in product_name.lower():
-            stock_level = 800
-        elif "speaker" in product_name.lower():
-            stock_level = 950
-        else:
-            stock_level = 850
+        print(f"⚠️ {product_name} not in inventory.json, using default stock estimate")
+        available = 850 - 200  # Default stock less a 200 unit reserve
     
-    available = stock_level - 200  # Reserve 200 units
     demand = estimate_demand(query, product_name)
     
-    if GEMINI_AVAILABLE:
+    if not fast and gemini_available():
         try:
-            model = GenerativeModel("gemini-2.0-flash")
+            audience = f"\nProjected Campaign Conversions: {context.projected_conversions:,}" if context else ""
+            regions = f"\nBelow Reorder Level In: {', '.join(stock.below_reorder)}" if stock and stock.below_reorder else ""
             prompt = f"""Inventory Analysis for {product_name}:
 Available Stock: {available} units
-Estimated Campaign Demand: {demand} units
+Estimated Campaign Demand: {demand} units{audience}{regions}
 
 Provide a CONCISE 2-sentence inventory assessment covering:
 1. Stock adequacy for campaign goals
 2. Supply chain status and recommendations"""
             
-            response = model.generate_content(prompt)
-            if response and response.text:
-                print(f"✅ Gemini inventory response: {len(response.text)} chars")
-                return format_inventory_output_concise(response.text.strip(), product_name, available, demand)
+            ai_analysis = generate_text("gemini-2.0-flash", prompt, on_token=on_token)
+            if ai_analysis:
+                print(f"✅ Gemini inventory response: {len(ai_analysis)} chars")
+                return format_inventory_output_concise(ai_analysis, product_name, available, demand, stock=stock)
         except Exception as e:
             print(f"Gemini error in inventory: {e}")
     
@@ -69,7 +53,7 @@ Provide a CONCISE 2-sentence inventory assessment covering:
         status = "🔴 AT RISK"
         analysis = f"Stock risk identified with only {available} units against {demand} projected demand. Immediate restocking required before campaign launch."
     
-    return format_inventory_output_concise(analysis, product_name, available, demand, status)
+    return format_inventory_output_concise(analysis, product_name, available, demand, status, stock)
 
 def estimate_demand(query, product):
     """Simplified demand estimation"""
@@ -83,7 +67,7 @@ def estimate_demand(query, product):
     
     return base_demand
 
-def format_inventory_output_concise(analysis, product_name, available, demand, status=None):
+def format_inventory_output_concise(analysis, product_name, available, demand, status=None, stock=None):
     """Format inventory output - CONCISE VERSION"""
     
     if not status:
@@ -94,6 +78,12 @@ def format_inventory_output_concise(analysis, product_name, available, demand, s
         else:
             status = "🔴 AT RISK"
     
+    regions = ""
+    if stock is not None and len(stock.regions) > 1:
+        regions = "\n• Regions: " + ", ".join(f"{region} {totals.available}" for region, totals in stock.regions.items())
+    if stock is not None and stock.below_reorder:
+        regions += f"\n• Reorder Needed: {', '.join(stock.below_reorder)}"
+    
     # Add timestamp for cache busting
     timestamp = datetime.utcnow().strftime("%H%M%S")
     
@@ -105,7 +95,7 @@ def format_inventory_output_concise(analysis, product_name, available, demand, s
 • Product: {product_name}
 • Available: {available} units
 • Demand: {demand} units
-• Status: {status}
+• Status: {status}{regions}
 <!--{timestamp}-->"""
 
     print(f"📝 Formatted inventory output: {len(formatted_output)} chars")
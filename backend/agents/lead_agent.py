@@ -1,26 +1,15 @@
-import os
 from datetime import datetime
-from dotenv import load_dotenv
-import google.generativeai as genai
-from google.generativeai.generative_models import GenerativeModel
 
-load_dotenv()
+from campaign_context import HIGH_REACH_THRESHOLD
+from llm_client import gemini_available, generate_text
 
-try:
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-    GEMINI_AVAILABLE = True
-    print("✅ Gemini AI configured for Lead Agent")
-except Exception as e:
-    GEMINI_AVAILABLE = False
-    print(f"⚠️ Gemini AI not available: {e}")
-
-def lead_agent(query, product, creative_result, finance_result, inventory_result):
+def lead_agent(query, product, creative_result, finance_result, inventory_result, context=None, on_token=None, fast=False):
     """Lead Agent - Master coordinator"""
     
     print(f"🎯 Lead Agent processing coordination for: {product}")
     
     # Extract key information from each agent
-    creative_summary = extract_key_points(creative_result, "creative")
+    creative_summary = extract_key_points(creative_result, "creative", context)
     finance_summary = extract_key_points(finance_result, "finance") 
     inventory_summary = extract_key_points(inventory_result, "inventory")
     
@@ -28,17 +17,16 @@ def lead_agent(query, product, creative_result, finance_result, inventory_result
     conflicts = []
     if "review" in finance_result.lower() and "premium" in creative_result.lower():
         conflicts.append("Budget vs premium positioning")
-    if "risk" in inventory_result.lower() and "45,000" in creative_result:
+    high_reach = context.estimated_reach >= HIGH_REACH_THRESHOLD if context else "45,000" in creative_result
+    if "risk" in inventory_result.lower() and high_reach:
         conflicts.append("High reach vs inventory constraints")
     
     if not conflicts:
         conflicts = ["No major conflicts detected"]
     
     # Generate analysis
-    if GEMINI_AVAILABLE:
+    if not fast and gemini_available():
         try:
-            model = GenerativeModel('gemini-2.0-flash')
-            
             prompt = f"""As Lead Campaign Manager, analyze these agent reports:
 
 CAMPAIGN: {query} for {product}
@@ -52,9 +40,8 @@ Provide a 3-sentence coordination summary covering:
 2. Key conflict resolution 
 3. Final go/no-go recommendation"""
             
-            response = model.generate_content(prompt)
-            if response and response.text:
-                ai_analysis = response.text.strip()
+            ai_analysis = generate_text('gemini-2.0-flash', prompt, on_token=on_token)
+            if ai_analysis:
                 print(f"✅ Lead Agent Gemini response: {len(ai_analysis)} chars")
                 return format_lead_output(ai_analysis, conflicts, query, product)
                 
@@ -72,13 +59,15 @@ Provide a 3-sentence coordination summary covering:
     
     return format_lead_output(analysis, conflicts, query, product, recommendation)
 
-def extract_key_points(result, agent_type):
+def extract_key_points(result, agent_type, context=None):
     """Extract key points from agent results"""
     if not result or len(result) < 50:
         return f"{agent_type} analysis completed"
     
     # Simple extraction based on agent type
     if agent_type == "creative":
+        if context:
+            return f"{context.estimated_reach // 1000}K reach strategy for {context.primary_audience}"
         if "45,000" in result:
             return "45K reach strategy"
         return "Premium campaign strategy"
@@ -0,0 +1,84 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from rag_system import fallback_segments, get_customer_segments_or_fallback
+
+# Reach above which an inventory risk is flagged as a conflict by the Lead Agent
+HIGH_REACH_THRESHOLD = 40000
+
+
+def describe_audience(customers: List[Dict], limit: int = 2) -> str:
+    """Most common leading demographic traits of a segment, e.g. 'executive, student'"""
+    traits = Counter(
+        customer['demographics'].split(',')[0].strip().lower()
+        for customer in customers if customer.get('demographics')
+    )
+    return ', '.join(trait for trait, _ in traits.most_common(limit)) or "general consumers"
+
+
+@dataclass(frozen=True)
+class CampaignContext:
+    """Audience facts for one campaign request, retrieved once and shared by every agent"""
+    query: str
+    product: str
+    budget: int
+    estimated_reach: int
+    projected_conversions: int
+    conversion_rate: float
+    primary_audience: str
+    secondary_audience: str
+    avg_age: int
+    avg_income: int
+    fallback: bool = False
+    segments: Dict = field(default_factory=dict, compare=False, repr=False)
+
+    def prompt_summary(self) -> str:
+        """One-line audience brief for agent prompts"""
+        return (f"Target audience: {self.primary_audience} (secondary: {self.secondary_audience}), "
+                f"avg age {self.avg_age}, avg income ${self.avg_income:,}. "
+                f"Estimated reach {self.estimated_reach:,}, "
+                f"projected conversions {self.projected_conversions:,} ({self.conversion_rate:.1%}).")
+
+    def to_dict(self) -> Dict:
+        """JSON-friendly summary (without the raw customer lists)"""
+        return {
+            "estimated_reach": self.estimated_reach,
+            "projected_conversions": self.projected_conversions,
+            "conversion_rate": self.conversion_rate,
+            "primary_audience": self.primary_audience,
+            "secondary_audience": self.secondary_audience,
+            "avg_age": self.avg_age,
+            "avg_income": self.avg_income,
+            "fallback": self.fallback
+        }
+
+
+def build_campaign_context(query: str, product: str, budget: int) -> CampaignContext:
+    """Run one retrieval + segmentation for a campaign (blocking - call off the event loop)"""
+    try:
+        segments = get_customer_segments_or_fallback(product, query)
+    except Exception as e:
+        print(f"❌ Customer segmentation failed, using fallback segments: {e}")
+        segments = fallback_segments()
+
+    primary = segments['insights']['primary']
+    secondary = segments['insights']['secondary']
+    reach = primary.get('estimated_reach', 0) + secondary.get('estimated_reach', 0)
+    conversions = primary.get('projected_conversions', 0) + secondary.get('projected_conversions', 0)
+    context = CampaignContext(
+        query=query,
+        product=product,
+        budget=budget,
+        estimated_reach=reach,
+        projected_conversions=conversions,
+        conversion_rate=round(conversions / reach, 4) if reach else 0.0,
+        primary_audience=describe_audience(segments['segments']['primary']),
+        secondary_audience=describe_audience(segments['segments']['secondary']),
+        avg_age=primary.get('avg_age', 28),
+        avg_income=primary.get('avg_income', 75000),
+        fallback=bool(segments.get('fallback')),
+        segments=segments
+    )
+    print(f"👥 Campaign context: reach {reach:,}, {conversions:,} projected conversions")
+    return context
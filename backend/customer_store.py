@@ -0,0 +1,214 @@
+import csv
+import json
+import os
+import sys
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+# Numeric fields stored as NumPy columns (NaN marks a missing value)
+NUMERIC_FIELDS = ["age", "income", "lifetime_value", "engagement_score"]
+INTEGER_FIELDS = {"age", "income", "lifetime_value"}
+# Text fields stored as plain string columns
+TEXT_FIELDS = ["id", "name", "demographics", "location", "purchase_history", "preferences"]
+# List fields, stored as tuples of interned strings
+LIST_FIELDS = ["segments", "interests"]
+# Low-cardinality text columns worth interning
+INTERNED_FIELDS = {"location"}
+KNOWN_FIELDS = frozenset(NUMERIC_FIELDS + TEXT_FIELDS + LIST_FIELDS)
+
+READ_CHUNK_BYTES = 1 << 16
+# Rows buffered as Python floats before being packed into a NumPy chunk
+NUMERIC_FLUSH_ROWS = 4096
+
+
+def iter_json_customers(path: str) -> Iterator[Dict]:
+    """Incrementally parse customer objects from a JSON file.
+
+    Accepts either {"customers": [...]} or a top-level array. Only one
+    object (plus a read buffer) is held in memory at a time.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as f:
+        buffer = ""
+        eof = False
+
+        def fill():
+            nonlocal buffer, eof
+            chunk = f.read(READ_CHUNK_BYTES)
+            if not chunk:
+                eof = True
+            buffer += chunk
+
+        # Find the opening bracket of the customer array
+        while True:
+            key = buffer.find('"customers"')
+            if key != -1:
+                start = buffer.find('[', key)
+                if start != -1:
+                    break
+            elif buffer.lstrip().startswith('['):
+                start = buffer.index('[')
+                break
+            if eof:
+                return
+            fill()
+        buffer = buffer[start + 1:]
+
+        while True:
+            stripped = buffer.lstrip(" \t\r\n,")
+            if not stripped:
+                if eof:
+                    return
+                buffer = ""
+                fill()
+                continue
+            if stripped[0] == ']':
+                return
+            try:
+                record, end = decoder.raw_decode(stripped)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                buffer = stripped
+                fill()  # Object spans the buffer boundary
+                continue
+            buffer = stripped[end:]
+            yield record
+
+
+def iter_ndjson_customers(path: str) -> Iterator[Dict]:
+    """One JSON customer object per line"""
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def iter_csv_customers(path: str) -> Iterator[Dict]:
+    """CSV export with a header row; list fields are separated by ';' or '|'"""
+    with open(path, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            record = {}
+            for key, value in row.items():
+                if value is None or value == "":
+                    continue
+                if key in NUMERIC_FIELDS:
+                    try:
+                        number = float(value)
+                        record[key] = int(number) if key in INTEGER_FIELDS and number.is_integer() else number
+                    except ValueError:
+                        record[key] = value
+                elif key in LIST_FIELDS:
+                    record[key] = [item.strip() for item in value.replace('|', ';').split(';') if item.strip()]
+                else:
+                    record[key] = value
+            yield record
+
+
+def iter_customers(path: str) -> Iterator[Dict]:
+    """Stream customer records from a JSON, NDJSON or CSV file (by extension)"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".ndjson", ".jsonl"):
+        return iter_ndjson_customers(path)
+    if extension == ".csv":
+        return iter_csv_customers(path)
+    return iter_json_customers(path)
+
+
+class CustomerStore:
+    """Compact columnar store of customer records.
+
+    Numeric fields live in float32 NumPy arrays, text in per-column lists
+    (low-cardinality values and segment labels interned). Fields outside
+    the known columns (or values of the wrong type for their column) are
+    kept per row in a sparse side table, so records round-trip. Records
+    are rebuilt as dicts only when asked for, so there is no per-customer
+    dict kept alive for customers that fit the columns.
+    """
+
+    def __init__(self):
+        self._numeric_chunks = {field: [] for field in NUMERIC_FIELDS}
+        self._numeric = None
+        self._pending: Dict[str, List[float]] = {field: [] for field in NUMERIC_FIELDS}
+        self._text = {field: [] for field in TEXT_FIELDS}
+        self._lists = {field: [] for field in LIST_FIELDS}
+        self._extra: Dict[int, Dict] = {}  # row -> fields that do not fit a column
+        self._row_of_id: Dict[str, int] = {}
+        self._size = 0
+
+    def append(self, record: Dict):
+        """Add one customer record"""
+        extra = {key: value for key, value in record.items() if key not in KNOWN_FIELDS}
+        for field in NUMERIC_FIELDS:
+            value = record.get(field)
+            numeric = isinstance(value, (int, float)) and not isinstance(value, bool)
+            if value is not None and not numeric:
+                extra[field] = value  # e.g. "82k" - keep it rather than silently store NaN
+            self._pending[field].append(float(value) if numeric else np.nan)
+        if extra:
+            self._extra[self._size] = extra
+        for field in TEXT_FIELDS:
+            value = record.get(field)
+            value = "" if value is None else str(value)
+            self._text[field].append(sys.intern(value) if field in INTERNED_FIELDS else value)
+        for field in LIST_FIELDS:
+            value = record.get(field) or ()
+            if isinstance(value, str):
+                value = [item.strip() for item in value.split(',') if item.strip()]
+            self._lists[field].append(tuple(sys.intern(str(item)) for item in value))
+        self._row_of_id[self._text["id"][-1] or self._text["name"][-1]] = self._size
+        self._size += 1
+        if len(self._pending[NUMERIC_FIELDS[0]]) >= NUMERIC_FLUSH_ROWS:
+            self._flush()
+
+    def _flush(self):
+        for field in NUMERIC_FIELDS:
+            if self._pending[field]:
+                self._numeric_chunks[field].append(np.asarray(self._pending[field], dtype=np.float32))
+                self._pending[field] = []
+        self._numeric = None
+
+    def column(self, field: str) -> np.ndarray:
+        """Numeric column as a float32 array (NaN where missing)"""
+        if self._pending[field] or self._numeric is None:
+            self._flush()
+            self._numeric = {
+                name: np.concatenate(chunks) if chunks else np.empty(0, dtype=np.float32)
+                for name, chunks in self._numeric_chunks.items()
+            }
+            self._numeric_chunks = {name: [array] for name, array in self._numeric.items()}
+        return self._numeric[field]
+
+    def text_column(self, field: str) -> List[str]:
+        """Text column as a list of strings ('' where missing)"""
+        return self._text[field]
+
+    def row_of(self, customer_id: str) -> Optional[int]:
+        """Row index for a customer id"""
+        return self._row_of_id.get(customer_id)
+
+    def record(self, row: int) -> Dict:
+        """Rebuild a customer dict for one row (missing fields are omitted)"""
+        record = {}
+        for field in TEXT_FIELDS:
+            value = self._text[field][row]
+            if value:
+                record[field] = value
+        for field in NUMERIC_FIELDS:
+            value = float(self.column(field)[row])
+            if not np.isnan(value):
+                record[field] = int(value) if field in INTEGER_FIELDS and value.is_integer() else round(value, 4)
+        for field in LIST_FIELDS:
+            if self._lists[field][row]:
+                record[field] = list(self._lists[field][row])
+        record.update(self._extra.get(row, ()))
+        return record
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self) -> Iterator[Dict]:
+        for row in range(self._size):
+            yield self.record(row)
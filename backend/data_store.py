@@ -0,0 +1,179 @@
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Optional
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+# Minimum seconds between stat() checks of a data file (0 = check on every access)
+DATA_STAT_INTERVAL = float(os.getenv("DATA_STAT_INTERVAL", "1.0"))
+# Use watchdog filesystem events, when installed, to pick up changes immediately
+DATA_WATCH = os.getenv("DATA_WATCH", "1") == "1"
+
+DEFAULT_BUDGET = {"total_budget": 15000}
+DEFAULT_INVENTORY = {
+    "items": [
+        {"product": "Wireless Headphones", "stock": 250, "regions": 4},
+        {"product": "Smart Watch", "stock": 180, "regions": 3},
+        {"product": "Bluetooth Speaker", "stock": 320, "regions": 5},
+        {"product": "Inox Bottle", "stock": 400, "regions": 6}
+    ]
+}
+
+
+def freeze(value: Any) -> Any:
+    """Read-only view of parsed JSON: dicts become mappingproxies, lists tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Mutable (and JSON-serializable) copy of a frozen value"""
+    if isinstance(value, MappingProxyType):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+@dataclass(frozen=True)
+class DataSnapshot:
+    """One parsed, immutable version of a data file"""
+    data: Any
+    version: int
+    loaded_at: float
+    from_default: bool = False
+
+
+class JSONDataFile:
+    """A JSON data file parsed once and re-read only when it changes on disk.
+
+    Changes are detected by (mtime, inode, size), checked at most every
+    DATA_STAT_INTERVAL seconds or immediately after a watch event. Readers
+    always get a complete snapshot: a file that fails to parse (e.g. caught
+    mid-write) keeps the previous snapshot until the next check.
+    """
+
+    def __init__(self, path: str, default: Dict):
+        self.path = path
+        self.default = default
+        self._snapshot: Optional[DataSnapshot] = None
+        self._signature = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def snapshot(self) -> DataSnapshot:
+        """Current snapshot; stats (and re-parses on change) only when the check interval has passed"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < DATA_STAT_INTERVAL:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None or time.monotonic() - self._checked_at >= DATA_STAT_INTERVAL:
+                self._refresh()
+            return self._snapshot
+
+    def invalidate(self):
+        """Force a stat() on next access (called by the file watcher)"""
+        self._checked_at = float("-inf")  # monotonic() may itself be smaller than the interval
+
+    def _refresh(self):
+        self._checked_at = time.monotonic()
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._create_default()
+            stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+        if signature == self._signature and self._snapshot is not None:
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            from_default = False
+        except Exception as e:
+            print(f"⚠️ Could not load {os.path.basename(self.path)}: {e}")
+            if self._snapshot is not None:
+                return  # Keep serving the last good version
+            data, from_default = self.default, True
+            signature = None  # Retry on the next check
+        self._signature = signature
+        version = self._snapshot.version + 1 if self._snapshot else 1
+        self._snapshot = DataSnapshot(freeze(data), version, time.time(), from_default)
+        self.reloads += 1
+        print(f"📂 Loaded {os.path.basename(self.path)} (version {version})")
+
+    def _create_default(self):
+        """Write the default file atomically; concurrent workers race safely (first one wins)"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.default, f, indent=2)
+        try:
+            os.link(temporary, self.path)  # Fails if another worker already created it
+            print(f"📝 Created default {os.path.basename(self.path)}")
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(temporary)
+
+    def stats(self) -> Dict:
+        snapshot = self._snapshot
+        return {
+            "path": self.path,
+            "version": snapshot.version if snapshot else None,
+            "from_default": snapshot.from_default if snapshot else None,
+            "reloads": self.reloads
+        }
+
+
+budget_file = JSONDataFile(os.path.join(DATA_DIR, "budget.json"), DEFAULT_BUDGET)
+inventory_file = JSONDataFile(os.path.join(DATA_DIR, "inventory.json"), DEFAULT_INVENTORY)
+
+_observer = None
+
+
+def start_data_watch():
+    """Invalidate cached files on filesystem events (no-op without watchdog or with DATA_WATCH=0)"""
+    global _observer
+    if not DATA_WATCH or _observer is not None:
+        return
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        print(f"📂 watchdog not installed - data files re-checked every {DATA_STAT_INTERVAL}s")
+        return
+
+    files = {os.path.abspath(data_file.path): data_file for data_file in (budget_file, inventory_file)}
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            for path in (event.src_path, getattr(event, "dest_path", None)):
+                data_file = files.get(os.path.abspath(path)) if path else None
+                if data_file:
+                    data_file.invalidate()
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    _observer = Observer()
+    _observer.schedule(Handler(), DATA_DIR, recursive=False)
+    _observer.daemon = True
+    _observer.start()
+    print(f"👀 Watching {DATA_DIR} for data file changes")
+
+
+def stop_data_watch():
+    global _observer
+    if _observer is not None:
+        _observer.stop()
+        _observer = None
+
+
+def data_file_stats() -> Dict:
+    """Versions and reload counts of the cached data files"""
+    return {"budget": budget_file.stats(), "inventory": inventory_file.stats()}
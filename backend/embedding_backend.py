@@ -0,0 +1,268 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from functools import cached_property
+from typing import Dict, List, Optional
+
+import numpy as np
+from chromadb.utils.embedding_functions.onnx_mini_lm_l6_v2 import ONNXMiniLM_L6_V2
+
+# Embedding backend configuration (override via environment).
+# "default" is Chroma's bundled all-MiniLM-L6-v2 ONNX model; "sentence-transformers"
+# loads RAG_EMBED_MODEL locally, on CPU unless RAG_EMBED_DEVICE says otherwise.
+RAG_EMBED_BACKEND = os.getenv("RAG_EMBED_BACKEND", "default")
+RAG_EMBED_MODEL = os.getenv("RAG_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+RAG_EMBED_DEVICE = os.getenv("RAG_EMBED_DEVICE", "cpu")
+RAG_EMBED_BATCH_SIZE = int(os.getenv("RAG_EMBED_BATCH_SIZE", "64"))
+# Threads per embedding call: ONNX Runtime session options, torch.set_num_threads
+# or OpenVINO's INFERENCE_NUM_THREADS depending on the runtime (0 = library default)
+RAG_EMBED_THREADS = int(os.getenv("RAG_EMBED_THREADS", "0"))
+# "torch", "onnx" (ONNX Runtime) or "openvino" - passed to SentenceTransformer(backend=...)
+RAG_EMBED_RUNTIME = os.getenv("RAG_EMBED_RUNTIME", "torch")
+# int8: dynamic quantization of Linear layers (torch) or a pre-quantized
+# ONNX file (RAG_EMBED_ONNX_FILE, e.g. onnx/model_qint8_avx2.onnx)
+RAG_EMBED_QUANTIZE = os.getenv("RAG_EMBED_QUANTIZE", "0") == "1"
+RAG_EMBED_ONNX_FILE = os.getenv("RAG_EMBED_ONNX_FILE", "onnx/model_qint8_avx2.onnx")
+RAG_EMBED_CACHE_DISK = os.getenv("RAG_EMBED_CACHE_DISK", "1") == "1"
+RAG_EMBED_CACHE_PATH = os.getenv(
+    "RAG_EMBED_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "embedding_cache.sqlite3")
+)
+# SQLite caps bound parameters per statement
+CACHE_LOOKUP_CHUNK = 500
+
+
+def text_key(model_id: str, text: str) -> str:
+    """Cache key for an embedding: sha256 of model id plus text"""
+    return hashlib.sha256(f"{model_id}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def ort_session_options(ort, threads: int = 0):
+    """ONNX Runtime session options, limited to threads intra-op threads when set"""
+    options = ort.SessionOptions()
+    options.log_severity_level = 3  # Errors only
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = threads
+        # Sequential execution runs one node at a time - no inter-op pool needed
+        options.inter_op_num_threads = 1
+    return options
+
+
+class DefaultMiniLM(ONNXMiniLM_L6_V2):
+    """Chroma's bundled all-MiniLM-L6-v2 ONNX model with our session options.
+
+    chromadb's DefaultEmbeddingFunction builds a new model (and ONNX session)
+    on every call and offers no way to size its thread pools.
+    """
+
+    def __init__(self, threads: int = 0):
+        super().__init__(preferred_providers=["CPUExecutionProvider"])
+        self.threads = threads
+
+    @cached_property
+    def model(self):
+        return self.ort.InferenceSession(
+            os.path.join(self.DOWNLOAD_PATH, self.EXTRACTED_FOLDER_NAME, "model.onnx"),
+            providers=self._preferred_providers,
+            sess_options=ort_session_options(self.ort, self.threads)
+        )
+
+
+class EmbeddingDiskCache:
+    """SQLite store of float32 embeddings keyed by text hash (survives restarts and re-ingestion)"""
+
+    def __init__(self, path: str):
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+            self._db.commit()
+            print(f"💾 Embedding disk cache at {path}")
+        except Exception as e:
+            print(f"⚠️ Embedding disk cache unavailable: {e}")
+            self._db = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Cached vectors for the keys that have one"""
+        found = {}
+        if self._db is None:
+            return found
+        try:
+            with self._lock:
+                for i in range(0, len(keys), CACHE_LOOKUP_CHUNK):
+                    chunk = keys[i:i + CACHE_LOOKUP_CHUNK]
+                    rows = self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                    ).fetchall()
+                    for key, blob in rows:
+                        found[key] = np.frombuffer(blob, dtype=np.float32)
+        except Exception as e:
+            print(f"⚠️ Embedding disk cache read error: {e}")
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, items: Dict[str, np.ndarray]):
+        """Store vectors in one transaction"""
+        if self._db is None or not items:
+            return
+        try:
+            with self._lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()]
+                )
+                self._db.commit()
+        except Exception as e:
+            print(f"⚠️ Embedding disk cache write error: {e}")
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class LocalEmbeddingFunction:
+    """Embedding function with explicit model, batching and a persistent cache.
+
+    Used directly for ingestion and queries - it is not attached to the
+    Chroma collection, so switching models never conflicts with the
+    function a collection was persisted with.
+
+    Texts already in the disk cache are never re-embedded; the rest are
+    encoded in batches of batch_size. Vectors are L2-normalized float32.
+    """
+
+    def __init__(self, backend: str = RAG_EMBED_BACKEND, model_name: str = RAG_EMBED_MODEL,
+                 batch_size: int = RAG_EMBED_BATCH_SIZE, threads: int = RAG_EMBED_THREADS,
+                 runtime: str = RAG_EMBED_RUNTIME, quantize: bool = RAG_EMBED_QUANTIZE,
+                 device: str = RAG_EMBED_DEVICE,
+                 cache_path: Optional[str] = RAG_EMBED_CACHE_PATH if RAG_EMBED_CACHE_DISK else None):
+        self.backend = backend
+        self.model_name = model_name if backend != "default" else "chroma-default-minilm"
+        self.batch_size = max(1, batch_size)
+        self.threads = threads
+        self.runtime = runtime
+        self.quantize = quantize
+        self.device = device
+        self.cache = EmbeddingDiskCache(cache_path) if cache_path else None
+        self._encoder = None
+        self._load_lock = threading.Lock()
+        self.texts_embedded = 0
+
+    @property
+    def model_id(self) -> str:
+        """Identifies the vector space - embeddings from different ids are not comparable"""
+        suffix = f"-{self.runtime}" if self.backend != "default" else ""
+        return f"{self.model_name}{suffix}{'-int8' if self.quantize else ''}"
+
+    @property
+    def collection_suffix(self) -> str:
+        """Collection name suffix; '' keeps the original collection for the default model"""
+        if self.backend == "default":
+            return ""
+        return "__" + re.sub(r"[^a-zA-Z0-9_-]+", "_", self.model_id).strip("_-")[:40]
+
+    def _load(self):
+        """Load the model on first use"""
+        if self._encoder is not None:
+            return self._encoder
+        with self._load_lock:
+            if self._encoder is not None:
+                return self._encoder
+            if self.backend == "default":
+                self._encoder = DefaultMiniLM(self.threads)
+            elif self.backend == "sentence-transformers":
+                self._encoder = self._load_sentence_transformer()
+            else:
+                raise ValueError(f"Unknown embedding backend: {self.backend}")
+            print(f"🧬 Embedding model ready: {self.model_id} (batch {self.batch_size})")
+        return self._encoder
+
+    def _load_sentence_transformer(self):
+        from sentence_transformers import SentenceTransformer
+
+        kwargs = {"device": self.device}
+        if self.runtime != "torch":
+            kwargs["backend"] = self.runtime
+            model_kwargs = {}
+            if self.quantize and self.runtime == "onnx":
+                model_kwargs["file_name"] = RAG_EMBED_ONNX_FILE
+            if self.threads and self.runtime == "onnx":
+                import onnxruntime
+                model_kwargs["session_options"] = ort_session_options(onnxruntime, self.threads)
+            elif self.threads and self.runtime == "openvino":
+                model_kwargs["ov_config"] = {"INFERENCE_NUM_THREADS": str(self.threads)}
+            if model_kwargs:
+                kwargs["model_kwargs"] = model_kwargs
+        model = SentenceTransformer(self.model_name, **kwargs)
+        if self.runtime == "torch":
+            import torch
+            if self.threads:
+                torch.set_num_threads(self.threads)
+            if self.quantize:
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        encoder = self._load()
+        if self.backend == "default":
+            vectors = []
+            for i in range(0, len(texts), self.batch_size):
+                vectors.extend(encoder(texts[i:i + self.batch_size]))
+            vectors = np.asarray(vectors, dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            return vectors / np.where(norms == 0, 1, norms)
+        return encoder.encode(texts, batch_size=self.batch_size, normalize_embeddings=True,
+                              convert_to_numpy=True, show_progress_bar=False).astype(np.float32)
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        texts = list(input)
+        if not texts:
+            return []
+        keys = [text_key(self.model_id, text) for text in texts]
+        cached = self.cache.get_many(list(set(keys))) if self.cache else {}
+
+        # Embed each distinct uncached text once
+        missing = list(dict.fromkeys(text for text, key in zip(texts, keys) if key not in cached))
+        if missing:
+            computed = self._encode(missing)
+            self.texts_embedded += len(missing)
+            fresh = {text_key(self.model_id, text): vector for text, vector in zip(missing, computed)}
+            if self.cache:
+                self.cache.set_many(fresh)
+            cached.update(fresh)
+        return [cached[key].tolist() for key in keys]
+
+    def stats(self) -> Dict:
+        """Model configuration and cache counters for monitoring"""
+        return {
+            "backend": self.backend,
+            "model": self.model_id,
+            "batch_size": self.batch_size,
+            "threads": self.threads,
+            "loaded": self._encoder is not None,
+            "texts_embedded": self.texts_embedded,
+            "disk_cache": self.cache.stats() if self.cache else None
+        }
+
+
+def build_embedding_function() -> LocalEmbeddingFunction:
+    """Embedding function configured from the environment"""
+    return LocalEmbeddingFunction()
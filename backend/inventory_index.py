@@ -0,0 +1,143 @@
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from data_store import inventory_file
+
+
+def normalize_product(name: str) -> str:
+    return ' '.join(re.findall(r'[a-z0-9]+', str(name).lower()))
+
+
+@dataclass(frozen=True)
+class StockTotals:
+    """Stock aggregated over the rows of a product, a region or a product in one region"""
+    stock: int = 0
+    reserved: int = 0
+    reorder_level: int = 0
+    inventory_value: float = 0.0
+    rows: int = 0
+
+    @property
+    def available(self) -> int:
+        return self.stock - self.reserved
+
+    def add(self, stock: int, reserved: int, reorder_level: int, unit_cost: float) -> "StockTotals":
+        return StockTotals(self.stock + stock, self.reserved + reserved, self.reorder_level + reorder_level,
+                           self.inventory_value + stock * unit_cost, self.rows + 1)
+
+
+@dataclass(frozen=True)
+class ProductStock:
+    """Everything the agents need about one product, precomputed at index build"""
+    product: str
+    totals: StockTotals
+    regions: Dict[str, StockTotals]
+    below_reorder: Tuple[str, ...]  # Regions where available stock is at or under the reorder level
+
+    @property
+    def available(self) -> int:
+        return self.totals.available
+
+
+class InventoryIndex:
+    """Lookup tables built once from an inventory.json snapshot.
+
+    Rows come from "products" (per region: stock, reserved, reorder_level,
+    unit_cost) or, for files written by older versions, "items" (stock
+    only, region "all"). Products are indexed by normalized name, plus any
+    names listed under the optional top-level "aliases" mapping
+    ({"alias": "Catalogue Name"}); regions by name; totals are aggregated
+    up front. Every lookup is a dict access, and a name that is neither a
+    product nor an alias is not found - stock is never borrowed from a
+    similarly named SKU.
+    """
+
+    def __init__(self, data, version: int = 0):
+        self.version = version
+        by_product: Dict[str, Dict] = {}
+        by_region: Dict[str, StockTotals] = {}
+        totals = StockTotals()
+        for row in list(data.get("products", ())) + list(data.get("items", ())):
+            name = str(row.get("product", "")).strip()
+            key = normalize_product(name)
+            if not key:
+                continue
+            region = str(row.get("region", "all"))
+            values = (int(row.get("stock", 0) or 0), int(row.get("reserved", 0) or 0),
+                      int(row.get("reorder_level", 0) or 0), float(row.get("unit_cost", 0) or 0))
+            entry = by_product.setdefault(key, {"name": name, "totals": StockTotals(), "regions": {}})
+            entry["totals"] = entry["totals"].add(*values)
+            entry["regions"][region] = entry["regions"].get(region, StockTotals()).add(*values)
+            by_region[region] = by_region.get(region, StockTotals()).add(*values)
+            totals = totals.add(*values)
+
+        self.products: Dict[str, ProductStock] = {
+            key: ProductStock(
+                product=entry["name"],
+                totals=entry["totals"],
+                regions=entry["regions"],
+                below_reorder=tuple(sorted(region for region, stock in entry["regions"].items()
+                                           if stock.available <= stock.reorder_level))
+            )
+            for key, entry in by_product.items()
+        }
+        self.regions = by_region
+        self.totals = totals
+        self.aliases: Dict[str, str] = {}
+        for alias, target in dict(data.get("aliases", {})).items():
+            target_key = normalize_product(target)
+            if target_key in self.products:
+                self.aliases[normalize_product(alias)] = target_key
+            else:
+                print(f"⚠️ Inventory alias '{alias}' points at unknown product '{target}'")
+
+    def product(self, name: str) -> Optional[ProductStock]:
+        """Stock for a product by exact (normalized) name or alias; None when not in the catalogue"""
+        key = normalize_product(name)
+        found = self.products.get(key)
+        if found is None and key in self.aliases:
+            found = self.products[self.aliases[key]]
+        return found
+
+    def available(self, name: str, region: Optional[str] = None) -> Optional[int]:
+        """Available units (stock - reserved) for a product, optionally in one region"""
+        stock = self.product(name)
+        if stock is None:
+            return None
+        if region is None:
+            return stock.available
+        totals = stock.regions.get(region)
+        return totals.available if totals else 0
+
+    def region(self, name: str) -> Optional[StockTotals]:
+        return self.regions.get(name)
+
+    def stats(self) -> Dict:
+        return {
+            "version": self.version,
+            "products": len(self.products),
+            "regions": len(self.regions),
+            "aliases": len(self.aliases),
+            "available": self.totals.available
+        }
+
+
+_index: Optional[InventoryIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_inventory_index() -> InventoryIndex:
+    """Index for the current inventory.json snapshot, rebuilt only when the file changes"""
+    global _index
+    snapshot = inventory_file.snapshot()
+    index = _index
+    if index is not None and index.version == snapshot.version:
+        return index
+    with _index_lock:
+        if _index is None or _index.version != snapshot.version:
+            _index = InventoryIndex(snapshot.data, snapshot.version)
+            print(f"📦 Inventory index v{snapshot.version}: {len(_index.products)} products, "
+                  f"{len(_index.regions)} regions")
+        return _index
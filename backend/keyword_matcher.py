@@ -0,0 +1,68 @@
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Set
+
+LEXICON_PATH = os.getenv(
+    "LEXICON_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "lexicons.json")
+)
+
+
+class KeywordMatcher:
+    """Multi-category keyword matcher compiled into a single regex.
+
+    Every term in every category is matched in one pass over the text, on
+    word boundaries, so "great" does not match inside "greatest".
+    """
+
+    def __init__(self, categories: Dict[str, Iterable[str]]):
+        self.categories = list(categories)
+        self._category_of: Dict[str, str] = {}
+        for category, terms in categories.items():
+            for term in terms:
+                self._category_of.setdefault(term.lower(), category)
+        # Longest first so multi-word terms win over their prefixes
+        terms = sorted(self._category_of, key=len, reverse=True)
+        alternation = "|".join(re.escape(term) for term in terms) or r"(?!x)x"
+        self._pattern = re.compile(rf"\b(?:{alternation})\b", re.IGNORECASE)
+
+    def matches(self, text: str) -> Set[str]:
+        """Distinct lexicon terms present in the text"""
+        return {match.lower() for match in self._pattern.findall(text)}
+
+    def count(self, text: str) -> Dict[str, int]:
+        """Number of distinct terms present per category"""
+        counts = dict.fromkeys(self.categories, 0)
+        for term in self.matches(text):
+            counts[self._category_of[term]] += 1
+        return counts
+
+    def categories_present(self, text: str) -> Set[str]:
+        """Categories with at least one term in the text"""
+        return {self._category_of[term] for term in self.matches(text)}
+
+
+_lexicons = None
+
+
+def load_lexicons(path: str = LEXICON_PATH) -> Dict[str, Dict[str, List[str]]]:
+    """Load all lexicons from the JSON file (cached after the first read).
+
+    The file is the only copy of the lexicons, so a missing or unreadable
+    file raises rather than silently matching nothing.
+    """
+    global _lexicons
+    if _lexicons is None:
+        with open(path, 'r') as f:
+            _lexicons = json.load(f)
+        print(f"📚 Loaded lexicons: {', '.join(_lexicons)}")
+    return _lexicons
+
+
+def build_matcher(name: str) -> KeywordMatcher:
+    """Build a matcher for a named lexicon in lexicons.json"""
+    lexicons = load_lexicons()
+    if not lexicons.get(name):
+        raise KeyError(f"Lexicon '{name}' missing or empty in {LEXICON_PATH}")
+    return KeywordMatcher(lexicons[name])
@@ -0,0 +1,221 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from ttl_cache import TTLCache
+
+# Cache configuration (override via environment)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+LLM_CACHE_DISK = os.getenv("LLM_CACHE_DISK", "1") == "1"
+# How often expired rows are deleted from the SQLite tier (also done once on open)
+LLM_CACHE_PURGE_INTERVAL = float(os.getenv("LLM_CACHE_PURGE_INTERVAL", "3600"))
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "llm_cache.sqlite3")
+)
+
+
+def make_cache_key(model_name: str, prompt: str) -> str:
+    """Content address for a prompt: sha256 of model name plus prompt text"""
+    return hashlib.sha256(f"{model_name}\x00{prompt}".encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Two-tier LLM response cache: in-process LRU backed by optional SQLite"""
+
+    def __init__(self, path: Optional[str] = LLM_CACHE_PATH, ttl: float = LLM_CACHE_TTL):
+        self.ttl = ttl
+        self.memory = TTLCache(max_entries=LLM_CACHE_MAX_ENTRIES, ttl=ttl, max_bytes=LLM_CACHE_MAX_BYTES)
+        self.disk_hits = 0
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._last_purge = time.monotonic()
+        if path:
+            self._open_disk(path)
+
+    def _open_disk(self, path: str):
+        """Open (or create) the on-disk tier; the cache still works without it"""
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT, created_at REAL)"
+            )
+            self._db.commit()
+            print(f"💾 LLM disk cache at {path}")
+            self._purge_expired()
+        except Exception as e:
+            print(f"⚠️ LLM disk cache unavailable: {e}")
+            self._db = None
+
+    def _purge_expired(self):
+        """Delete rows older than the TTL from the disk tier"""
+        self._last_purge = time.monotonic()
+        if self._db is None or not self.ttl:
+            return
+        try:
+            with self._db_lock:
+                purged = self._db.execute(
+                    "DELETE FROM llm_responses WHERE created_at <= ?", (time.time() - self.ttl,)
+                ).rowcount
+                self._db.commit()
+            if purged:
+                print(f"🧹 Purged {purged} expired LLM disk cache entries")
+        except Exception as e:
+            print(f"⚠️ LLM disk cache purge error: {e}")
+
+    def get(self, model_name: str, prompt: str) -> Optional[str]:
+        """Look up a cached response, promoting disk hits into memory for the rest of their TTL"""
+        key = make_cache_key(model_name, prompt)
+        text = self.memory.get(key)
+        if text is not None:
+            return text
+
+        if self._db is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)
+                ).fetchone()
+        except Exception as e:
+            print(f"⚠️ LLM disk cache read error: {e}")
+            return None
+        if row is None:
+            return None
+        response, created_at = row
+        remaining = created_at + self.ttl - time.time() if self.ttl else None
+        if remaining is not None and remaining <= 0:
+            self._delete_row(key)
+            return None
+        self.disk_hits += 1
+        self.memory.set(key, response, ttl=remaining)
+        return response
+
+    def set(self, model_name: str, prompt: str, response: str):
+        """Store a response in both tiers"""
+        key = make_cache_key(model_name, prompt)
+        self.memory.set(key, response)
+        if self._db is None:
+            return
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, model, response, created_at) VALUES (?, ?, ?, ?)",
+                    (key, model_name, response, time.time())
+                )
+                self._db.commit()
+        except Exception as e:
+            print(f"⚠️ LLM disk cache write error: {e}")
+        if time.monotonic() - self._last_purge >= LLM_CACHE_PURGE_INTERVAL:
+            self._purge_expired()
+
+    def delete(self, model_name: str, prompt: str):
+        """Remove a response from both tiers"""
+        key = make_cache_key(model_name, prompt)
+        self.memory.delete(key)
+        self._delete_row(key)
+
+    def _delete_row(self, key: str):
+        """Remove one key from the disk tier"""
+        if self._db is None:
+            return
+        try:
+            with self._db_lock:
+                self._db.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                self._db.commit()
+        except Exception as e:
+            print(f"⚠️ LLM disk cache write error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters across both tiers"""
+        memory_stats = self.memory.stats()
+        total_hits = memory_stats["hits"] + self.disk_hits
+        total_misses = memory_stats["misses"] - self.disk_hits
+        lookups = total_hits + total_misses
+        return {
+            "memory": memory_stats,
+            "disk_enabled": self._db is not None,
+            "disk_hits": self.disk_hits,
+            "total_hits": total_hits,
+            "total_misses": total_misses,
+            "hit_rate": round(total_hits / lookups, 4) if lookups else 0.0
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """Get the process-wide LLM response cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMResponseCache(path=LLM_CACHE_PATH if LLM_CACHE_DISK else None)
+    return _cache
+
+
+def _call_model(model, prompt: str, on_token: Optional[Callable[[str], None]] = None) -> Optional[str]:
+    """Call generate_content, streaming chunks to on_token when given"""
+    if on_token is None:
+        response = model.generate_content(prompt)
+        return response.text.strip() if response and response.text else None
+
+    chunks = []
+    for chunk in model.generate_content(prompt, stream=True):
+        piece = chunk.text
+        if piece:
+            chunks.append(piece)
+            on_token(piece)
+    return ''.join(chunks).strip() or None
+
+
+def lookup_cached(model_name: str, prompt: str) -> Optional[str]:
+    """Return a cached response without calling the model (None on miss or when disabled)"""
+    if not LLM_CACHE_ENABLED:
+        return None
+    text = get_llm_cache().get(model_name, prompt)
+    if text is not None:
+        print(f"⚡ LLM cache hit ({model_name})")
+    return text
+
+
+def evict_cached(model_name: str, prompt: str):
+    """Forget a cached response (e.g. one the caller could not use)"""
+    if LLM_CACHE_ENABLED:
+        get_llm_cache().delete(model_name, prompt)
+
+
+def generate_uncached(model, model_name: str, prompt: str,
+                      on_token: Optional[Callable[[str], None]] = None,
+                      validate: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+    """Call the model and store the response, skipping the lookup.
+
+    With validate, only responses it accepts are stored - a malformed
+    answer is returned to the caller but never replayed from the cache.
+    """
+    text = _call_model(model, prompt, on_token)
+    if text and LLM_CACHE_ENABLED and (validate is None or validate(text)):
+        get_llm_cache().set(model_name, prompt, text)
+    return text
+
+
+def cached_generate(model, model_name: str, prompt: str,
+                    on_token: Optional[Callable[[str], None]] = None) -> Optional[str]:
+    """Return response text for a prompt, calling model.generate_content only on a cache miss"""
+    text = lookup_cached(model_name, prompt)
+    if text is not None:
+        if on_token:
+            on_token(text)
+        return text
+    return generate_uncached(model, model_name, prompt, on_token)
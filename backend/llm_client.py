@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+import google.generativeai as genai
+from google.generativeai.generative_models import GenerativeModel
+
+from llm_cache import cached_generate
+
+load_dotenv()
+
+# Transport shared by every model: "grpc" keeps one long-lived HTTP/2 channel
+# per process, "rest" uses a pooled HTTP session.
+GEMINI_TRANSPORT = os.getenv("GEMINI_TRANSPORT", "grpc")
+
+# Per-model settings, passed straight to GenerativeModel. Override or extend
+# with GEMINI_MODEL_SETTINGS='{"gemini-2.0-flash": {"generation_config": {...}}}'
+MODEL_SETTINGS: Dict[str, Dict[str, Any]] = {
+    "gemini-2.0-flash": {},  # Creative, Finance, Inventory and Lead agents
+    "gemini-pro": {}         # Sentiment analysis
+}
+
+
+def _load_settings_override():
+    """Merge JSON model settings from the environment into MODEL_SETTINGS"""
+    raw = os.getenv("GEMINI_MODEL_SETTINGS")
+    if not raw:
+        return
+    try:
+        for name, settings in json.loads(raw).items():
+            MODEL_SETTINGS.setdefault(name, {}).update(settings)
+    except Exception as e:
+        print(f"⚠️ Ignoring invalid GEMINI_MODEL_SETTINGS: {e}")
+
+
+_load_settings_override()
+
+
+class ModelRegistry:
+    """Configures Gemini once and hands out shared GenerativeModel instances"""
+
+    def __init__(self):
+        self._models: Dict[str, GenerativeModel] = {}
+        self._lock = threading.Lock()
+        self._configured = False
+        self.available = False
+
+    def configure(self) -> bool:
+        """Configure the Gemini client on first use; returns availability"""
+        if self._configured:
+            return self.available
+        with self._lock:
+            if self._configured:
+                return self.available
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                print("⚠️ No Gemini API key found - agents will use fallbacks")
+            else:
+                try:
+                    genai.configure(api_key=api_key, transport=GEMINI_TRANSPORT)
+                    self.available = True
+                    print(f"✅ Gemini AI configured once for all agents ({GEMINI_TRANSPORT})")
+                except Exception as e:
+                    print(f"⚠️ Gemini AI not available: {e}")
+            self._configured = True
+        return self.available
+
+    def get_model(self, model_name: str) -> Optional[GenerativeModel]:
+        """Get the shared model instance for a name, creating it lazily"""
+        if not self.configure():
+            return None
+        model = self._models.get(model_name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(model_name)
+                if model is None:
+                    model = GenerativeModel(model_name, **MODEL_SETTINGS.get(model_name, {}))
+                    self._models[model_name] = model
+                    print(f"🧠 Created shared model: {model_name}")
+        return model
+
+
+registry = ModelRegistry()
+
+
+def gemini_available() -> bool:
+    """True when Gemini is configured and usable"""
+    return registry.configure()
+
+
+def get_model(model_name: str) -> Optional[GenerativeModel]:
+    """Get a shared GenerativeModel from the registry"""
+    return registry.get_model(model_name)
+
+
+def generate_text(model_name: str, prompt: str,
+                  on_token: Optional[Callable[[str], None]] = None) -> Optional[str]:
+    """Generate text with a shared model, going through the response cache.
+
+    When on_token is given the response is streamed and each chunk is passed
+    to it as it arrives (a cache hit is delivered as a single chunk).
+    """
+    model = get_model(model_name)
+    if model is None:
+        return None
+    return cached_generate(model, model_name, prompt, on_token=on_token)
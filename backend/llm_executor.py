@@ -0,0 +1,38 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# Size of the dedicated pool for blocking agent / Gemini calls.
+# Kept separate from asyncio's default executor so LLM traffic cannot
+# starve other to_thread users (and vice versa).
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "16"))
+
+_executor = None
+
+
+def get_llm_executor() -> ThreadPoolExecutor:
+    """Get the shared, lazily created executor for blocking LLM calls"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=LLM_MAX_WORKERS,
+            thread_name_prefix="llm-worker"
+        )
+        print(f"🧵 LLM executor started with {LLM_MAX_WORKERS} workers")
+    return _executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking callable on the LLM executor without stalling the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_llm_executor(), partial(func, *args, **kwargs))
+
+
+def shutdown_llm_executor():
+    """Stop the executor, waiting for in-flight calls to finish"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+        print("🧵 LLM executor stopped")
@@ -0,0 +1,161 @@
+import asyncio
+import os
+import random
+import time
+from typing import Any, Dict
+
+from llm_executor import run_blocking
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    RETRYABLE_ERRORS = (
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+        ConnectionError,
+        TimeoutError
+    )
+except ImportError:
+    RETRYABLE_ERRORS = (ConnectionError, TimeoutError)
+
+# Scheduler configuration (override via environment)
+LLM_RATE_PER_SEC = float(os.getenv("LLM_RATE_PER_SEC", "5"))
+LLM_RATE_BURST = int(os.getenv("LLM_RATE_BURST", "10"))
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+
+
+class SchedulerBusy(Exception):
+    """Raised when the LLM queue is full - callers should back off and retry"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"LLM scheduler queue full, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Async token-bucket rate limiter"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Wait until a token is available, then take it"""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class LLMScheduler:
+    """Rate-limited, bounded-concurrency front door for blocking LLM calls.
+
+    Calls wait for a token from the bucket and a free in-flight slot, run on
+    the LLM executor and are retried with jittered exponential backoff on
+    transient errors. When too many calls are already waiting, submit()
+    raises SchedulerBusy instead of queueing without bound.
+    """
+
+    def __init__(self, rate: float = LLM_RATE_PER_SEC, burst: int = LLM_RATE_BURST,
+                 max_in_flight: int = LLM_MAX_IN_FLIGHT, max_queue: int = LLM_MAX_QUEUE,
+                 max_retries: int = LLM_MAX_RETRIES):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self._bucket = None
+        self._semaphore = None
+        self._loop = None
+        self.pending = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.rejected = 0
+
+    def _bind_loop(self):
+        """Create loop-bound primitives on first use (and if the loop changes)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._bucket = TokenBucket(self.rate, self.burst)
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+    def retry_after(self) -> float:
+        """Rough time for the current backlog to drain at the configured rate"""
+        return max(1.0, self.pending / self.rate)
+
+    async def submit(self, func, *args, **kwargs):
+        """Schedule a blocking call and return its result"""
+        self._bind_loop()
+        if self.pending >= self.max_in_flight + self.max_queue:
+            self.rejected += 1
+            raise SchedulerBusy(self.retry_after())
+
+        self.pending += 1
+        try:
+            async with self._semaphore:
+                return await self._run_with_retries(func, *args, **kwargs)
+        finally:
+            self.pending -= 1
+
+    async def _run_with_retries(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            await self._bucket.acquire()
+            self.in_flight += 1
+            try:
+                result = await run_blocking(func, *args, **kwargs)
+                self.completed += 1
+                return result
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    self.failed += 1
+                    raise
+                # Full jitter keeps concurrent retries from synchronising
+                delay = random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+                attempt += 1
+                self.retried += 1
+                print(f"🔁 LLM call failed ({e}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            except Exception:
+                self.failed += 1
+                raise
+            finally:
+                self.in_flight -= 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue and throughput counters"""
+        return {
+            "pending": self.pending,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "rejected": self.rejected,
+            "rate_per_sec": self.rate,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue
+        }
+
+
+# Shared scheduler for Gemini calls
+llm_scheduler = LLMScheduler()
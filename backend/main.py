@@ -1,16 +1,51 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from agent_manager import run_agents
-from scenario_generator import generate_scenarios
+from agent_manager import run_agents_async
+from scenario_generator import generate_scenarios, optimize_campaign, simulate_scenarios, sweep_grid
 from sentiment_trend_analyzer import SentimentTrendAnalyzer  # NEW IMPORT
+from llm_executor import get_llm_executor, shutdown_llm_executor
+from llm_cache import get_llm_cache
+from data_store import data_file_stats, start_data_watch, stop_data_watch
+from inventory_index import get_inventory_index
+from llm_scheduler import SchedulerBusy, llm_scheduler
+from rag_system import (get_customer_segments_batch_or_fallback, get_customer_segments_or_fallback,
+                        mark_rag_warming_up, rag_readiness, retrieval_cache_stats, warm_up_rag_system)
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import Optional
+import json
 import uvicorn
 import asyncio
+import os
 
 # Import WebSocket manager
 from websocket_manager import ws_manager
 
-app = FastAPI(title="MarketBridge API", version="1.0.0")
+# Load the RAG system in the background at startup (set RAG_WARMUP=0 to skip)
+RAG_WARMUP = os.getenv("RAG_WARMUP", "1") == "1"
+
+# Campaigns streamed over WebSocket (kept referenced until they finish)
+_campaign_tasks = set()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop shared resources with the server"""
+    get_llm_executor()
+    start_data_watch()
+    if RAG_WARMUP:
+        # Build ChromaDB + embedding model off the request path; /health reports progress.
+        # Marked before scheduling so a request arriving first falls back instead of building
+        mark_rag_warming_up()
+        asyncio.get_running_loop().run_in_executor(None, warm_up_rag_system)
+    yield
+    for task in list(_campaign_tasks):
+        task.cancel()
+    stop_data_watch()
+    shutdown_llm_executor()
+
+app = FastAPI(title="MarketBridge API", version="1.0.0", lifespan=lifespan)
 
 # Enable CORS for frontend
 app.add_middleware(
@@ -21,35 +56,107 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Upper bound on cells (strategies x grid points) for what-if grid sweeps
+WHAT_IF_MAX_GRID_CELLS = int(os.getenv("WHAT_IF_MAX_GRID_CELLS", "200000"))
+WHAT_IF_MAX_TRIALS = int(os.getenv("WHAT_IF_MAX_TRIALS", "5000000"))
+WHAT_IF_MAX_GRID_POINTS = int(os.getenv("WHAT_IF_MAX_GRID_POINTS", "60"))
+# Upper bound on (product, query) pairs per batched segmentation request
+SEGMENT_BATCH_MAX_ITEMS = int(os.getenv("SEGMENT_BATCH_MAX_ITEMS", "500"))
+# Upper bound on retrieved customers summarised by a cohort segmentation request
+SEGMENT_MAX_COHORT_SIZE = int(os.getenv("SEGMENT_MAX_COHORT_SIZE", "50000"))
+
 # Initialize sentiment trend analyzer
 sentiment_analyzer = SentimentTrendAnalyzer()  # NEW
 
 class CampaignRequest(BaseModel):
     query: str
     product: str
+    client_id: Optional[str] = None  # WebSocket client to stream progress to
+    mode: Optional[str] = None  # "llm", "fast" or "fast_narrate" (default AGENT_MODE)
 
 class WhatIfRequest(BaseModel):
     discount: float
     duration: int
     target_size: int
     budget: int
+    # mode="grid" sweeps every combination; axes left empty use the single value above
+    mode: str = "single"
+    discounts: list[float] = []
+    durations: list[int] = []
+    target_sizes: list[int] = []
+    budgets: list[int] = []
+    # mode="monte_carlo" samples outcomes around the single parameter set
+    trials: int = 100000
+    seed: Optional[int] = None
+    distributions: dict = {}
+    loss_threshold: float = 100.0
+
+class OptimizeRequest(BaseModel):
+    budget_ceiling: float
+    target_size: int
+    budget_floor: Optional[float] = None
+    discount_min: float = 5
+    discount_max: float = 50
+    duration_min: int = 7
+    duration_max: int = 180
+    inventory_limit: Optional[int] = None  # Max units the campaign may sell
+    product: Optional[str] = None  # Without inventory_limit, cap sales at this product's available stock
+    loss_threshold: float = 100.0
+    grid_points: int = 25
+    seed: int = 0
+
+class CustomerSegmentRequest(BaseModel):
+    product: str
+    query: str
+    cohort_size: Optional[int] = None  # Also summarise the top N matches (insights.cohort)
+
+class CustomerSegmentBatchRequest(BaseModel):
+    items: list[CustomerSegmentRequest]
 
 class SentimentAnalysisRequest(BaseModel):  # NEW
     product: str
     campaign_text: str
     keywords: list[str] = []
 
+class SentimentBatchRequest(BaseModel):
+    texts: list[str]
+    batch_size: Optional[int] = None
+
 # WebSocket endpoint for real-time agent collaboration
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
     await ws_manager.connect(websocket, client_id)
+    # This connection's campaigns - cancelled when it closes, as nobody is left to stream to
+    client_tasks = set()
     try:
         while True:
             data = await websocket.receive_text()
-            # Handle incoming WebSocket messages if needed
             print(f"📡 Received from {client_id}: {data}")
+            try:
+                message = json.loads(data)
+            except ValueError:
+                continue
+            # Streaming campaign mode: run in the background so the socket keeps reading
+            if isinstance(message, dict) and message.get("type") == "run_campaign":
+                task = asyncio.create_task(stream_campaign(client_id, message.get("query", ""),
+                                                           message.get("product", ""), message.get("mode")))
+                for tasks in (_campaign_tasks, client_tasks):
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
     except WebSocketDisconnect:
         ws_manager.disconnect(client_id)
+    finally:
+        for task in list(client_tasks):
+            task.cancel()
+
+async def stream_campaign(client_id: str, query: str, product: str, mode: Optional[str] = None):
+    """Run a campaign for a WebSocket client, streaming progress then the result"""
+    try:
+        result = await run_agents_async(query, product, client_id=client_id, mode=mode)
+        await ws_manager.send_to_client(client_id, {"type": "campaign_result", "success": True, "data": result})
+    except Exception as e:
+        print(f"❌ Error streaming campaign: {str(e)}")
+        await ws_manager.send_to_client(client_id, {"type": "campaign_result", "success": False, "error": str(e)})
 
 @app.get("/")
 async def root():
@@ -63,7 +170,8 @@ async def run_campaign(request: CampaignRequest):
     try:
         print(f"🚀 Processing campaign request: {request.product}")
         
-        result = run_agents(request.query, request.product)
+        result = await run_agents_async(request.query, request.product, client_id=request.client_id,
+                                        mode=request.mode)
         
         # Debug: Print the result structure
         print("📊 Backend result structure:")
@@ -96,6 +204,37 @@ async def what_if(request: WhatIfRequest):
     Generate what-if scenarios based on campaign parameters
     """
     try:
+        if request.mode == "grid":
+            print("🔮 Processing what-if grid sweep")
+            # CPU-bound for large grids - keep it off the event loop
+            grid = await asyncio.to_thread(
+                sweep_grid,
+                request.discounts or [request.discount],
+                request.durations or [request.duration],
+                request.target_sizes or [request.target_size],
+                request.budgets or [request.budget],
+                WHAT_IF_MAX_GRID_CELLS
+            )
+            print(f"✅ Evaluated grid, best ROI {grid['best']['roi']}")
+            return {"mode": "grid", "grid": grid}
+        
+        if request.mode == "monte_carlo":
+            if request.trials > WHAT_IF_MAX_TRIALS:
+                raise ValueError(f"trials is limited to {WHAT_IF_MAX_TRIALS}")
+            print(f"🎲 Running {request.trials} Monte Carlo trials per strategy")
+            simulation = await asyncio.to_thread(
+                simulate_scenarios,
+                request.discount,
+                request.duration,
+                request.target_size,
+                request.budget,
+                trials=request.trials,
+                seed=request.seed,
+                distributions=request.distributions,
+                loss_threshold=request.loss_threshold
+            )
+            return {"mode": "monte_carlo", "simulation": simulation, "scenarios": simulation["scenarios"]}
+        
         print(f"🔮 Processing what-if request: discount={request.discount}%, duration={request.duration} days")
         
         scenarios = generate_scenarios(
@@ -117,6 +256,45 @@ async def what_if(request: WhatIfRequest):
             "error": str(e)
         }
 
+@app.post("/api/what_if/optimize")
+async def what_if_optimize(request: OptimizeRequest):
+    """
+    Find the ROI-maximizing configuration per strategy within budget and inventory limits
+    """
+    try:
+        if not 2 <= request.grid_points <= WHAT_IF_MAX_GRID_POINTS:
+            raise ValueError(f"grid_points must be between 2 and {WHAT_IF_MAX_GRID_POINTS}")
+        inventory_limit = request.inventory_limit
+        if inventory_limit is None and request.product:
+            # The index may stat or re-read inventory.json - keep that off the event loop
+            inventory_limit = (await asyncio.to_thread(get_inventory_index)).available(request.product)
+        print(f"🧭 Optimizing campaign: budget ceiling ${request.budget_ceiling:,.0f}")
+        
+        result = await asyncio.to_thread(
+            optimize_campaign,
+            request.budget_ceiling,
+            request.target_size,
+            discount_range=(request.discount_min, request.discount_max),
+            duration_range=(request.duration_min, request.duration_max),
+            budget_floor=request.budget_floor,
+            inventory_limit=inventory_limit,
+            grid_points=request.grid_points,
+            seed=request.seed,
+            loss_threshold=request.loss_threshold
+        )
+        
+        print(f"✅ Evaluated {result['configurations_evaluated']} configurations")
+        return {"success": True, "data": result}
+        
+    except Exception as e:
+        print(f"❌ Error optimizing campaign: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
 @app.post("/api/sentiment_analysis")
 async def analyze_sentiment_trends(request: SentimentAnalysisRequest):
     """
@@ -137,6 +315,8 @@ async def analyze_sentiment_trends(request: SentimentAnalysisRequest):
             "data": analysis
         }
         
+    except SchedulerBusy as e:
+        return scheduler_busy_response(e)
     except Exception as e:
         print(f"❌ Error in sentiment analysis: {str(e)}")
         import traceback
@@ -185,10 +365,94 @@ async def analyze_sentiment_trends(request: SentimentAnalysisRequest):
             }
         }
 
+@app.post("/api/sentiment_batch")
+async def analyze_sentiment_batch(request: SentimentBatchRequest):
+    """
+    Score many texts (e.g. ad-copy variants) with batched Gemini calls
+    """
+    try:
+        print(f"🎭 Processing batch sentiment for {len(request.texts)} texts")
+        results = await sentiment_analyzer.analyze_sentiment_batch(request.texts, request.batch_size)
+        return {
+            "success": True,
+            "data": [asdict(result) for result in results]
+        }
+    except SchedulerBusy as e:
+        return scheduler_busy_response(e)
+    except Exception as e:
+        print(f"❌ Error in batch sentiment analysis: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+@app.post("/api/customer_segments")
+async def customer_segments(request: CustomerSegmentRequest):
+    """
+    RAG customer segmentation (fast fallback while the RAG system warms up)
+    """
+    try:
+        if request.cohort_size is not None and not 1 <= request.cohort_size <= SEGMENT_MAX_COHORT_SIZE:
+            raise ValueError(f"cohort_size must be between 1 and {SEGMENT_MAX_COHORT_SIZE}")
+        segments = await asyncio.to_thread(get_customer_segments_or_fallback, request.product, request.query,
+                                           "primary", request.cohort_size)
+        return {"success": True, "data": segments}
+    except Exception as e:
+        print(f"❌ Error in customer segmentation: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@app.post("/api/customer_segments/batch")
+async def customer_segments_batch(request: CustomerSegmentBatchRequest):
+    """
+    RAG customer segmentation for a whole catalogue in one batched retrieval
+    """
+    try:
+        if len(request.items) > SEGMENT_BATCH_MAX_ITEMS:
+            raise ValueError(f"items is limited to {SEGMENT_BATCH_MAX_ITEMS}")
+        pairs = [(item.product, item.query) for item in request.items]
+        segments = await asyncio.to_thread(get_customer_segments_batch_or_fallback, pairs)
+        return {"success": True, "data": segments}
+    except Exception as e:
+        print(f"❌ Error in batch customer segmentation: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "message": "MarketBridge backend is operational"}
+    # Liveness stays "healthy" while components warm up; readiness is reported separately
+    rag = rag_readiness()
+    return {
+        "status": "healthy",
+        "message": "MarketBridge backend is operational",
+        "ready": rag["ready"],
+        "readiness": {"rag": rag}
+    }
+
+@app.get("/api/cache_stats")
+async def cache_stats():
+    """Hit/miss counters for the shared LLM response cache, the RAG retrieval caches and data files"""
+    return {"llm_cache": get_llm_cache().stats(), "retrieval_cache": retrieval_cache_stats(),
+            "data_files": data_file_stats()}
+
+@app.get("/api/llm_stats")
+async def llm_stats():
+    """Queue depth, retries and rejections for the LLM scheduler"""
+    return {"llm_scheduler": llm_scheduler.stats()}
+
+def scheduler_busy_response(error: SchedulerBusy):
+    """429 telling the client to back off while the LLM queue drains"""
+    print(f"⏳ {error}")
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": str(int(error.retry_after + 0.5))},
+        content={"success": False, "error": str(error), "retry_after": error.retry_after}
+    )
 
 if __name__ == "__main__":
     print("🚀 Starting MarketBridge Backend Server...")
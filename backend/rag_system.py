@@ -1,187 +1,671 @@
+import hashlib
 import json
 import os
+import threading
+import time
 import chromadb
 from chromadb.config import Settings
-from typing import List, Dict
+try:
+    from chromadb.errors import NotFoundError as CollectionNotFound
+except ImportError:  # chromadb < 0.6 raises ValueError for a missing collection
+    CollectionNotFound = ValueError
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+from customer_store import CustomerStore, iter_customers
+from embedding_backend import build_embedding_function
+from vector_store import (RAG_FAISS_PATH, RAG_SHARD_BY, RAG_SHARDS, RAG_VECTOR_STORE, ChromaVectorStore,
+                          FaissVectorStore, ShardedVectorStore)
+from keyword_matcher import build_matcher
+from ttl_cache import TTLCache
+
+# Audience lexicons for keyword scoring (data/lexicons.json) - compiled once at import
+QUERY_MATCHER = build_matcher("audience_query")
+DEMOGRAPHIC_MATCHER = build_matcher("audience_demographics")
+
+
+# Incremental sync settings
+RAG_UPSERT_BATCH_SIZE = int(os.getenv("RAG_UPSERT_BATCH_SIZE", "256"))
+RAG_EMBED_WORKERS = int(os.getenv("RAG_EMBED_WORKERS", "4"))
+RAG_SYNC_PAGE_SIZE = 10000
+# Startup skips the sync when the customer source's mtime and size match the
+# last complete sync (RAG_FORCE_SYNC=1 re-checks every record anyway)
+RAG_FORCE_SYNC = os.getenv("RAG_FORCE_SYNC", "0") == "1"
+
+# Retrieval caches: ranked results keyed by collection version, and query
+# embeddings (which do not depend on the collection)
+RAG_CACHE_MAX_ENTRIES = int(os.getenv("RAG_CACHE_MAX_ENTRIES", "4096"))
+# The collection version only sees this process's writes; results expire after
+# RAG_CACHE_TTL seconds so writes by other workers show up (0 = never expire)
+RAG_CACHE_TTL = float(os.getenv("RAG_CACHE_TTL", "300"))
+RAG_CACHE_MAX_BYTES = int(os.getenv("RAG_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RAG_EMBED_CACHE_MAX_ENTRIES = int(os.getenv("RAG_EMBED_CACHE_MAX_ENTRIES", "8192"))
+RAG_EMBED_CACHE_MAX_BYTES = int(os.getenv("RAG_EMBED_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Bump when derived metadata changes so the incremental sync re-upserts everyone
+METADATA_VERSION = 2
+
+# Income band thresholds and demographic hints used when income is missing
+INCOME_BANDS = [(40000, "low"), (100000, "mid")]
+HIGH_INCOME_HINTS = ('high income', 'luxury', 'executive', 'disposable income')
+LOW_INCOME_HINTS = ('budget', 'student', 'value-conscious')
+# Age buckets reported in segment insights
+AGE_BUCKET_EDGES = [0, 25, 35, 45, 55, np.inf]
+AGE_BUCKET_LABELS = ["18-24", "25-34", "35-44", "45-54", "55+"]
+# Boolean filter flags kept out of search results
+FILTER_FLAG_PREFIXES = ('seg_', 'audience_')
+
+# Persistent Chroma directory (shards live in shard-NN subdirectories)
+RAG_CHROMA_PATH = os.getenv("RAG_CHROMA_PATH", "./chroma_db")
+
+# Customer source: JSON ({"customers": [...]}), NDJSON/JSONL or CSV
+RAG_CUSTOMER_DATA = os.getenv(
+    "RAG_CUSTOMER_DATA",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "customers.json")
+)
+
+
+def source_fingerprint(path: str) -> Optional[Dict]:
+    """What identifies one version of the customer source (None when it cannot be read)"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return {"source": os.path.abspath(path), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size,
+            "metadata_version": METADATA_VERSION}
+
+def income_band(customer: Dict) -> str:
+    """low / mid / high - from income when known, otherwise from demographics"""
+    income = customer.get('income')
+    if isinstance(income, (int, float)):
+        for ceiling, band in INCOME_BANDS:
+            if income < ceiling:
+                return band
+        return "high"
+    demographics = (customer.get('demographics') or '').lower()
+    if any(hint in demographics for hint in HIGH_INCOME_HINTS):
+        return "high"
+    if any(hint in demographics for hint in LOW_INCOME_HINTS):
+        return "low"
+    return "mid"
+
+
+def audience_clause(audience: str) -> Dict:
+    """Chroma where clause for customers eligible for an audience.
+
+    Same tests as calculate_keyword_score, on the same fields: a customer
+    the clause excludes would score 0 for that audience. Missing age or
+    income never matches, as the scoring defaults (25, 50000) never qualify.
+    """
+    if audience == 'student':
+        return {"$or": [{"audience_student": True}, {"age": {"$lt": 25}}]}
+    if audience == 'executive':
+        return {"$or": [{"audience_executive": True}, {"income": {"$gt": 100000}}]}
+    return {f"audience_{audience}": True}
+
+
+def build_where(filters: Dict) -> Dict:
+    """Translate structured filters into a Chroma where clause (None when empty).
+
+    Supported keys: age_min, age_max, income_band, state, segments (any of),
+    audiences (any of). List values match any element.
+    """
+    def as_list(value):
+        return list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+
+    def any_of(clauses):
+        return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+    clauses = []
+    if filters.get('age_min') is not None:
+        clauses.append({"age": {"$gte": filters['age_min']}})
+    if filters.get('age_max') is not None:
+        clauses.append({"age": {"$lte": filters['age_max']}})
+    if filters.get('income_band'):
+        clauses.append({"income_band": {"$in": as_list(filters['income_band'])}})
+    if filters.get('state'):
+        clauses.append({"state": {"$in": [state.upper() for state in as_list(filters['state'])]}})
+    if filters.get('segments'):
+        clauses.append(any_of([{f"seg_{segment}": True} for segment in as_list(filters['segments'])]))
+    if filters.get('audiences'):
+        clauses.append(any_of([audience_clause(audience) for audience in sorted(as_list(filters['audiences']))]))
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def normalize_text(text: str) -> str:
+    """Case- and whitespace-insensitive form of a query for cache keys"""
+    return ' '.join((text or '').lower().split())
+
+
+def results_size(results) -> int:
+    """Approximate bytes held by a cached result list, or a cohort's row array"""
+    if isinstance(results, np.ndarray):
+        return results.nbytes + 64
+    return sum(len(json.dumps(customer, default=str)) for customer in results) + 64
+
+
+def embedding_size(embedding) -> int:
+    return np.asarray(embedding).nbytes + 64
+
+
+def infer_filters(query: str) -> Dict:
+    """Pre-filters implied by a query - e.g. 'budget students' only scans eligible students"""
+    audiences = query_audiences_for(query)
+    return {"audiences": sorted(audiences)} if audiences else {}
+
+
+# Keyword scoring checks audiences in this order and only scores the first named
+KEYWORD_AUDIENCE_ORDER = ('executive', 'student', 'creative')
+
+
+def primary_audience_index(query: str) -> int:
+    """Index into KEYWORD_AUDIENCE_ORDER of the audience a query is scored for (-1 for none)"""
+    audiences = query_audiences_for(query)
+    for index, audience in enumerate(KEYWORD_AUDIENCE_ORDER):
+        if audience in audiences:
+            return index
+    return -1
+
+
+@lru_cache(maxsize=1024)
+def query_audiences_for(query: str) -> frozenset:
+    """Audience categories named in a query (cached - the same query scores many customers)"""
+    return frozenset(QUERY_MATCHER.categories_present(query))
 
 
 class ChromaRAGSystem:
     def __init__(self):
         self.client = None
         self.collection = None
-        self.customer_data = []
+        # What retrieval talks to: the Chroma collection or a FAISS index (RAG_VECTOR_STORE),
+        # split into RAG_SHARDS shards when more than one
+        self.store = None
+        # Configurable local model (RAG_EMBED_*); each model gets its own collection
+        self.embedding_function = build_embedding_function()
+        self.collection_name = "marketbridge_customers" + self.embedding_function.collection_suffix
+        self.customer_data = CustomerStore()
+        self.sync_error = None  # Set when the last ChromaDB sync failed partway
+        # Bumped on every write this process makes, so its own writes are never served stale.
+        # Process-local: another worker's sync is only picked up when entries expire (RAG_CACHE_TTL)
+        self.collection_version = 0
+        self.result_cache = TTLCache(max_entries=RAG_CACHE_MAX_ENTRIES, ttl=RAG_CACHE_TTL or None,
+                                     max_bytes=RAG_CACHE_MAX_BYTES,
+                                     sizeof=results_size)
+        self.embedding_cache = TTLCache(max_entries=RAG_EMBED_CACHE_MAX_ENTRIES, max_bytes=RAG_EMBED_CACHE_MAX_BYTES,
+                                        sizeof=embedding_size)
         self.product_data = []
         self.finance_data = []
-        self.setup_chromadb()
+        self.setup_vector_store()
         self.load_data()
 
-    def setup_chromadb(self):
-        """Initialize ChromaDB with persistent storage"""
+    def setup_vector_store(self):
+        """Open the configured vector store, or RAG_SHARDS shards of it"""
+        if RAG_SHARDS <= 1:
+            self.store = self.open_store()
+            return
+        shards = [self.open_store(shard) for shard in range(RAG_SHARDS)]
+        if all(shards):
+            self.store = ShardedVectorStore(shards)
+            print(f"🧩 {RAG_SHARDS} shards by {RAG_SHARD_BY}: {self.store.count()} vectors")
+        else:
+            print("❌ Some shards failed to open, using fallback search")
+
+    def open_store(self, shard: int = None):
+        """Open one vector store (None on error); a shard gets its own directory"""
+        shard_dir = [f"shard-{shard:02d}"] if shard is not None else []
+        if RAG_VECTOR_STORE == "faiss":
+            try:
+                store = FaissVectorStore(os.path.join(RAG_FAISS_PATH, self.collection_name, *shard_dir))
+                print(f"📊 FAISS store has {store.count()} vectors")
+                return store
+            except Exception as e:
+                print(f"❌ FAISS setup error: {e}")
+                return None
+        collection = self.setup_chromadb(os.path.join(RAG_CHROMA_PATH, *shard_dir))
+        return ChromaVectorStore(collection) if collection else None
+
+    def setup_chromadb(self, path: str = None):
+        """Initialize ChromaDB with persistent storage; returns the collection (None on error)"""
         try:
             # Create persistent ChromaDB client
-            self.client = chromadb.PersistentClient(
-                path="./chroma_db",
+            client = chromadb.PersistentClient(
+                path=path or RAG_CHROMA_PATH,
                 settings=Settings(
                     allow_reset=True,
                     anonymized_telemetry=False
                 )
             )
             
-            # Get or create collection (using default embeddings)
+            # Get or create the collection for the configured embedding model. No
+            # embedding function is attached: documents and queries are always
+            # embedded by self.embedding_function before they reach Chroma, and
+            # attaching one would conflict with the function the collection
+            # was persisted with.
             try:
-                self.collection = self.client.get_collection("marketbridge_customers")
-                print("✅ Connected to existing ChromaDB collection")
-            except Exception:
-                self.collection = self.client.create_collection(
-                    name="marketbridge_customers",
-                    metadata={"description": "MarketBridge customer profiles for RAG"}
+                collection = client.get_collection(self.collection_name)
+                print(f"✅ Connected to existing ChromaDB collection {self.collection_name}")
+            except CollectionNotFound:
+                collection = client.create_collection(
+                    name=self.collection_name,
+                    metadata={
+                        "description": "MarketBridge customer profiles for RAG",
+                        "embedding_model": self.embedding_function.model_id
+                    }
                 )
-                print("✅ Created new ChromaDB collection")
+                print(f"✅ Created new ChromaDB collection {self.collection_name}")
             
-            print(f"📊 ChromaDB collection has {self.collection.count()} documents")
+            print(f"📊 ChromaDB collection has {collection.count()} documents")
+            if self.client is None:
+                self.client, self.collection = client, collection
+            return collection
             
         except Exception as e:
             print(f"❌ ChromaDB setup error: {e}")
-            self.client = None
-            self.collection = None
+            return None
 
     def load_data(self):
         """Load data and populate ChromaDB if needed"""
         try:
-            # Load customer data from JSON
-            self.customer_data = self.load_customer_data()
             self.product_data = self.load_product_data()
             self.finance_data = self.load_finance_data()
             
-            # Populate ChromaDB if empty or outdated
-            if self.collection and self.collection.count() < len(self.customer_data):
-                self.populate_chromadb()
+            # Stream customers once: each record goes into the columnar store
+            # and straight on to the ChromaDB sync, which only pays for new,
+            # changed or removed customers
+            self.customer_data = CustomerStore()
+            # Taken before reading, so a file that changes mid-read is synced again next start
+            fingerprint = source_fingerprint(RAG_CUSTOMER_DATA)
+            customers = self.load_customer_data(RAG_CUSTOMER_DATA)
+            try:
+                if self.store and self.source_unchanged(fingerprint):
+                    print("⏭️ Customer source unchanged since the last sync, skipping ChromaDB sync")
+                elif self.store:
+                    self.populate_chromadb(customers)
+                    self.record_sync(fingerprint)
+            except Exception as e:
+                self.sync_error = str(e)
+                print(f"❌ ChromaDB sync failed: {e}")
+            finally:
+                # Finish ingestion even when the sync stopped early - keyword
+                # fallback and cohort statistics read the columnar store
+                for _ in customers:
+                    pass
+            if self.sync_error:
+                print(f"⚠️ Degraded: vector search is missing customers the sync did not reach; "
+                      f"all {len(self.customer_data)} customers are loaded for keyword fallback")
                 
             print(f"✅ Enhanced ChromaDB RAG System loaded: {len(self.customer_data)} customers, {len(self.product_data)} products")
             
         except Exception as e:
             print(f"❌ Data loading error: {e}")
 
-    def populate_chromadb(self):
-        """Populate ChromaDB with customer data (FIXED for metadata types)"""
-        print("🔄 Populating ChromaDB with customer data...")
+    def populate_chromadb(self, customers=None):
+        """Incrementally sync ChromaDB with customer data.
+
+        Each record is hashed and compared with the hash stored in its
+        metadata; only new or changed customers are embedded and upserted (in
+        bounded batches, embedding batches in parallel), and customers no
+        longer in the source are deleted.
+        """
+        print("🔄 Syncing ChromaDB with customer data...")
+        started = time.monotonic()
+        customers = self.customer_data if customers is None else customers
+        
+        stored_hashes = self.get_stored_hashes()
+        seen_ids = set()
+        pending = {}
+        upserted = 0
+        
+        with ThreadPoolExecutor(max_workers=RAG_EMBED_WORKERS, thread_name_prefix="rag-embed") as executor:
+            in_flight = deque()
+            for customer in customers:
+                customer_id = self.customer_doc_id(customer)
+                seen_ids.add(customer_id)
+                record_hash = self.customer_record_hash(customer)
+                if stored_hashes.get(customer_id) == record_hash:
+                    continue
+                pending[customer_id] = (customer, record_hash)  # Later duplicates win
+                if len(pending) >= RAG_UPSERT_BATCH_SIZE:
+                    in_flight.append(executor.submit(self.prepare_batch, pending))
+                    pending = {}
+                    # Bound memory: never hold more than a few embedded batches
+                    while len(in_flight) > RAG_EMBED_WORKERS:
+                        upserted += self.upsert_batch(in_flight.popleft().result())
+            if pending:
+                in_flight.append(executor.submit(self.prepare_batch, pending))
+            while in_flight:
+                upserted += self.upsert_batch(in_flight.popleft().result())
         
+        removed_ids = [customer_id for customer_id in stored_hashes if customer_id not in seen_ids]
+        for i in range(0, len(removed_ids), RAG_UPSERT_BATCH_SIZE):
+            self.store.delete(ids=removed_ids[i:i + RAG_UPSERT_BATCH_SIZE])
+        self.store.flush()
+        if removed_ids or upserted:
+            self.bump_collection_version()
+        
+        print(f"✅ ChromaDB sync: {upserted} upserted, {len(removed_ids)} deleted, "
+              f"{len(seen_ids) - upserted} unchanged ({time.monotonic() - started:.1f}s)")
+
+    def sync_state_path(self) -> str:
+        """Where the last complete sync is recorded - beside the store it describes"""
+        root = RAG_FAISS_PATH if RAG_VECTOR_STORE == "faiss" else RAG_CHROMA_PATH
+        return os.path.join(root, f"{self.collection_name}.sync.json")
+
+    def source_unchanged(self, fingerprint: Optional[Dict]) -> bool:
+        """True when the store already holds a complete sync of this version of the source"""
+        if RAG_FORCE_SYNC or fingerprint is None:
+            return False
+        try:
+            with open(self.sync_state_path()) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        # The count catches a store that was wiped or partly written since
+        return state.get("fingerprint") == fingerprint and state.get("count") == self.store.count()
+
+    def record_sync(self, fingerprint: Optional[Dict]):
+        """Remember the source version a complete sync was made from"""
+        if fingerprint is None:
+            return
+        path = self.sync_state_path()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            scratch = f"{path}.{os.getpid()}.tmp"
+            with open(scratch, "w") as f:
+                json.dump({"fingerprint": fingerprint, "count": self.store.count()}, f)
+            os.replace(scratch, path)
+        except OSError as e:
+            print(f"⚠️ Could not record the sync state: {e}")
+
+    def get_stored_hashes(self) -> Dict[str, str]:
+        """Map of document id -> record hash for everything already in the collection"""
+        stored = {}
+        offset = 0
+        while True:
+            page = self.store.get(include=['metadatas'], limit=RAG_SYNC_PAGE_SIZE, offset=offset)
+            for doc_id, metadata in zip(page['ids'], page['metadatas']):
+                stored[doc_id] = (metadata or {}).get('record_hash')
+            if len(page['ids']) < RAG_SYNC_PAGE_SIZE:
+                return stored
+            offset += RAG_SYNC_PAGE_SIZE
+
+    def prepare_batch(self, batch: Dict) -> Dict:
+        """Build documents and metadata for a batch and embed them (runs on a worker)"""
+        ids = list(batch)
         documents = []
         metadatas = []
-        ids = []
+        for customer_id in ids:
+            customer, record_hash = batch[customer_id]
+            metadata = self.customer_metadata(customer)
+            metadata['record_hash'] = record_hash
+            documents.append(self.customer_document(customer))
+            metadatas.append(metadata)
+        return {
+            'ids': ids,
+            'documents': documents,
+            'metadatas': metadatas,
+            'embeddings': self.embedding_function(documents)
+        }
+
+    def upsert_batch(self, prepared: Dict) -> int:
+        """Write one embedded batch to ChromaDB"""
+        self.store.upsert(
+            ids=prepared['ids'],
+            documents=prepared['documents'],
+            metadatas=prepared['metadatas'],
+            embeddings=prepared['embeddings']
+        )
+        self.bump_collection_version()
+        return len(prepared['ids'])
+
+    def bump_collection_version(self):
+        """Mark the collection as changed by this process; cached results for older versions are dropped"""
+        self.collection_version += 1
+        self.result_cache.clear()
+
+    def embed_queries(self, texts: List[str]) -> List:
+        """Embed search texts, reusing cached embeddings and embedding the rest in one call"""
+        keys = [normalize_text(text) for text in texts]
+        embeddings = [self.embedding_cache.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            computed = self.embedding_function([texts[i] for i in missing])
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = embedding
+                self.embedding_cache.set(keys[i], embedding)
+        return embeddings
+
+    def cache_stats(self) -> Dict:
+        """Hit rates and sizes of the retrieval caches"""
+        return {
+            "collection_version": self.collection_version,
+            "sync_error": self.sync_error,
+            "results": self.result_cache.stats(),
+            "query_embeddings": self.embedding_cache.stats(),
+            "embedding_backend": self.embedding_function.stats(),
+            "vector_store": self.store.stats() if self.store else None
+        }
+
+    @staticmethod
+    def customer_doc_id(customer: Dict) -> str:
+        return f"customer_{customer.get('id', customer.get('name', 'unknown'))}"
+
+    @staticmethod
+    def customer_record_hash(customer: Dict) -> str:
+        """Stable content hash of a customer record"""
+        canonical = json.dumps([METADATA_VERSION, customer], sort_keys=True, default=str, separators=(',', ':'))
+        return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def customer_document(customer: Dict) -> str:
+        """Searchable document text for a customer"""
+        interests_text = ', '.join(customer.get('interests', [])) if isinstance(customer.get('interests', []), list) else str(customer.get('interests', ''))
         
-        for customer in self.customer_data:
-            # Create searchable document text
-            interests_text = ', '.join(customer.get('interests', [])) if isinstance(customer.get('interests', []), list) else str(customer.get('interests', ''))
-            
-            doc_text = f"""
+        return f"""
             {customer.get('demographics', '')} {customer.get('preferences', '')} 
             {interests_text} age {customer.get('age', 0)} 
             income {customer.get('income', 0)} {customer.get('location', '')}
             """.strip()
-            
-            # Convert customer metadata to ChromaDB-compatible format
-            safe_metadata = {}
-            for key, value in customer.items():
-                if isinstance(value, list):
-                    # Convert lists to comma-separated strings
-                    safe_metadata[key] = ', '.join(map(str, value))
-                elif isinstance(value, (str, int, float, bool)) or value is None:
-                    # Keep supported types as-is
-                    safe_metadata[key] = value
-                else:
-                    # Convert other types to string
-                    safe_metadata[key] = str(value)
-            
-            documents.append(doc_text)
-            metadatas.append(safe_metadata)
-            ids.append(f"customer_{customer.get('id', customer.get('name', 'unknown'))}")
-        
-        # Add to ChromaDB
-        self.collection.add(
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
+
+    @staticmethod
+    def customer_metadata(customer: Dict) -> Dict:
+        """Convert customer metadata to ChromaDB-compatible format, plus derived filter fields"""
+        safe_metadata = {}
+        for key, value in customer.items():
+            if isinstance(value, list):
+                # Convert lists to comma-separated strings
+                safe_metadata[key] = ', '.join(map(str, value))
+            elif isinstance(value, (str, int, float, bool)) or value is None:
+                # Keep supported types as-is
+                safe_metadata[key] = value
+            else:
+                # Convert other types to string
+                safe_metadata[key] = str(value)
         
-        print(f"✅ Added {len(documents)} customers to ChromaDB")
+        # Derived fields for where-clause pre-filtering
+        if isinstance(customer.get('age'), (int, float)):
+            safe_metadata['age'] = int(customer['age'])
+        safe_metadata['income_band'] = income_band(customer)
+        location = customer.get('location') or ''
+        if ',' in location:
+            safe_metadata['state'] = location.rsplit(',', 1)[1].strip().upper()
+        segments = customer.get('segments') or []
+        for segment in segments if isinstance(segments, list) else str(segments).split(','):
+            safe_metadata[f"seg_{str(segment).strip()}"] = True
+        for audience in DEMOGRAPHIC_MATCHER.categories_present(customer.get('demographics', '') or ''):
+            safe_metadata[f"audience_{audience}"] = True
+        return safe_metadata
 
-    def find_relevant_customers(self, product: str, query: str, top_k: int = 10) -> List[Dict]:
-        """ChromaDB-powered customer search with hybrid scoring"""
+    def find_relevant_customers(self, product: str, query: str, top_k: int = 10,
+                                filters: Dict = None, search_params: Dict = None) -> List[Dict]:
+        """ChromaDB-powered customer search with hybrid scoring.
+
+        filters are pushed into the Chroma where clause so only the eligible
+        slice is searched; when None they are inferred from the query, pass
+        {} to search everyone. An empty filtered slice falls back to an
+        unfiltered search. search_params ({"nprobe": ...} / {"efSearch": ...})
+        trade recall for latency on the FAISS store.
+        """
         print(f"🔍 CHROMADB SEARCH: '{query}' | PRODUCT: '{product}'")
-        
-        if not self.collection:
+        return self.find_relevant_customers_batch([(product, query)], top_k=top_k, filters=filters,
+                                                  search_params=search_params)[0]
+
+    def find_relevant_customers_batch(self, pairs: List[Tuple[str, str]], top_k: int = 10,
+                                      filters: Dict = None, search_params: Dict = None) -> List[List[Dict]]:
+        """Search for many (product, query) pairs at once.
+
+        All search texts are embedded in one pass, queries sharing a where
+        clause go to the vector store as one multi-query, and keyword scoring
+        runs as array operations over every result. Returns one ranked list
+        per pair.
+        """
+        if not pairs:
+            return []
+        if not self.store:
             print("⚠️ ChromaDB not available, using fallback")
-            return self.fallback_customer_search(product, query)
+            return [self.fallback_customer_search(product, query) for product, query in pairs]
         
-        try:
-            # Search ChromaDB
-            search_query = f"{query} {product}"
-            
-            results = self.collection.query(
-                query_texts=[search_query],
-                n_results=min(top_k, self.collection.count()),
-                include=['documents', 'metadatas', 'distances']
-            )
-            
-            print(f"📊 ChromaDB returned {len(results['ids'][0])} results")
+        # Serve repeated pairs from the result cache; only misses touch the model or Chroma
+        version = self.collection_version
+        keys = [
+            (version, normalize_text(product), normalize_text(query), top_k,
+             None if filters is None else json.dumps(filters, sort_keys=True, default=str),
+             json.dumps(search_params, sort_keys=True) if search_params else None)
+            for product, query in pairs
+        ]
+        ranked = [self.result_cache.get(key) for key in keys]
+        misses = [i for i, cached in enumerate(ranked) if cached is None]
+        if misses:
+            print(f"⚡ Retrieval cache: {len(pairs) - len(misses)}/{len(pairs)} hits")
+            try:
+                results = self.search_batch([pairs[i] for i in misses], top_k, filters, search_params)
+            except Exception as e:
+                print(f"❌ ChromaDB search error: {e}")
+                return [self.fallback_customer_search(product, query) for product, query in pairs]
+            for i, customers in zip(misses, results):
+                ranked[i] = customers
+                if version == self.collection_version:
+                    self.result_cache.set(keys[i], customers)
+        # Copies, so callers can annotate results without touching the cache
+        return [[dict(customer) for customer in customers] for customers in ranked]
+
+    def search_batch(self, pairs: List[Tuple[str, str]], top_k: int, filters: Dict,
+                     search_params: Dict = None) -> List[List[Dict]]:
+        """Uncached batch search: one embedding pass and one multi-query per where clause"""
+        n_results = min(top_k, self.store.count())
+        if not n_results:
+            return [[] for _ in pairs]
+        
+        queries = [query for _, query in pairs]
+        embeddings = self.embed_queries([f"{query} {product}" for product, query in pairs])
+        
+        # Group queries by where clause so each group is one store call
+        groups = {}
+        for i, query in enumerate(queries):
+            where = build_where(infer_filters(query) if filters is None else filters)
+            groups.setdefault(json.dumps(where, sort_keys=True), (where, []))[1].append(i)
+        
+        hits = [None] * len(pairs)
+        for where, indices in groups.values():
+            if where:
+                print(f"🧮 Pre-filter ({len(indices)} queries): {where}")
+            self.query_into(hits, indices, embeddings, n_results, where, search_params)
+        
+        # Empty filtered slices fall back to one unfiltered multi-query
+        empty = [i for i, hit in enumerate(hits) if not hit or not hit[0]]
+        if empty:
+            self.query_into(hits, empty, embeddings, n_results, None, search_params)
+        
+        print(f"📊 ChromaDB returned {sum(len(hit[0]) for hit in hits)} results for {len(pairs)} queries")
+        return self.score_results(queries, hits)
+
+    def query_into(self, hits: List, indices: List[int], embeddings, n_results: int, where: Dict,
+                   search_params: Dict = None):
+        """Run one multi-query for the given rows and store (ids, metadatas, distances) per row"""
+        results = self.store.query(
+            query_embeddings=[embeddings[i] for i in indices],
+            n_results=n_results,
+            include=['metadatas', 'distances'],
+            where=where,
+            search_params=search_params
+        )
+        for row, i in enumerate(indices):
+            hits[i] = (results['ids'][row], results['metadatas'][row], results['distances'][row])
+
+    def score_results(self, queries: List[str], hits: List) -> List[List[Dict]]:
+        """Hybrid semantic + keyword scores for every hit, computed as arrays.
+
+        Customer keyword features are extracted once per distinct customer,
+        then combined with each query's audience in one gather.
+        """
+        rows = {}
+        features = []
+        for _, metadatas, _ in hits:
+            for metadata in metadatas:
+                customer_id = metadata.get('id', metadata.get('name'))
+                if customer_id not in rows:
+                    rows[customer_id] = len(features)
+                    features.append(metadata)
+        
+        # keyword_table[audience, customer] is the keyword score for that pairing
+        audiences = [DEMOGRAPHIC_MATCHER.categories_present(m.get('demographics', '') or '') for m in features]
+        ages = np.array([m.get('age', 25) for m in features], dtype=np.float64)
+        incomes = np.array([m.get('income', 50000) for m in features], dtype=np.float64)
+        has = {a: np.array([a in present for present in audiences], dtype=bool) for a in KEYWORD_AUDIENCE_ORDER}
+        keyword_table = np.zeros((len(KEYWORD_AUDIENCE_ORDER) + 1, len(features)))
+        keyword_table[0] = np.where(has['executive'], 15, np.where(incomes > 100000, 12, 0))
+        keyword_table[1] = np.where(has['student'], 15, np.where(ages < 25, 12, 0))
+        keyword_table[2] = np.where(has['creative'], 15, 0)  # Last row stays 0 for queries with no audience
+        
+        ranked = []
+        for query, (ids, metadatas, distances) in zip(queries, hits):
+            customer_rows = np.array([rows[m.get('id', m.get('name'))] for m in metadatas], dtype=np.int64)
+            semantic = np.maximum(0, 1.0 - np.asarray(distances, dtype=np.float64)) * 10
+            total = semantic + keyword_table[primary_audience_index(query), customer_rows]
             
-            # Convert results and add scoring
             relevant_customers = []
-            
-            for i, (customer_id, document, metadata, distance) in enumerate(zip(
-                results['ids'][0], results['documents'][0], 
-                results['metadatas'][0], results['distances'][0]
-            )):
-                # Semantic similarity score
-                semantic_score = max(0, 1.0 - distance) * 10
-                
-                # Keyword-based scoring
-                keyword_score = self.calculate_keyword_score(metadata, query)
-                
-                # Total score
-                total_score = semantic_score + keyword_score
-                
-                customer = metadata.copy()
-                customer['relevance_score'] = round(total_score, 2)
+            for index in np.argsort(-total, kind='stable'):
+                metadata = metadatas[index]
+                customer = {key: value for key, value in metadata.items() if not key.startswith(FILTER_FLAG_PREFIXES)}
+                customer['relevance_score'] = round(float(total[index]), 2)
                 relevant_customers.append(customer)
-                
-                print(f"🎯 {metadata.get('name', 'Unknown')}: Score={total_score:.1f}")
-            
-            # Sort by score
-            relevant_customers.sort(key=lambda x: x['relevance_score'], reverse=True)
-            
-            return relevant_customers
-            
-        except Exception as e:
-            print(f"❌ ChromaDB search error: {e}")
-            return self.fallback_customer_search(product, query)
+            ranked.append(relevant_customers)
+        return ranked
 
     def calculate_keyword_score(self, customer: dict, query: str) -> int:
         """Keyword scoring logic"""
         score = 0
-        query_lower = query.lower()
-        demographics = customer.get('demographics', '').lower()
+        query_audiences = query_audiences_for(query)
+        if not query_audiences:
+            return score
+        demographic_audiences = DEMOGRAPHIC_MATCHER.categories_present(customer.get('demographics', '') or '')
         age = customer.get('age', 25)
         income = customer.get('income', 50000)
         
         # Executive keywords
-        if any(kw in query_lower for kw in ['executive', 'business', 'professional', 'premium', 'luxury']):
-            if any(word in demographics for word in ['executive', 'manager', 'business', 'ceo']):
+        if 'executive' in query_audiences:
+            if 'executive' in demographic_audiences:
                 score += 15
             elif income > 100000:
                 score += 12
                 
         # Student keywords
-        elif any(kw in query_lower for kw in ['student', 'college', 'budget', 'affordable', 'cheap']):
-            if any(word in demographics for word in ['student', 'college', 'university']):
+        elif 'student' in query_audiences:
+            if 'student' in demographic_audiences:
                 score += 15
             elif age < 25:
                 score += 12
                 
         # Creative keywords
-        elif any(kw in query_lower for kw in ['designer', 'creative', 'stylish', 'aesthetic']):
-            if any(word in demographics for word in ['designer', 'creative', 'artist']):
+        elif 'creative' in query_audiences:
+            if 'creative' in demographic_audiences:
                 score += 15
         
         return score
@@ -200,10 +684,25 @@ class ChromaRAGSystem:
         
         return sorted(relevant_customers, key=lambda x: x['relevance_score'], reverse=True)
 
-    def get_customer_segments(self, product: str, query: str, segment_type: str) -> Dict:
-        """Customer segmentation using ChromaDB"""
-        relevant_customers = self.find_relevant_customers(product, query)
-        
+    def get_customer_segments(self, product: str, query: str, segment_type: str,
+                              cohort_size: int = None) -> Dict:
+        """Customer segmentation using ChromaDB.
+
+        Primary and secondary insights always describe the top three and the
+        next three matches. With cohort_size, insights['cohort'] adds
+        statistics over the top cohort_size matches.
+        """
+        segments = self.build_segments(self.find_relevant_customers(product, query))
+        if cohort_size:
+            segments['insights']['cohort'] = self.cohort_insights(product, query, cohort_size)
+        return segments
+
+    def get_customer_segments_batch(self, pairs: List[Tuple[str, str]]) -> List[Dict]:
+        """Customer segmentation for many (product, query) pairs with one batched retrieval"""
+        return [self.build_segments(customers) for customers in self.find_relevant_customers_batch(pairs)]
+
+    def build_segments(self, relevant_customers: List[Dict]) -> Dict:
+        """Split ranked customers into primary / secondary segments with insights"""
         if not relevant_customers:
             relevant_customers = self.get_fallback_customers()
         
@@ -224,14 +723,83 @@ class ChromaRAGSystem:
             }
         }
 
-    def calculate_segment_insights(self, customers: List[Dict], segment_type: str) -> Dict:
+    def cohort_insights(self, product: str, query: str, cohort_size: int) -> Dict:
+        """Insights over the top cohort_size matches (reach and conversions at primary rates)"""
+        try:
+            rows = self.cohort_rows(product, query, cohort_size)
+        except Exception as e:
+            print(f"❌ Cohort search error, using keyword matches: {e}")
+            rows = None
+        if rows is None:
+            # No usable vector store: summarise the keyword fallback's matches instead
+            customers = self.fallback_customer_search(product, query)[:cohort_size]
+            return self.calculate_segment_insights(customers, "primary")
+        columns = {field: self.customer_data.column(field)[rows]
+                   for field in ('age', 'income', 'lifetime_value', 'engagement_score')}
+        return self.insights_from_arrays(columns, "primary")
+
+    def cohort_rows(self, product: str, query: str, cohort_size: int) -> Optional[np.ndarray]:
+        """CustomerStore rows of the top cohort_size matches (None without a vector store).
+
+        Only ids and distances come back from the store: the cohort's
+        statistics need no metadata, scoring or per-customer dicts, and the
+        order within the cohort does not change them. Ids missing from the
+        customer store (removed since indexing) are dropped.
+        """
+        if not self.store:
+            return None
+        version = self.collection_version
+        key = ("cohort", version, normalize_text(product), normalize_text(query), cohort_size)
+        rows = self.result_cache.get(key)
+        if rows is not None:
+            return rows
+        
+        n_results = min(cohort_size, self.store.count())
+        if not n_results:
+            return np.empty(0, dtype=np.int64)
+        embedding = self.embed_queries([f"{query} {product}"])[0]
+        where = build_where(infer_filters(query))
+        ids = self.store.query(query_embeddings=[embedding], n_results=n_results, include=['distances'],
+                               where=where)['ids'][0]
+        if where and not ids:
+            ids = self.store.query(query_embeddings=[embedding], n_results=n_results, include=['distances'])['ids'][0]
+        
+        prefix = len("customer_")
+        found = (self.customer_data.row_of(doc_id[prefix:]) for doc_id in ids)
+        rows = np.fromiter((row for row in found if row is not None), dtype=np.int64)
+        if version == self.collection_version:
+            self.result_cache.set(key, rows)
+        return rows
+
+    @staticmethod
+    def calculate_segment_insights(customers: List[Dict], segment_type: str) -> Dict:
         """Calculate market insights"""
         if not customers:
             return {'estimated_reach': 25000, 'projected_conversions': 75, 'avg_age': 28, 'confidence': 0.7}
         
-        total_customers = len(customers)
-        avg_age = sum(customer.get('age', 28) for customer in customers) / total_customers
-        avg_income = sum(customer.get('income', 75000) for customer in customers) / total_customers
+        def column(field):
+            values = (customer.get(field) for customer in customers)
+            return np.fromiter((value if isinstance(value, (int, float)) else np.nan for value in values),
+                               dtype=np.float64, count=len(customers))
+        
+        columns = {field: column(field) for field in ('age', 'income', 'lifetime_value', 'engagement_score')}
+        return ChromaRAGSystem.insights_from_arrays(columns, segment_type)
+
+    @staticmethod
+    def insights_from_arrays(columns: Dict[str, np.ndarray], segment_type: str) -> Dict:
+        """Reach, conversion, age/income distributions and lifetime value for a cohort.
+
+        columns holds one array per field (NaN where missing); missing ages
+        and incomes count as 28 and 75,000.
+        """
+        total_customers = len(columns['age'])
+        if not total_customers:
+            return {'estimated_reach': 25000, 'projected_conversions': 75, 'avg_age': 28, 'confidence': 0.7}
+        
+        ages = np.where(np.isnan(columns['age']), 28, columns['age']).astype(np.float64)
+        incomes = np.where(np.isnan(columns['income']), 75000, columns['income']).astype(np.float64)
+        avg_age = float(ages.mean())
+        avg_income = float(incomes.mean())
         
         base_reach = 35000 if segment_type == 'primary' else 20000
         estimated_reach = int(base_reach * (1 + (avg_income - 75000) / 100000))
@@ -239,29 +807,54 @@ class ChromaRAGSystem:
         base_conversion_rate = 0.035 if segment_type == 'primary' else 0.025
         projected_conversions = int(estimated_reach * base_conversion_rate)
         
-        return {
+        insights = {
             'estimated_reach': estimated_reach,
             'projected_conversions': projected_conversions,
             'avg_age': int(avg_age),
             'avg_income': int(avg_income),
             'conversion_rate': base_conversion_rate,
-            'confidence': 0.85 if segment_type == 'primary' else 0.75
+            'confidence': 0.85 if segment_type == 'primary' else 0.75,
+            'cohort_size': total_customers
         }
+        if total_customers > 1:
+            age_counts = np.histogram(ages, bins=AGE_BUCKET_EDGES)[0]
+            income_counts = np.histogram(incomes, bins=[-np.inf] + [ceiling for ceiling, _ in INCOME_BANDS] + [np.inf])[0]
+            insights['age_distribution'] = dict(zip(AGE_BUCKET_LABELS, age_counts.tolist()))
+            insights['income_distribution'] = dict(zip([band for _, band in INCOME_BANDS] + ["high"],
+                                                       income_counts.tolist()))
+            insights['age_percentiles'] = dict(zip(('p25', 'p50', 'p75'), np.percentile(ages, [25, 50, 75]).round(1).tolist()))
+            insights['income_percentiles'] = dict(zip(('p25', 'p50', 'p75'), np.percentile(incomes, [25, 50, 75]).round(0).tolist()))
+        lifetime_value = columns['lifetime_value'][~np.isnan(columns['lifetime_value'])].astype(np.float64)
+        if len(lifetime_value):
+            insights['lifetime_value'] = {
+                'total': round(float(lifetime_value.sum()), 2),
+                'mean': round(float(lifetime_value.mean()), 2),
+                'p50': round(float(np.percentile(lifetime_value, 50)), 2),
+                'p90': round(float(np.percentile(lifetime_value, 90)), 2)
+            }
+        engagement = columns['engagement_score'][~np.isnan(columns['engagement_score'])]
+        if len(engagement):
+            insights['avg_engagement'] = round(float(engagement.mean()), 3)
+        return insights
 
-    def load_customer_data(self):
-        """Load customer data from JSON"""
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        customer_path = os.path.join(base_dir, "data", "customers.json")
-        
+    def load_customer_data(self, path: str = RAG_CUSTOMER_DATA):
+        """Stream customer records from the CRM export into the columnar store.
+
+        Yields each raw record as it is parsed so callers can feed the sync
+        pipeline without holding the whole file in memory.
+        """
         try:
-            with open(customer_path, 'r') as f:
-                data = json.load(f)
-                customers = data.get("customers", [])
-                print(f"📂 Loaded {len(customers)} customers from JSON file")
-                return customers
+            for customer in iter_customers(path):
+                self.customer_data.append(customer)
+                yield customer
+            print(f"📂 Streamed {len(self.customer_data)} customers from {os.path.basename(path)}")
         except Exception as e:
-            print(f"❌ Error loading customers.json: {e}")
-            return self.get_fallback_customers()
+            print(f"❌ Error loading customer data: {e}")
+            if len(self.customer_data):
+                raise  # Abort the sync rather than delete customers we never reached
+            for customer in self.get_fallback_customers():
+                self.customer_data.append(customer)
+                yield customer
 
     def load_product_data(self):
         """Load product data"""
@@ -275,7 +868,8 @@ class ChromaRAGSystem:
         """Load finance data"""
         return [{"total_budget": 50000, "allocated": 15000}]
 
-    def get_fallback_customers(self):
+    @staticmethod
+    def get_fallback_customers():
         """Fallback customers"""
         return [
             {
@@ -309,10 +903,127 @@ class ChromaRAGSystem:
 
 # Initialize ChromaDB RAG system
 _rag_instance = None
+_rag_lock = threading.Lock()
+_rag_state = {"status": "not_started", "error": None, "load_seconds": None}
 
 def get_rag_system():
     """Get ChromaDB RAG system singleton"""
     global _rag_instance
     if _rag_instance is None:
-        _rag_instance = ChromaRAGSystem()
+        with _rag_lock:
+            if _rag_instance is None:
+                _rag_instance = ChromaRAGSystem()
     return _rag_instance
+def record_readiness(rag: "ChromaRAGSystem"):
+    """Ready only with a vector store that answers a query - keyword search alone is reported as failed.
+
+    The probe search is uncached and unguarded, so a model or store that
+    cannot answer raises here; callers record that as a failure.
+    """
+    if rag.store is None:
+        _rag_state["status"] = "failed"
+        _rag_state["error"] = "vector store unavailable (keyword fallback search only)"
+    else:
+        rag.search_batch([("warm up", "warm up")], top_k=1, filters={})
+        _rag_state["status"] = "ready"
+        _rag_state["error"] = None
+
+def mark_rag_warming_up():
+    """Report warm-up as in progress before it is scheduled, so early requests fall back instead of building"""
+    _rag_state["status"] = "warming_up"
+
+def warm_up_rag_system():
+    """Build the RAG system and run one query so the embedding model is loaded.
+
+    Blocking - meant to run in a background thread during server startup.
+    """
+    _rag_state["status"] = "warming_up"
+    started = time.monotonic()
+    try:
+        record_readiness(get_rag_system())
+        if _rag_state["status"] == "ready":
+            print(f"🔥 RAG system warmed up in {time.monotonic() - started:.1f}s")
+        else:
+            print(f"❌ RAG warm-up finished without a vector store: {_rag_state['error']}")
+    except Exception as e:
+        _rag_state["status"] = "failed"
+        _rag_state["error"] = str(e)
+        print(f"❌ RAG warm-up failed: {e}")
+    finally:
+        _rag_state["load_seconds"] = round(time.monotonic() - started, 2)
+
+def rag_readiness() -> Dict:
+    """Readiness of the RAG system for /health"""
+    return dict(_rag_state, ready=_rag_state["status"] == "ready")
+
+def rag_for_request() -> Optional["ChromaRAGSystem"]:
+    """RAG system to serve a request, or None while it cannot be used yet.
+
+    None while warm-up is still loading (requests must not block on it) or
+    after a build that raised. Without warm-up (RAG_WARMUP=0) the system is
+    built on first use, in the caller's thread.
+    """
+    global _rag_instance
+    status = _rag_state["status"]
+    if status == "warming_up" or (status == "failed" and _rag_instance is None):
+        return None
+    if status == "not_started":
+        with _rag_lock:
+            if _rag_state["status"] == "not_started":
+                print("🐢 RAG warm-up not started - building the RAG system on first use")
+                started = time.monotonic()
+                try:
+                    rag = _rag_instance or ChromaRAGSystem()
+                except Exception as e:
+                    _rag_state["status"] = "failed"
+                    _rag_state["error"] = str(e)
+                    print(f"❌ RAG build failed: {e}")
+                    return None
+                _rag_instance = rag
+                try:
+                    record_readiness(rag)
+                except Exception as e:
+                    # Keep the instance: its searches fall back to keyword matching
+                    _rag_state["status"] = "failed"
+                    _rag_state["error"] = str(e)
+                    print(f"❌ RAG probe search failed: {e}")
+                _rag_state["load_seconds"] = round(time.monotonic() - started, 2)
+    return get_rag_system()
+
+def get_customer_segments_or_fallback(product: str, query: str, segment_type: str = "primary",
+                                      cohort_size: int = None) -> Dict:
+    """Customer segments from RAG; static fallback segments only while it is warming up or unavailable"""
+    rag = rag_for_request()
+    if rag is not None:
+        return rag.get_customer_segments(product, query, segment_type, cohort_size)
+    
+    print(f"⚡ RAG not available ({_rag_state['status']}), using fallback segments")
+    return fallback_segments()
+
+def get_customer_segments_batch_or_fallback(pairs: List[Tuple[str, str]]) -> List[Dict]:
+    """Batched customer segments for many (product, query) pairs; fallback segments while RAG is warming up"""
+    rag = rag_for_request()
+    if rag is not None:
+        return rag.get_customer_segments_batch(pairs)
+    
+    print(f"⚡ RAG not available ({_rag_state['status']}), using fallback segments for {len(pairs)} queries")
+    return [fallback_segments() for _ in pairs]
+
+def retrieval_cache_stats() -> Dict:
+    """Retrieval cache metrics (None until the RAG system has been built)"""
+    return _rag_instance.cache_stats() if _rag_instance is not None else None
+
+def fallback_segments() -> Dict:
+    """Static segments built from the fallback customers"""
+    fallback_customers = ChromaRAGSystem.get_fallback_customers()
+    return {
+        'insights': {
+            'primary': ChromaRAGSystem.calculate_segment_insights(fallback_customers[:2], "primary"),
+            'secondary': ChromaRAGSystem.calculate_segment_insights(fallback_customers[2:], "secondary")
+        },
+        'segments': {
+            'primary': fallback_customers[:2],
+            'secondary': fallback_customers[2:]
+        },
+        'fallback': True
+    }
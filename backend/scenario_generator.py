@@ -1,31 +1,52 @@
+import os
+
+import numpy as np
+
+# Monte Carlo settings: trials are evaluated in chunks of this size so memory
+# stays flat however many trials are requested
+SIMULATION_CHUNK_SIZE = int(os.getenv("SIMULATION_CHUNK_SIZE", "50000"))
+SIMULATION_HISTOGRAM_BINS = 4096
+
+# Default spread of each sampled driver around the deterministic formula.
+# Factors have mean 1; "conversion" falls back to the strategy's volatility.
+SIMULATION_DISTRIBUTIONS = {
+    "reach": {"type": "normal", "sd": 0.10},
+    "engagement": {"type": "lognormal", "sigma": 0.25},
+    "conversion": {"type": "lognormal"}
+}
+
+STRATEGIES = [
+    {
+        "name": "Conservative",
+        "risk_level": "Low",
+        "volatility": 0.15,
+        "probability": 0.9,
+        "conversion_multiplier": 0.6,
+        "roi_multiplier": 2
+    },
+    {
+        "name": "Balanced",
+        "risk_level": "Medium",
+        "volatility": 0.3,
+        "probability": 0.7,
+        "conversion_multiplier": 0.9,
+        "roi_multiplier": 3
+    },
+    {
+        "name": "Aggressive",
+        "risk_level": "High",
+        "volatility": 0.5,
+        "probability": 0.5,
+        "conversion_multiplier": 1.2,
+        "roi_multiplier": 4
+    },
+]
+
+
 def generate_scenarios(discount, duration, target_size, budget):
     base_reach = target_size * (1 + (discount / 100) * 0.2)
     engagement_rate = 5 + (discount / 10) + (budget / 100000) - (duration / 100)
 
-    STRATEGIES = [
-        {
-            "name": "Conservative",
-            "risk_level": "Low",
-            "probability": 0.9,
-            "conversion_multiplier": 0.6,
-            "roi_multiplier": 2
-        },
-        {
-            "name": "Balanced",
-            "risk_level": "Medium",
-            "probability": 0.7,
-            "conversion_multiplier": 0.9,
-            "roi_multiplier": 3
-        },
-        {
-            "name": "Aggressive",
-            "risk_level": "High",
-            "probability": 0.5,
-            "conversion_multiplier": 1.2,
-            "roi_multiplier": 4
-        },
-    ]
-
     scenarios = []
     for strat in STRATEGIES:
         conversion_rate = engagement_rate * strat["conversion_multiplier"]
@@ -39,3 +60,361 @@ def generate_scenarios(discount, duration, target_size, budget):
             "risk_level": strat["risk_level"]
         })
     return scenarios
+
+
+def evaluate_scenarios(discounts, durations, target_sizes, budgets, strategies=None, grid=True):
+    """Vectorized what-if model over many parameter sets at once.
+
+    With grid=True the four parameter arrays are treated as axes and every
+    combination is evaluated: results have shape
+    (strategies, discounts, durations, target_sizes, budgets).
+    With grid=False the arrays are broadcast element-wise (equal lengths or
+    scalars) and results have shape (strategies, points).
+
+    Uses the same formulas as generate_scenarios.
+    """
+    strategies = strategies or STRATEGIES
+    discounts = np.atleast_1d(np.asarray(discounts, dtype=np.float64))
+    durations = np.atleast_1d(np.asarray(durations, dtype=np.float64))
+    target_sizes = np.atleast_1d(np.asarray(target_sizes, dtype=np.float64))
+    budgets = np.atleast_1d(np.asarray(budgets, dtype=np.float64))
+    if np.any(budgets <= 0):
+        raise ValueError("budgets must be positive")
+
+    if grid:
+        discount = discounts.reshape(-1, 1, 1, 1)
+        duration = durations.reshape(1, -1, 1, 1)
+        target_size = target_sizes.reshape(1, 1, -1, 1)
+        budget = budgets.reshape(1, 1, 1, -1)
+    else:
+        discount, duration, target_size, budget = np.broadcast_arrays(discounts, durations, target_sizes, budgets)
+
+    base_reach = target_size * (1 + (discount / 100) * 0.2)
+    engagement_rate = 5 + (discount / 10) + (budget / 100000) - (duration / 100)
+
+    # One leading axis per strategy
+    extra_axes = (1,) * np.ndim(engagement_rate)
+    conversion_multiplier = np.array([s["conversion_multiplier"] for s in strategies]).reshape(-1, *extra_axes)
+    roi_multiplier = np.array([s["roi_multiplier"] for s in strategies]).reshape(-1, *extra_axes)
+
+    conversion_rate = engagement_rate * conversion_multiplier
+    conversions = base_reach * conversion_rate / 100
+    roi = (conversions * roi_multiplier) / budget * 100
+
+    return {
+        "strategies": [s["name"] for s in strategies],
+        "roi": roi,
+        "conversion_rate": conversion_rate,
+        "conversions": conversions
+    }
+
+
+def sweep_grid(discounts, durations, target_sizes, budgets, max_cells=200000):
+    """Evaluate a parameter grid and return JSON-ready ROI / conversion heatmaps"""
+    axes = {
+        "discount": [float(v) for v in np.atleast_1d(discounts)],
+        "duration": [float(v) for v in np.atleast_1d(durations)],
+        "target_size": [float(v) for v in np.atleast_1d(target_sizes)],
+        "budget": [float(v) for v in np.atleast_1d(budgets)]
+    }
+    cells = len(STRATEGIES)
+    for values in axes.values():
+        cells *= len(values)
+    if cells > max_cells:
+        raise ValueError(f"Grid has {cells} cells, limit is {max_cells}")
+
+    result = evaluate_scenarios(axes["discount"], axes["duration"], axes["target_size"], axes["budget"])
+    roi = result["roi"]
+    best = np.unravel_index(np.argmax(roi), roi.shape)
+
+    return {
+        "axes": axes,
+        "axis_order": ["strategy", "discount", "duration", "target_size", "budget"],
+        "strategies": result["strategies"],
+        "roi": np.round(roi, 2).tolist(),
+        "conversion_rate": np.round(result["conversion_rate"], 2).tolist(),
+        "best": {
+            "strategy": result["strategies"][best[0]],
+            "discount": axes["discount"][best[1]],
+            "duration": axes["duration"][best[2]],
+            "target_size": axes["target_size"][best[3]],
+            "budget": axes["budget"][best[4]],
+            "roi": round(float(roi[best]), 2)
+        }
+    }
+
+
+def _sample_factors(rng, spec, size, spread):
+    """Draw multiplicative factors (mean 1) from a distribution spec"""
+    kind = spec.get("type", "lognormal")
+    if kind == "lognormal":
+        sigma = spec.get("sigma", spread)
+        return rng.lognormal(-sigma ** 2 / 2, sigma, size)
+    if kind == "normal":
+        return np.maximum(rng.normal(1.0, spec.get("sd", spread), size), 0.0)
+    if kind == "uniform":
+        return rng.uniform(spec.get("low", 1 - spread), spec.get("high", 1 + spread), size)
+    if kind == "triangular":
+        return rng.triangular(spec.get("low", 1 - spread), spec.get("mode", 1.0), spec.get("high", 1 + spread), size)
+    if kind == "fixed":
+        return np.full(size, float(spec.get("value", 1.0)))
+    raise ValueError(f"Unknown distribution type: {kind}")
+
+
+def _histogram_percentiles(counts, edges, percentiles):
+    """Interpolated percentiles from a histogram"""
+    cdf = np.cumsum(counts) / counts.sum()
+    values = []
+    for p in percentiles:
+        idx = int(np.searchsorted(cdf, p / 100))
+        idx = min(idx, len(counts) - 1)
+        below = cdf[idx - 1] if idx > 0 else 0.0
+        fraction = (p / 100 - below) / (cdf[idx] - below) if cdf[idx] > below else 0.0
+        values.append(edges[idx] + fraction * (edges[idx + 1] - edges[idx]))
+    return values
+
+
+def simulate_scenarios(discount, duration, target_size, budget, trials=100000, seed=None,
+                       distributions=None, loss_threshold=100.0, chunk_size=SIMULATION_CHUNK_SIZE):
+    """Monte Carlo version of generate_scenarios.
+
+    Reach, engagement and conversion are sampled around the deterministic
+    formulas (reach and engagement are shared across strategies, conversion
+    noise is per strategy). ROI is return as a percentage of budget, so by
+    default a trial below 100 counts as a loss. Trials run in chunks and
+    percentiles come from a fixed histogram once more than one chunk is needed.
+    """
+    if budget <= 0:
+        raise ValueError("budget must be positive")
+    if trials <= 0:
+        raise ValueError("trials must be positive")
+
+    specs = dict(SIMULATION_DISTRIBUTIONS)
+    specs.update(distributions or {})
+    rng = np.random.default_rng(seed)
+
+    base_reach = target_size * (1 + (discount / 100) * 0.2)
+    engagement_rate = 5 + (discount / 10) + (budget / 100000) - (duration / 100)
+    conversion_multiplier = np.array([s["conversion_multiplier"] for s in STRATEGIES]).reshape(-1, 1)
+    roi_multiplier = np.array([s["roi_multiplier"] for s in STRATEGIES]).reshape(-1, 1)
+    num_strategies = len(STRATEGIES)
+
+    total = np.zeros(num_strategies)
+    total_sq = np.zeros(num_strategies)
+    losses = np.zeros(num_strategies)
+    conversion_total = np.zeros(num_strategies)
+    counts = None
+    edges = None
+    exact_roi = None
+
+    remaining = trials
+    while remaining > 0:
+        n = min(chunk_size, remaining)
+        remaining -= n
+
+        reach = base_reach * _sample_factors(rng, specs["reach"], n, 0.10)
+        engagement = engagement_rate * _sample_factors(rng, specs["engagement"], n, 0.25)
+        conversion_noise = np.stack([
+            _sample_factors(rng, specs["conversion"], n, s["volatility"]) for s in STRATEGIES
+        ])
+        conversion_rate = engagement * conversion_multiplier * conversion_noise
+        roi = ((reach * conversion_rate / 100) * roi_multiplier) / budget * 100
+
+        total += roi.sum(axis=1)
+        total_sq += np.square(roi).sum(axis=1)
+        losses += (roi < loss_threshold).sum(axis=1)
+        conversion_total += conversion_rate.sum(axis=1)
+
+        if remaining == 0 and counts is None:
+            exact_roi = roi  # Everything fit in one chunk - percentiles can be exact
+            break
+        if edges is None:
+            # Pad by half the first chunk's spread on both sides - scaling the
+            # extremes would pull the upper edge below the data when every ROI is negative
+            pad = 0.5 * float(roi.max() - roi.min()) + 1e-9
+            low = float(roi.min()) - pad
+            high = float(roi.max()) + pad
+            edges = np.linspace(low, high, SIMULATION_HISTOGRAM_BINS + 1)
+            counts = np.zeros((num_strategies, SIMULATION_HISTOGRAM_BINS))
+        clipped = np.clip(roi, edges[0], edges[-1])  # Tail outliers land in the end bins
+        for i in range(num_strategies):
+            counts[i] += np.histogram(clipped[i], edges)[0]
+
+    percentile_points = [5, 25, 50, 75, 95]
+    deterministic = generate_scenarios(discount, duration, target_size, budget)
+    results = []
+    for i, strat in enumerate(STRATEGIES):
+        mean = total[i] / trials
+        std = np.sqrt(max(total_sq[i] / trials - mean ** 2, 0.0))
+        if exact_roi is not None:
+            values = np.percentile(exact_roi[i], percentile_points)
+        else:
+            values = _histogram_percentiles(counts[i], edges, percentile_points)
+        results.append({
+            "name": strat["name"],
+            "risk_level": strat["risk_level"],
+            "roi_estimate": deterministic[i]["roi"],
+            "mean_roi": round(float(mean), 2),
+            "std_roi": round(float(std), 2),
+            "percentiles": {f"p{p}": round(float(v), 2) for p, v in zip(percentile_points, values)},
+            "probability_of_loss": round(float(losses[i] / trials), 4),
+            "mean_conversion_rate": round(float(conversion_total[i] / trials), 2)
+        })
+
+    return {
+        "trials": trials,
+        "seed": seed,
+        "loss_threshold": loss_threshold,
+        "scenarios": results
+    }
+
+
+def _risk_factor_samples(trials, seed, distributions=None):
+    """Sorted samples of each strategy's total ROI multiplier under uncertainty.
+
+    In the simulation model ROI is the deterministic ROI times the product of
+    independent reach, engagement and conversion factors, so one set of
+    samples per strategy prices the risk of every configuration.
+    """
+    specs = dict(SIMULATION_DISTRIBUTIONS)
+    specs.update(distributions or {})
+    rng = np.random.default_rng(seed)
+    shared = _sample_factors(rng, specs["reach"], trials, 0.10) * _sample_factors(rng, specs["engagement"], trials, 0.25)
+    return np.sort(np.stack([
+        shared * _sample_factors(rng, specs["conversion"], trials, s["volatility"]) for s in STRATEGIES
+    ]), axis=1)
+
+
+def _grid_axis(low, high, points, integer=False):
+    values = np.linspace(low, high, max(points, 2))
+    return np.unique(np.round(values)) if integer else np.unique(values)
+
+
+def _refine_range(axis, index, low, high):
+    """Range spanning one grid step either side of the best point"""
+    lower = axis[max(index - 1, 0)]
+    upper = axis[min(index + 1, len(axis) - 1)]
+    return max(lower, low), min(upper, high)
+
+
+def _pareto_frontier(roi, risk):
+    """Indices of configurations not beaten on both ROI (higher) and risk (lower)"""
+    order = np.lexsort((risk, -roi))
+    frontier = []
+    best_risk = np.inf
+    for idx in order:
+        if risk[idx] < best_risk:
+            frontier.append(idx)
+            best_risk = risk[idx]
+    return frontier
+
+
+def optimize_campaign(budget_ceiling, target_size, discount_range=(5, 50), duration_range=(7, 180),
+                      budget_floor=None, inventory_limit=None, grid_points=25, refine_rounds=2,
+                      risk_trials=20000, seed=0, distributions=None, loss_threshold=100.0):
+    """Search the what-if model for the ROI-maximizing configuration per strategy.
+
+    A vectorized grid over discount x duration x budget is evaluated for every
+    strategy, configurations whose expected unit sales exceed inventory_limit
+    are discarded, and each strategy's best cell is refined on finer grids
+    around it. Risk (probability that ROI falls below loss_threshold) is priced
+    for every coarse-grid configuration from one Monte Carlo sample per
+    strategy, giving the ROI-versus-risk Pareto frontier.
+    """
+    budget_floor = budget_floor or max(budget_ceiling * 0.1, 1.0)
+    if budget_ceiling <= 0 or budget_floor > budget_ceiling:
+        raise ValueError("budget_floor must be positive and below budget_ceiling")
+    discount_low, discount_high = discount_range
+    duration_low, duration_high = duration_range
+
+    factors = _risk_factor_samples(risk_trials, seed, distributions)
+
+    def evaluate(discounts, durations, budgets):
+        result = evaluate_scenarios(discounts, durations, [target_size], budgets)
+        roi = result["roi"][:, :, :, 0, :]
+        conversions = result["conversions"][:, :, :, 0, :]
+        feasible = np.isfinite(roi)
+        if inventory_limit is not None:
+            feasible &= conversions <= inventory_limit
+        return roi, conversions, feasible
+
+    def probability_of_loss(strategy_index, roi_values):
+        # P(roi * factor < threshold) = P(factor < threshold / roi)
+        cutoffs = np.divide(loss_threshold, roi_values, out=np.full(np.shape(roi_values), np.inf), where=roi_values > 0)
+        return np.searchsorted(factors[strategy_index], cutoffs) / risk_trials
+
+    discounts = _grid_axis(discount_low, discount_high, grid_points)
+    durations = _grid_axis(duration_low, duration_high, grid_points, integer=True)
+    budgets = _grid_axis(budget_floor, budget_ceiling, grid_points)
+    roi, conversions, feasible = evaluate(discounts, durations, budgets)
+    evaluated = roi.size
+
+    # Pareto frontier over every feasible coarse configuration
+    strategy_idx, d_idx, t_idx, b_idx = np.nonzero(feasible)
+    candidate_roi = roi[feasible]
+    candidate_risk = np.empty_like(candidate_roi)
+    for i in range(len(STRATEGIES)):
+        mask = strategy_idx == i
+        candidate_risk[mask] = probability_of_loss(i, candidate_roi[mask])
+    frontier = [{
+        "strategy": STRATEGIES[strategy_idx[k]]["name"],
+        "discount": round(float(discounts[d_idx[k]]), 2),
+        "duration": int(durations[t_idx[k]]),
+        "budget": round(float(budgets[b_idx[k]]), 2),
+        "roi": round(float(candidate_roi[k]), 2),
+        "probability_of_loss": round(float(candidate_risk[k]), 4)
+    } for k in _pareto_frontier(candidate_roi, candidate_risk)]
+
+    best_by_strategy = []
+    for i, strat in enumerate(STRATEGIES):
+        axes = (discounts, durations, budgets)
+        strategy_roi = np.where(feasible[i], roi[i], -np.inf)
+        if not np.isfinite(strategy_roi.max()):
+            best_by_strategy.append({"name": strat["name"], "risk_level": strat["risk_level"], "feasible": False})
+            continue
+        best = np.unravel_index(np.argmax(strategy_roi), strategy_roi.shape)
+        best_roi = strategy_roi[best]
+        best_point = (axes[0][best[0]], axes[1][best[1]], axes[2][best[2]])
+        best_conversions = conversions[i][best]
+
+        for _ in range(refine_rounds):
+            d_low, d_high = _refine_range(axes[0], best[0], discount_low, discount_high)
+            t_low, t_high = _refine_range(axes[1], best[1], duration_low, duration_high)
+            b_low, b_high = _refine_range(axes[2], best[2], budget_floor, budget_ceiling)
+            fine_axes = (
+                _grid_axis(d_low, d_high, grid_points),
+                _grid_axis(t_low, t_high, grid_points, integer=True),
+                _grid_axis(b_low, b_high, grid_points)
+            )
+            fine_roi, fine_conversions, fine_feasible = evaluate(*fine_axes)
+            evaluated += fine_roi.size
+            fine_strategy_roi = np.where(fine_feasible[i], fine_roi[i], -np.inf)
+            fine_best = np.unravel_index(np.argmax(fine_strategy_roi), fine_strategy_roi.shape)
+            # Only an improvement moves the incumbent; otherwise the next round re-centres on it
+            if fine_strategy_roi[fine_best] >= best_roi:
+                axes, best = fine_axes, fine_best
+                best_roi = fine_strategy_roi[best]
+                best_point = (axes[0][best[0]], axes[1][best[1]], axes[2][best[2]])
+                best_conversions = fine_conversions[i][best]
+
+        risk_samples = best_roi * factors[i]
+        best_by_strategy.append({
+            "name": strat["name"],
+            "risk_level": strat["risk_level"],
+            "feasible": True,
+            "discount": round(float(best_point[0]), 2),
+            "duration": int(best_point[1]),
+            "budget": round(float(best_point[2]), 2),
+            "roi": round(float(best_roi), 2),
+            "expected_conversions": int(best_conversions),
+            "probability_of_loss": round(float(probability_of_loss(i, np.array([best_roi]))[0]), 4),
+            "p5_roi": round(float(np.percentile(risk_samples, 5)), 2),
+            "p95_roi": round(float(np.percentile(risk_samples, 95)), 2)
+        })
+
+    return {
+        "best_by_strategy": best_by_strategy,
+        "pareto_frontier": frontier,
+        "configurations_evaluated": int(evaluated),
+        "loss_threshold": loss_threshold
+    }
@@ -1,11 +1,24 @@
+import asyncio
 import json
-import google.generativeai as genai
 import os
-from typing import Dict, List, Any
+from typing import Callable, Dict, List, Any, Optional
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 import random
 
+from keyword_matcher import build_matcher
+from llm_cache import evict_cached, generate_uncached, lookup_cached
+from llm_client import get_model
+from llm_scheduler import SchedulerBusy, llm_scheduler
+
+# Batched sentiment: texts per Gemini call, and a prompt size cap that
+# triggers automatic splitting of oversized batches
+SENTIMENT_BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", "25"))
+SENTIMENT_BATCH_MAX_CHARS = int(os.getenv("SENTIMENT_BATCH_MAX_CHARS", "12000"))
+EMOTION_KEYS = ["joy", "anger", "fear", "sadness", "surprise"]
+
+# Fallback sentiment lexicon (data/lexicons.json) - compiled once at import
+SENTIMENT_MATCHER = build_matcher("sentiment")
 
 @dataclass
 class SentimentResult:
@@ -29,20 +42,18 @@ class SentimentTrendAnalyzer:
         self.gemini_api_key = os.getenv("GEMINI_API_KEY")
         print(f"🔑 Gemini API Key present: {'Yes' if self.gemini_api_key else 'No'}")
         
-        if self.gemini_api_key:
-            try:
-                genai.configure(api_key=self.gemini_api_key)
-                self.model = genai.GenerativeModel('gemini-pro')
-                print("✅ Gemini AI configured successfully for sentiment analysis")
-            except Exception as e:
-                print(f"❌ Failed to configure Gemini: {e}")
-                self.model = None
+        # Shared model from the registry - configured once for the whole process
+        self.model = get_model('gemini-pro')
+        if self.model:
+            print("✅ Gemini AI ready for sentiment analysis")
         else:
-            print("❌ No Gemini API key found. Using fallback data.")
-            self.model = None
+            print("❌ Gemini not available. Using fallback data.")
     
     async def analyze_sentiment(self, texts: List[str]) -> List[SentimentResult]:
         """Analyze sentiment using real Gemini AI"""
+        if self.model and len(texts) > 1:
+            return await self.analyze_sentiment_batch(texts)
+        
         results = []
         
         for text in texts:
@@ -67,8 +78,9 @@ class SentimentTrendAnalyzer:
                     }}
                     """
                     
-                    response = self.model.generate_content(prompt)
-                    response_text = response.text.strip()
+                    response_text = await self._generate(prompt, lambda response: self._parse_single(text, response) is not None)
+                    if not response_text:
+                        raise ValueError("Empty Gemini response")
                     
                     print(f"📥 Gemini response: {response_text[:100]}...")
                     
@@ -92,6 +104,8 @@ class SentimentTrendAnalyzer:
                         # Use dynamic fallback based on text content
                         results.append(self._generate_dynamic_sentiment(text))
                         
+                except SchedulerBusy:
+                    raise  # Overloaded - let the caller back off rather than degrade silently
                 except Exception as e:
                     print(f"❌ Gemini API error: {e}")
                     results.append(self._generate_dynamic_sentiment(text))
@@ -101,16 +115,168 @@ class SentimentTrendAnalyzer:
         
         return results
     
-    def _generate_dynamic_sentiment(self, text: str) -> SentimentResult:
-        """Generate dynamic sentiment based on text analysis"""
-        text_lower = text.lower()
+    async def _generate(self, prompt: str, validate: Callable[[str], bool]):
+        """Cached Gemini call; misses go through the rate-limited scheduler.
+
+        Only responses validate accepts are cached, and a cached response it
+        rejects is evicted and regenerated.
+        """
+        response_text = lookup_cached('gemini-pro', prompt)
+        if response_text is not None and not validate(response_text):
+            print("⚠️ Cached Gemini response no longer parses, evicting")
+            evict_cached('gemini-pro', prompt)
+            response_text = None
+        if response_text is None:
+            response_text = await llm_scheduler.submit(generate_uncached, self.model, 'gemini-pro', prompt,
+                                                       validate=validate)
+        return response_text
+    
+    async def analyze_sentiment_batch(self, texts: List[str], batch_size: int = None) -> List[SentimentResult]:
+        """Analyze many texts with one Gemini call per batch instead of one per text"""
+        if not self.model:
+            print("⚠️ Using dynamic fallback (no Gemini)")
+            return [self._generate_dynamic_sentiment(text) for text in texts]
         
-        # Analyze keywords for sentiment
-        positive_words = ['amazing', 'excellent', 'great', 'fantastic', 'revolutionary', 'best', 'advanced', 'premium', 'innovative', 'future', 'professional', 'perfect', 'incredible']
-        negative_words = ['terrible', 'awful', 'worst', 'horrible', 'disappointing', 'failed', 'broken', 'useless', 'expensive', 'overpriced']
+        batches = self._split_batches(texts, batch_size or SENTIMENT_BATCH_SIZE)
+        print(f"🤖 Batched sentiment: {len(texts)} texts in {len(batches)} Gemini calls")
         
-        positive_count = sum(1 for word in positive_words if word in text_lower)
-        negative_count = sum(1 for word in negative_words if word in text_lower)
+        batch_results = await asyncio.gather(*(self._analyze_batch(batch) for batch in batches))
+        return [result for batch in batch_results for result in batch]
+    
+    def _split_batches(self, texts: List[str], batch_size: int) -> List[List[str]]:
+        """Split texts into batches bounded by count and prompt size"""
+        batches = []
+        current = []
+        current_chars = 0
+        for text in texts:
+            if current and (len(current) >= batch_size or current_chars + len(text) > SENTIMENT_BATCH_MAX_CHARS):
+                batches.append(current)
+                current = []
+                current_chars = 0
+            current.append(text)
+            current_chars += len(text)
+        if current:
+            batches.append(current)
+        return batches
+    
+    async def _analyze_batch(self, texts: List[str]) -> List[SentimentResult]:
+        """Score one batch; halve and retry if the response can't be parsed.
+
+        Only unparseable responses are retried as smaller batches. API errors
+        that survived the scheduler's own retries (quota, transport) fall
+        straight back to keyword scoring - splitting would multiply the calls
+        against a service that is already refusing them.
+        """
+        prompt = self._build_batch_prompt(texts)
+        try:
+            response_text = await self._generate(prompt, lambda response: self._batch_is_complete(texts, response))
+            if not response_text:
+                raise ValueError("Empty Gemini response")
+            parsed = self._parse_batch(texts, response_text)
+        except SchedulerBusy:
+            raise
+        except ValueError as e:
+            if len(texts) > 1:
+                # Usually a truncated or malformed response - smaller batches fare better
+                print(f"⚠️ Batch of {len(texts)} could not be parsed ({e}), splitting")
+                middle = len(texts) // 2
+                first, second = await asyncio.gather(
+                    self._analyze_batch(texts[:middle]),
+                    self._analyze_batch(texts[middle:])
+                )
+                return first + second
+            print(f"❌ Gemini response could not be parsed: {e}")
+            return [self._generate_dynamic_sentiment(texts[0])]
+        except Exception as e:
+            print(f"❌ Gemini API error for a batch of {len(texts)}, using keyword sentiment: {e}")
+            return [self._generate_dynamic_sentiment(text) for text in texts]
+        
+        results = [result if result else self._generate_dynamic_sentiment(text) for text, result in zip(texts, parsed)]
+        print(f"✅ Parsed batch of {len(texts)} ({sum(result is not None for result in parsed)} scored by Gemini)")
+        return results
+    
+    def _parse_batch(self, texts: List[str], response_text: str) -> List[Optional[SentimentResult]]:
+        """One result per text (None where Gemini's element is missing or invalid); raises if not a JSON array"""
+        items = json.loads(self._strip_code_fences(response_text))
+        if not isinstance(items, list):
+            raise ValueError("Expected a JSON array")
+        by_index = {}
+        for item in items:
+            if isinstance(item, dict) and isinstance(item.get("index"), int):
+                by_index[item["index"]] = item
+        return [self._parse_batch_item(text, by_index.get(index)) for index, text in enumerate(texts)]
+    
+    def _batch_is_complete(self, texts: List[str], response_text: str) -> bool:
+        """Whether a batch response scores every text (only those are worth caching)"""
+        try:
+            return all(result is not None for result in self._parse_batch(texts, response_text))
+        except ValueError:
+            return False
+    
+    def _parse_single(self, text: str, response_text: str) -> Optional[SentimentResult]:
+        """A single-text response as a SentimentResult, or None if it does not parse"""
+        try:
+            return self._parse_batch_item(text, json.loads(response_text.replace('``````', '').strip()))
+        except ValueError:
+            return None
+    
+    def _build_batch_prompt(self, texts: List[str]) -> str:
+        """One structured prompt for a whole batch"""
+        numbered = json.dumps([{"index": i, "text": text} for i, text in enumerate(texts)], ensure_ascii=False)
+        return f"""
+                    Analyze the sentiment of each text in this JSON array:
+                    {numbered}
+                    
+                    Respond with ONLY a JSON array (no markdown, no extra text) containing one object per input, in this exact format:
+                    [
+                        {{
+                            "index": 0,
+                            "sentiment": "positive or negative or neutral",
+                            "confidence": 0.85,
+                            "emotions": {{
+                                "joy": 0.3,
+                                "anger": 0.1,
+                                "fear": 0.1,
+                                "sadness": 0.1,
+                                "surprise": 0.4
+                            }}
+                        }}
+                    ]
+                    """
+    
+    def _parse_batch_item(self, text: str, item: Dict[str, Any]):
+        """Convert one array element into a SentimentResult, or None if invalid"""
+        if not item:
+            return None
+        try:
+            sentiment = str(item["sentiment"]).lower()
+            if sentiment not in ("positive", "negative", "neutral"):
+                return None
+            emotions = {key: float(item["emotions"].get(key, 0.0)) for key in EMOTION_KEYS}
+            return SentimentResult(
+                text=text,
+                sentiment=sentiment,
+                confidence=float(item["confidence"]),
+                emotions=emotions
+            )
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return None
+    
+    def _strip_code_fences(self, response_text: str) -> str:
+        """Remove markdown code fences Gemini sometimes wraps JSON in"""
+        cleaned = response_text.strip()
+        if cleaned.startswith("```"):
+            cleaned = cleaned.split("\n", 1)[1] if "\n" in cleaned else ""
+        if cleaned.endswith("```"):
+            cleaned = cleaned[:-3]
+        return cleaned.strip()
+    
+    def _generate_dynamic_sentiment(self, text: str) -> SentimentResult:
+        """Generate dynamic sentiment based on text analysis"""
+        # Analyze keywords for sentiment (one pass, whole words only)
+        counts = SENTIMENT_MATCHER.count(text)
+        positive_count = counts.get("positive", 0)
+        negative_count = counts.get("negative", 0)
         
         # Determine sentiment
         if positive_count > negative_count:
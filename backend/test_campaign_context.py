@@ -0,0 +1,26 @@
+import rag_system
+from campaign_context import build_campaign_context
+from test_rag_system import build_populated_rag, restore_rag_instance, use_rag_instance
+
+
+def test_context_uses_retrieved_segments():
+    print("🧪 Testing campaign context against a populated customer store...")
+
+    rag = build_populated_rag()
+    saved = use_rag_instance(rag, "ready")
+    try:
+        context = build_campaign_context("premium headphones for tech professionals", "Wireless Headphones", 15000)
+    finally:
+        restore_rag_instance(saved)
+
+    assert not context.fallback
+    assert not context.segments.get('fallback')
+    fallback_names = {customer['name'] for customer in rag_system.ChromaRAGSystem.get_fallback_customers()}
+    retrieved = context.segments['segments']['primary'] + context.segments['segments']['secondary']
+    assert retrieved and not {customer['name'] for customer in retrieved} & fallback_names
+    assert {customer['name'] for customer in retrieved} <= {customer['name'] for customer in rag.customer_data}
+    assert context.estimated_reach > 0 and context.projected_conversions > 0
+    assert context.to_dict()["fallback"] is False
+
+if __name__ == "__main__":
+    test_context_uses_retrieved_segments()
@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+
+import numpy as np
+
+import customer_store
+from customer_store import CustomerStore, iter_customers
+
+CUSTOMERS = [
+    {"id": "c1", "name": "Ana \"AJ\" Jones", "age": 31, "income": 82000, "location": "Austin, TX",
+     "demographics": "Designer, urban, {creative} [freelance]", "segments": ["creative", "urban"]},
+    {"id": "c2", "name": "Bo Li", "age": 22, "demographics": "College student, budget-conscious",
+     "interests": ["gaming", "music"], "engagement_score": 0.75},
+    {"id": "c3", "name": "Émile Roux", "income": 150000, "lifetime_value": 4200,
+     "demographics": "Executive, business traveler, \\\\ backslash"}
+]
+
+
+def write(text: str, extension: str = ".json") -> str:
+    path = os.path.join(tempfile.mkdtemp(), f"customers{extension}")
+    with open(path, "w") as f:
+        f.write(text)
+    return path
+
+
+def read_with_chunk_size(path: str, chunk_bytes: int):
+    original = customer_store.READ_CHUNK_BYTES
+    customer_store.READ_CHUNK_BYTES = chunk_bytes
+    try:
+        return list(iter_customers(path))
+    finally:
+        customer_store.READ_CHUNK_BYTES = original
+
+
+def test_json_stream_survives_every_chunk_boundary():
+    print("🧪 Testing streamed JSON parsing across read-buffer boundaries...")
+    wrapped = write(json.dumps({"source": "crm", "customers": CUSTOMERS, "exported": "2024-01-01"}, indent=2))
+    bare = write(json.dumps(CUSTOMERS))
+
+    # Every chunk size up to the record length puts a boundary inside keys, strings, escapes and numbers
+    for chunk_bytes in range(1, 120):
+        assert read_with_chunk_size(wrapped, chunk_bytes) == CUSTOMERS, chunk_bytes
+        assert read_with_chunk_size(bare, chunk_bytes) == CUSTOMERS, chunk_bytes
+
+def test_empty_and_missing_customer_arrays():
+    print("🧪 Testing empty customer files...")
+    assert read_with_chunk_size(write('{"customers": []}'), 4) == []
+    assert read_with_chunk_size(write('{"products": [1, 2]}'), 4) == []
+
+def test_ndjson_and_csv_sources():
+    print("🧪 Testing NDJSON and CSV customer sources...")
+    ndjson = write("\n".join(json.dumps(customer) for customer in CUSTOMERS) + "\n\n", ".jsonl")
+    assert list(iter_customers(ndjson)) == CUSTOMERS
+
+    csv_path = write("id,name,age,income,segments\nc1,Ana,31,82000,creative;urban\nc2,Bo,,,\n", ".csv")
+    assert list(iter_customers(csv_path)) == [
+        {"id": "c1", "name": "Ana", "age": 31, "income": 82000, "segments": ["creative", "urban"]},
+        {"id": "c2", "name": "Bo"}
+    ]
+
+def test_columnar_store_round_trip():
+    print("🧪 Testing the columnar customer store...")
+    original = customer_store.NUMERIC_FLUSH_ROWS
+    customer_store.NUMERIC_FLUSH_ROWS = 2  # Force several NumPy chunks
+    try:
+        store = CustomerStore()
+        for customer in CUSTOMERS:
+            store.append(customer)
+    finally:
+        customer_store.NUMERIC_FLUSH_ROWS = original
+
+    assert len(store) == 3
+    assert list(store) == CUSTOMERS
+    ages = store.column("age")
+    assert ages.dtype == np.float32 and ages[0] == 31 and np.isnan(ages[2])
+    assert store.row_of("c3") == 2 and store.row_of("missing") is None
+
+def test_fields_outside_the_columns_are_kept():
+    print("🧪 Testing customer fields the columns do not cover...")
+    store = CustomerStore()
+    unusual = {"id": "c9", "name": "Kai", "income": "82k", "email": "kai@example.com", "tags": {"vip": True}}
+    store.append(unusual)
+    store.append(CUSTOMERS[1])
+    
+    assert store.record(0) == unusual
+    assert np.isnan(store.column("income")[0])  # Non-numeric income stays out of the statistics
+    assert store.record(1) == CUSTOMERS[1]
+
+if __name__ == "__main__":
+    test_json_stream_survives_every_chunk_boundary()
+    test_empty_and_missing_customer_arrays()
+    test_ndjson_and_csv_sources()
+    test_columnar_store_round_trip()
+    test_fields_outside_the_columns_are_kept()
@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+
+import pytest
+
+import data_store
+from data_store import JSONDataFile, thaw
+
+
+def write_json(path: str, data, mtime_ns: int = None):
+    """Replace the file atomically (new inode), optionally pinning its mtime"""
+    temporary = path + ".tmp"
+    with open(temporary, "w") as f:
+        json.dump(data, f)
+    os.replace(temporary, path)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def data_file(interval: float = 0.0):
+    data_store.DATA_STAT_INTERVAL = interval
+    path = os.path.join(tempfile.mkdtemp(), "budget.json")
+    return path, JSONDataFile(path, {"total_budget": 15000})
+
+
+def teardown_function(function):
+    data_store.DATA_STAT_INTERVAL = float(os.getenv("DATA_STAT_INTERVAL", "1.0"))
+
+
+def test_unchanged_file_is_parsed_once():
+    print("🧪 Testing snapshot reuse...")
+    path, budget = data_file()
+    write_json(path, {"total_budget": 20000})
+    first = budget.snapshot()
+    assert budget.snapshot() is first and budget.reloads == 1
+    assert first.data["total_budget"] == 20000 and not first.from_default
+
+def test_mtime_change_reloads():
+    print("🧪 Testing reload on modification time...")
+    path, budget = data_file()
+    write_json(path, {"total_budget": 20000}, mtime_ns=1_000_000_000)
+    assert budget.snapshot().version == 1
+    with open(path, "w") as f:  # In place: same inode, same size, new mtime
+        json.dump({"total_budget": 30000}, f)
+    os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+    snapshot = budget.snapshot()
+    assert snapshot.version == 2 and snapshot.data["total_budget"] == 30000
+
+def test_replaced_file_with_same_mtime_and_size_reloads():
+    print("🧪 Testing reload on inode change...")
+    path, budget = data_file()
+    write_json(path, {"total_budget": 20000}, mtime_ns=1_000_000_000)
+    budget.snapshot()
+    write_json(path, {"total_budget": 30000}, mtime_ns=1_000_000_000)  # Same size and mtime, new inode
+    assert budget.snapshot().data["total_budget"] == 30000
+
+def test_unparseable_write_keeps_last_good_snapshot():
+    print("🧪 Testing that a half-written file is never served...")
+    path, budget = data_file()
+    write_json(path, {"total_budget": 20000})
+    good = budget.snapshot()
+    with open(path, "w") as f:
+        f.write('{"total_budget": 3')
+    assert budget.snapshot() is good
+    write_json(path, {"total_budget": 35000})
+    assert budget.snapshot().data["total_budget"] == 35000
+
+def test_stat_interval_and_invalidate():
+    print("🧪 Testing the stat interval and watcher invalidation...")
+    path, budget = data_file(interval=3600)
+    write_json(path, {"total_budget": 20000})
+    budget.snapshot()
+    write_json(path, {"total_budget": 40000})
+    assert budget.snapshot().data["total_budget"] == 20000  # Not re-checked within the interval
+    budget.invalidate()
+    assert budget.snapshot().data["total_budget"] == 40000
+    assert budget.reloads == 2 and budget.snapshot().version == 2
+
+def test_missing_file_gets_default_and_snapshots_are_read_only():
+    print("🧪 Testing default creation and immutable snapshots...")
+    path, budget = data_file()
+    snapshot = budget.snapshot()
+    assert os.path.exists(path) and snapshot.data["total_budget"] == 15000
+    with pytest.raises(TypeError):
+        snapshot.data["total_budget"] = 1
+    copy = thaw(snapshot.data)
+    copy["total_budget"] = 1
+    assert budget.snapshot().data["total_budget"] == 15000
+
+if __name__ == "__main__":
+    for test in (test_unchanged_file_is_parsed_once, test_mtime_change_reloads,
+                 test_replaced_file_with_same_mtime_and_size_reloads, test_unparseable_write_keeps_last_good_snapshot,
+                 test_stat_interval_and_invalidate, test_missing_file_gets_default_and_snapshots_are_read_only):
+        test()
+        teardown_function(test)
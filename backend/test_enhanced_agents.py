@@ -1,4 +1,7 @@
-from agent_manager import run_agents
+import asyncio
+import threading
+
+from agent_manager import run_agent_safely, run_agents
 
 def test_enhanced_system():
     print("=== TESTING ENHANCED AGENT COLLABORATION ===\n")
@@ -24,5 +27,17 @@ def test_enhanced_system():
     print("FINAL PLAN:")
     print(result['Final Plan'])
 
+def test_fast_agents_run_off_the_event_loop():
+    print("🧪 Testing that fast agents never block the event loop...")
+    threads = []
+    def agent(query, product, fast=False):
+        threads.append(threading.current_thread())  # Fast agents still stat and read data files
+        return f"{product}: fast={fast}"
+
+    result = asyncio.run(run_agent_safely("Inventory", "📦", agent, ("q", "Smart Watch"), "fallback", fast=True))
+    assert result == "Smart Watch: fast=True"
+    assert threads == [threads[0]] and threads[0] is not threading.main_thread()
+
 if __name__ == "__main__":
     test_enhanced_system()
+    test_fast_agents_run_off_the_event_loop()
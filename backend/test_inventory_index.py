@@ -0,0 +1,52 @@
+from inventory_index import InventoryIndex
+
+CATALOGUE = {
+    "products": [
+        {"product": "Wireless Headphones", "stock": 150, "reserved": 25, "region": "North America", "reorder_level": 30, "unit_cost": 45.0},
+        {"product": "Wireless Headphones", "stock": 89, "reserved": 15, "region": "Europe", "reorder_level": 25, "unit_cost": 47.0},
+        {"product": "Smart Watch", "stock": 32, "reserved": 5, "region": "Europe", "reorder_level": 30, "unit_cost": 125.0},
+        {"product": "Bluetooth Speaker", "stock": 200, "reserved": 35, "region": "North America", "reorder_level": 40, "unit_cost": 28.0},
+        {"product": "Gaming Mouse", "stock": 95, "reserved": 18, "region": "North America", "reorder_level": 25, "unit_cost": 35.0}
+    ],
+    "aliases": {"BT Speaker": "Bluetooth Speaker", "Headphones": "Wireless Headphones"}
+}
+
+def test_exact_name_hits():
+    print("🧪 Testing exact inventory lookups...")
+    index = InventoryIndex(CATALOGUE)
+    
+    # Case, spacing and punctuation are normalized
+    assert index.available("wireless  headphones") == (150 - 25) + (89 - 15)
+    assert index.available("Wireless-Headphones", region="Europe") == 89 - 15
+    assert index.available("Smart Watch", region="Asia Pacific") == 0
+    assert index.product("Smart Watch").below_reorder == ("Europe",)
+
+def test_similar_names_miss():
+    print("🧪 Testing that unknown products never borrow another SKU's stock...")
+    index = InventoryIndex(CATALOGUE)
+    
+    for name in ["Smart TV", "Smart Speaker", "Wireless Earbuds", "Wireless Mouse", "Premium Wireless Headphones", ""]:
+        assert index.product(name) is None, name
+        assert index.available(name) is None, name
+
+def test_aliases_resolve():
+    print("🧪 Testing inventory aliases...")
+    index = InventoryIndex(CATALOGUE)
+    
+    assert index.product("bt speaker").product == "Bluetooth Speaker"
+    assert index.available("Headphones") == index.available("Wireless Headphones")
+    # Aliases to products that are not in the catalogue are ignored
+    broken = InventoryIndex({"products": CATALOGUE["products"], "aliases": {"Earbuds": "Wireless Earbuds"}})
+    assert broken.product("Earbuds") is None
+
+def test_legacy_items_rows():
+    print("🧪 Testing legacy 'items' rows...")
+    index = InventoryIndex({"items": [{"product": "Inox Bottle", "stock": 400, "regions": 6}]})
+    assert index.available("Inox Bottle") == 400
+    assert index.available("Inox Bottle", region="all") == 400
+
+if __name__ == "__main__":
+    test_exact_name_hits()
+    test_similar_names_miss()
+    test_aliases_resolve()
+    test_legacy_items_rows()
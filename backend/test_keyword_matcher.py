@@ -0,0 +1,46 @@
+import pytest
+
+from keyword_matcher import KeywordMatcher, build_matcher, load_lexicons
+
+
+def test_word_boundaries():
+    print("🧪 Testing whole-word keyword matching...")
+    matcher = KeywordMatcher({"positive": ["great", "best"], "negative": ["broken"]})
+    
+    assert matcher.matches("The greatest, bestselling speaker") == set()
+    assert matcher.matches("Great sound, best in class!") == {"great", "best"}
+    assert matcher.count("unbroken streak of great reviews") == {"positive": 1, "negative": 0}
+    assert matcher.count("Great GREAT great") == {"positive": 1, "negative": 0}  # Distinct terms
+
+def test_multi_word_terms_win_over_prefixes():
+    print("🧪 Testing multi-word terms...")
+    matcher = KeywordMatcher({"income": ["high income"], "level": ["high"]})
+    
+    assert matcher.categories_present("high income household") == {"income"}
+    assert matcher.categories_present("high shelf") == {"level"}
+
+def test_plurals_come_from_the_lexicon():
+    print("🧪 Testing plural forms in the shipped lexicons...")
+    queries = build_matcher("audience_query")
+    demographics = build_matcher("audience_demographics")
+    
+    # Plurals match only because lexicons.json lists them - there is no stemming
+    assert queries.categories_present("deals for students") == {"student"}
+    assert queries.categories_present("gear for busy executives") == {"executive"}
+    assert queries.categories_present("tools for designers") == {"creative"}
+    assert demographics.categories_present("Artists and designers collective") == {"creative"}
+    assert KeywordMatcher({"student": ["student"]}).matches("students") == set()
+
+def test_lexicons_file_is_the_only_source():
+    print("🧪 Testing lexicon loading...")
+    lexicons = load_lexicons()
+    for name in ("sentiment", "audience_query", "audience_demographics"):
+        assert build_matcher(name).categories == list(lexicons[name])
+    with pytest.raises(KeyError):
+        build_matcher("no_such_lexicon")
+
+if __name__ == "__main__":
+    test_word_boundaries()
+    test_multi_word_terms_win_over_prefixes()
+    test_plurals_come_from_the_lexicon()
+    test_lexicons_file_is_the_only_source()
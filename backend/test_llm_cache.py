@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import tempfile
+import time
+
+import llm_cache
+from llm_cache import LLMResponseCache, make_cache_key
+from ttl_cache import TTLCache
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    print("🧪 Testing LRU eviction...")
+    cache = TTLCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"  # "a" is now the most recently used
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+    assert cache.evictions == 1 and len(cache) == 2
+
+def test_ttl_cache_byte_limit():
+    print("🧪 Testing size-based eviction...")
+    cache = TTLCache(max_entries=100, max_bytes=10)
+    cache.set("a", "xxxx")
+    cache.set("b", "yyyy")
+    cache.set("c", "zzzz")  # 12 bytes > 10: the oldest entry goes
+    assert cache.get("a") is None and cache.current_bytes == 8
+    cache.set("huge", "x" * 11)  # Larger than the whole cache: never stored
+    assert cache.get("huge") is None and cache.get("b") == "yyyy"
+    cache.delete("b")
+    assert cache.current_bytes == 4
+
+def test_ttl_cache_expiry():
+    print("🧪 Testing TTL expiry...")
+    cache = TTLCache(ttl=0.05)
+    cache.set("short", "1")
+    cache.set("pinned", "2", ttl=60)
+    time.sleep(0.1)
+    assert cache.get("short") is None
+    assert cache.get("pinned") == "2"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_sqlite_tier_survives_restart():
+    print("🧪 Testing the SQLite LLM cache tier...")
+    path = os.path.join(tempfile.mkdtemp(), "llm_cache.sqlite3")
+    LLMResponseCache(path=path).set("gemini-pro", "Describe the audience", "Tech professionals")
+
+    # A new process (fresh memory tier) reads it back from disk and promotes it
+    restarted = LLMResponseCache(path=path)
+    assert restarted.get("gemini-pro", "Describe the audience") == "Tech professionals"
+    assert restarted.disk_hits == 1
+    assert restarted.get("gemini-pro", "Describe the audience") == "Tech professionals"
+    assert restarted.disk_hits == 1  # Second hit served from memory
+    assert restarted.get("gemini-1.5-flash", "Describe the audience") is None  # Keyed by model too
+    assert make_cache_key("a", "bc") != make_cache_key("ab", "c")
+
+    restarted.delete("gemini-pro", "Describe the audience")
+    assert LLMResponseCache(path=path).get("gemini-pro", "Describe the audience") is None
+
+def test_sqlite_tier_honours_ttl():
+    print("🧪 Testing expiry of disk cache entries...")
+    path = os.path.join(tempfile.mkdtemp(), "llm_cache.sqlite3")
+    LLMResponseCache(path=path, ttl=60).set("gemini-pro", "prompt", "old answer")
+    assert LLMResponseCache(path=path, ttl=60).get("gemini-pro", "prompt") == "old answer"
+    assert LLMResponseCache(path=path, ttl=0.000001).get("gemini-pro", "prompt") is None
+
+def disk_keys(path):
+    with sqlite3.connect(path) as db:
+        return {key for (key,) in db.execute("SELECT key FROM llm_responses")}
+
+def test_disk_hits_keep_their_remaining_ttl():
+    print("🧪 Testing promotion of disk hits with their remaining TTL...")
+    path = os.path.join(tempfile.mkdtemp(), "llm_cache.sqlite3")
+    LLMResponseCache(path=path).set("gemini-pro", "prompt", "answer")
+    with sqlite3.connect(path) as db:
+        db.execute("UPDATE llm_responses SET created_at = ?", (time.time() - 0.3,))
+
+    cache = LLMResponseCache(path=path, ttl=0.5)
+    assert cache.get("gemini-pro", "prompt") == "answer"
+    time.sleep(0.3)
+    # Expired in memory with the row it came from, not a full TTL after promotion
+    key = make_cache_key("gemini-pro", "prompt")
+    assert cache.memory.get(key) is None
+    assert cache.get("gemini-pro", "prompt") is None
+    assert key not in disk_keys(path)  # Deleted when found expired
+
+def test_expired_rows_purged_from_disk():
+    print("🧪 Testing purging of expired disk cache rows...")
+    path = os.path.join(tempfile.mkdtemp(), "llm_cache.sqlite3")
+    writer = LLMResponseCache(path=path, ttl=60)
+    writer.set("gemini-pro", "old", "old answer")
+    with sqlite3.connect(path) as db:
+        db.execute("UPDATE llm_responses SET created_at = ?", (time.time() - 120,))
+
+    # On open
+    LLMResponseCache(path=path, ttl=60)
+    assert disk_keys(path) == set()
+
+    # Periodically, on writes
+    original = llm_cache.LLM_CACHE_PURGE_INTERVAL
+    llm_cache.LLM_CACHE_PURGE_INTERVAL = 0
+    try:
+        writer.set("gemini-pro", "stale", "stale answer")
+        with sqlite3.connect(path) as db:
+            db.execute("UPDATE llm_responses SET created_at = ?", (time.time() - 120,))
+        writer.set("gemini-pro", "fresh", "fresh answer")
+    finally:
+        llm_cache.LLM_CACHE_PURGE_INTERVAL = original
+    assert disk_keys(path) == {make_cache_key("gemini-pro", "fresh")}
+
+def test_generate_uncached_skips_rejected_responses():
+    print("🧪 Testing response validation before caching...")
+    model = type("Model", (), {"generate_content": lambda self, prompt: type("R", (), {"text": "not json"})()})()
+    llm_cache._cache = LLMResponseCache(path=None)
+    assert llm_cache.generate_uncached(model, "gemini-pro", "p", validate=lambda text: text.startswith("{")) == "not json"
+    assert llm_cache.lookup_cached("gemini-pro", "p") is None
+    llm_cache.generate_uncached(model, "gemini-pro", "p")
+    assert llm_cache.lookup_cached("gemini-pro", "p") == "not json"
+
+if __name__ == "__main__":
+    test_ttl_cache_evicts_least_recently_used()
+    test_ttl_cache_byte_limit()
+    test_ttl_cache_expiry()
+    test_sqlite_tier_survives_restart()
+    test_sqlite_tier_honours_ttl()
+    test_disk_hits_keep_their_remaining_ttl()
+    test_expired_rows_purged_from_disk()
+    test_generate_uncached_skips_rejected_responses()
@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import llm_scheduler
+from llm_scheduler import LLMScheduler, SchedulerBusy, TokenBucket
+
+
+def test_token_bucket_paces_after_burst():
+    print("🧪 Testing token-bucket pacing...")
+
+    async def take(count):
+        bucket = TokenBucket(rate=20, capacity=2)
+        started = time.monotonic()
+        for _ in range(count):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # The burst is free; every further token waits 1/rate
+    assert asyncio.run(take(2)) < 0.03
+    elapsed = asyncio.run(take(6))
+    assert 0.18 <= elapsed < 0.5, elapsed
+
+def test_scheduler_rejects_when_queue_is_full():
+    print("🧪 Testing SchedulerBusy back-pressure...")
+    scheduler = LLMScheduler(rate=1000, burst=1000, max_in_flight=1, max_queue=1)
+    release = threading.Event()
+
+    def slow_call(value):
+        release.wait(2)
+        return value
+
+    async def run():
+        first = asyncio.create_task(scheduler.submit(slow_call, 1))
+        second = asyncio.create_task(scheduler.submit(slow_call, 2))
+        await asyncio.sleep(0.05)
+        assert scheduler.pending == 2 and scheduler.in_flight == 1
+        with pytest.raises(SchedulerBusy) as busy:
+            await scheduler.submit(slow_call, 3)
+        assert busy.value.retry_after >= 1.0
+        release.set()
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(run()) == [1, 2]
+    stats = scheduler.stats()
+    assert stats["rejected"] == 1 and stats["completed"] == 2 and stats["pending"] == 0
+
+def test_scheduler_retries_transient_errors_only():
+    print("🧪 Testing retries with backoff...")
+    original = llm_scheduler.LLM_RETRY_BASE_DELAY
+    llm_scheduler.LLM_RETRY_BASE_DELAY = 0.01
+    try:
+        scheduler = LLMScheduler(rate=1000, burst=1000, max_retries=2)
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise ConnectionError("reset by peer")
+            return "ok"
+
+        assert asyncio.run(scheduler.submit(flaky)) == "ok"
+        assert scheduler.retried == 2 and len(attempts) == 3
+
+        def broken():
+            raise ValueError("bad prompt")
+
+        with pytest.raises(ValueError):
+            asyncio.run(scheduler.submit(broken))
+        assert scheduler.retried == 2 and scheduler.failed == 1  # Not retried
+    finally:
+        llm_scheduler.LLM_RETRY_BASE_DELAY = original
+
+if __name__ == "__main__":
+    test_token_bucket_paces_after_burst()
+    test_scheduler_rejects_when_queue_is_full()
+    test_scheduler_retries_transient_errors_only()
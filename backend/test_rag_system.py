@@ -0,0 +1,302 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import types
+
+import numpy as np
+
+import rag_system
+from embedding_backend import LocalEmbeddingFunction
+from rag_system import ChromaRAGSystem, build_where, infer_filters
+from vector_store import matches_where
+
+TRACKED_CHROMA_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chroma_db")
+
+
+class HashingEmbeddingFunction(LocalEmbeddingFunction):
+    """Deterministic bag-of-words vectors, so tests never download a model"""
+
+    def __init__(self, dimensions: int = 64):
+        super().__init__(backend="hashing", model_name="hashing-test", cache_path=None)
+        self.dimensions = dimensions
+
+    def _encode(self, texts):
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r"[a-z0-9]+", text.lower()):
+                vectors[row, int(hashlib.md5(token.encode()).hexdigest(), 16) % self.dimensions] += 1
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+def open_tracked_copy() -> ChromaRAGSystem:
+    """RAG system over a scratch copy of the tracked chroma_db (the tracked files stay untouched)"""
+    path = os.path.join(tempfile.mkdtemp(), "chroma_db")
+    shutil.copytree(TRACKED_CHROMA_DB, path)
+    original = rag_system.RAG_CHROMA_PATH
+    rag_system.RAG_CHROMA_PATH = path
+    try:
+        return ChromaRAGSystem()
+    finally:
+        rag_system.RAG_CHROMA_PATH = original
+
+
+def build_populated_rag() -> ChromaRAGSystem:
+    """RAG system with every customer synced into a fresh store, embedded by HashingEmbeddingFunction"""
+    original = rag_system.RAG_CHROMA_PATH, rag_system.build_embedding_function
+    rag_system.RAG_CHROMA_PATH = os.path.join(tempfile.mkdtemp(), "chroma_db")
+    rag_system.build_embedding_function = HashingEmbeddingFunction
+    try:
+        return ChromaRAGSystem()
+    finally:
+        rag_system.RAG_CHROMA_PATH, rag_system.build_embedding_function = original
+
+
+class FailingAfterEmbedding(HashingEmbeddingFunction):
+    """Embeds the first `calls` batches, then fails like an unreachable model"""
+
+    def __init__(self, calls: int = 1):
+        super().__init__()
+        self.remaining = calls
+
+    def _encode(self, texts):
+        if self.remaining <= 0:
+            raise OSError("[Errno -2] Name or service not known")
+        self.remaining -= 1
+        return super()._encode(texts)
+
+
+def use_rag_instance(rag, status: str):
+    """Point the module-level singleton and readiness state at rag; returns what to restore"""
+    saved = rag_system._rag_instance, dict(rag_system._rag_state)
+    rag_system._rag_instance = rag
+    rag_system._rag_state.update(status=status, error=None, load_seconds=None)
+    return saved
+
+
+def restore_rag_instance(saved):
+    rag_system._rag_instance = saved[0]
+    rag_system._rag_state.clear()
+    rag_system._rag_state.update(saved[1])
+
+
+def test_opens_tracked_chroma_db_with_default_backend():
+    print("🧪 Testing the tracked ChromaDB collection with the default embedding backend...")
+
+    rag = open_tracked_copy()
+    assert rag.store is not None, "collection failed to open - RAG would silently use fallbacks"
+    assert rag.collection_name == "marketbridge_customers"
+    assert rag.store.count() == len(rag.customer_data)
+
+def test_segments_built_lazily_without_warm_up():
+    print("🧪 Testing RAG use when warm-up never ran (RAG_WARMUP=0)...")
+
+    saved = use_rag_instance(build_populated_rag(), "not_started")
+    try:
+        segments = rag_system.get_customer_segments_or_fallback("Wireless Headphones", "tech professionals")
+        assert not segments.get('fallback')
+        assert rag_system.rag_readiness()["ready"]
+        batch = rag_system.get_customer_segments_batch_or_fallback([("Smart Watch", "fitness students")])
+        assert not batch[0].get('fallback')
+    finally:
+        restore_rag_instance(saved)
+
+def test_lazy_build_probes_the_vector_store():
+    print("🧪 Testing first-use readiness when the embedding model cannot answer...")
+
+    rag = build_populated_rag()
+    rag.embedding_function = FailingAfterEmbedding(calls=0)
+    saved = use_rag_instance(rag, "not_started")
+    try:
+        segments = rag_system.get_customer_segments_or_fallback("Smart Watch", "budget gear for students")
+        readiness = rag_system.rag_readiness()
+        assert not readiness["ready"] and readiness["status"] == "failed"
+        assert "Name or service" in readiness["error"]
+        # Still served from the keyword fallback of the built instance
+        assert not segments.get('fallback') and segments['segments']['primary']
+    finally:
+        restore_rag_instance(saved)
+
+def test_fallback_only_while_warming_up():
+    print("🧪 Testing fallback segments during warm-up...")
+
+    saved = use_rag_instance(build_populated_rag(), "warming_up")
+    try:
+        assert rag_system.get_customer_segments_or_fallback("Smart Watch", "students").get('fallback')
+        assert all(s.get('fallback') for s in rag_system.get_customer_segments_batch_or_fallback([("Smart Watch", "students")]))
+    finally:
+        restore_rag_instance(saved)
+
+def test_warm_up_readiness_requires_a_vector_store():
+    print("🧪 Testing that /health readiness reflects the vector store...")
+
+    rag = build_populated_rag()
+    saved = use_rag_instance(rag, "not_started")
+    try:
+        rag_system.warm_up_rag_system()
+        assert rag_system.rag_readiness()["ready"]
+
+        rag.store = None
+        rag_system.warm_up_rag_system()
+        readiness = rag_system.rag_readiness()
+        assert not readiness["ready"] and readiness["status"] == "failed"
+        assert "vector store" in readiness["error"]
+    finally:
+        restore_rag_instance(saved)
+
+def test_prefilter_keeps_every_keyword_match():
+    print("🧪 Testing that audience pre-filters agree with keyword scoring...")
+
+    rag = build_populated_rag()
+    customers = list(rag.customer_data) + [
+        {"name": "High Earner", "age": 41, "income": 180000, "demographics": "Product owner, urban"},
+        {"name": "Mid Earner", "age": 38, "income": 90000, "demographics": "Product owner, suburban"},
+        {"name": "Young Analyst", "age": 22, "income": 48000, "demographics": "Analyst, urban"}
+    ]
+    queries = ["premium headphones for busy executives", "budget gear for students",
+               "tools for creative designers", "executive gifts and student deals", "premium executive travel"]
+    for query in queries:
+        where = build_where(infer_filters(query))
+        eligible = [customer for customer in customers
+                    if matches_where(ChromaRAGSystem.customer_metadata(customer), where)]
+        scores = {customer['name']: rag.calculate_keyword_score(customer, query) for customer in customers}
+        filtered_scores = {customer['name']: scores[customer['name']] for customer in eligible}
+
+        # Nobody the pre-filter drops would have scored
+        unfiltered_ranking = sorted((name for name, score in scores.items() if score > 0), key=lambda name: (-scores[name], name))
+        filtered_ranking = sorted((name for name, score in filtered_scores.items() if score > 0), key=lambda name: (-scores[name], name))
+        assert filtered_ranking == unfiltered_ranking, query
+        # Single-audience queries: the pre-filter is exactly the customers that score
+        if len(infer_filters(query)["audiences"]) == 1:
+            assert all(score > 0 for score in filtered_scores.values()), query
+
+    executives = {customer['name'] for customer in customers
+                  if matches_where(ChromaRAGSystem.customer_metadata(customer), build_where({"audiences": ["executive"]}))}
+    assert "High Earner" in executives and "Mid Earner" not in executives
+    # Demographic hints alone ("high income", "disposable income") do not score, so they do not pass either
+    assert "Alex Chen" not in executives and "Kevin Wu" not in executives
+
+def test_cohort_insights_from_store_columns():
+    print("🧪 Testing whole-cohort insights...")
+
+    rag = build_populated_rag()
+    plain = rag.get_customer_segments("Wireless Headphones", "gear for busy professionals", "primary")
+    with_cohort = rag.get_customer_segments("Wireless Headphones", "gear for busy professionals", "primary", cohort_size=15)
+
+    # Primary / secondary keep their meaning (top three, next three); the cohort is reported alongside
+    assert with_cohort['insights']['primary'] == plain['insights']['primary']
+    assert with_cohort['insights']['secondary'] == plain['insights']['secondary']
+    assert with_cohort['segments'] == plain['segments']
+
+    # Same statistics as summarising the retrieved customer dicts
+    retrieved = rag.find_relevant_customers("Wireless Headphones", "gear for busy professionals", top_k=15)
+    cohort = with_cohort['insights']['cohort']
+    assert cohort == ChromaRAGSystem.calculate_segment_insights(retrieved, "primary")
+    assert cohort['cohort_size'] == len(retrieved)
+
+    # Cached as a row array, sized by its length
+    rows = rag.cohort_rows("Wireless Headphones", "gear for busy professionals", 15)
+    assert rows.dtype == np.int64 and len(rows) == len(retrieved)
+    assert rag_system.results_size(rows) == rows.nbytes + 64
+
+def test_failed_sync_still_loads_every_customer():
+    print("🧪 Testing ingestion when the ChromaDB sync fails partway...")
+
+    original = (rag_system.RAG_CHROMA_PATH, rag_system.build_embedding_function, rag_system.RAG_UPSERT_BATCH_SIZE,
+                rag_system.RAG_EMBED_WORKERS)
+    rag_system.RAG_CHROMA_PATH = os.path.join(tempfile.mkdtemp(), "chroma_db")
+    rag_system.build_embedding_function = FailingAfterEmbedding
+    rag_system.RAG_UPSERT_BATCH_SIZE = 2
+    rag_system.RAG_EMBED_WORKERS = 1
+    try:
+        rag = ChromaRAGSystem()
+    finally:
+        (rag_system.RAG_CHROMA_PATH, rag_system.build_embedding_function, rag_system.RAG_UPSERT_BATCH_SIZE,
+         rag_system.RAG_EMBED_WORKERS) = original
+
+    assert rag.sync_error and "Name or service" in rag.sync_error
+    assert rag.store.count() < 20
+    assert len(rag.customer_data) == 20
+    assert rag.cache_stats()["sync_error"] == rag.sync_error
+    # The keyword fallback sees the whole customer base
+    students = rag.fallback_customer_search("Smart Watch", "budget gear for students")
+    assert {"Sarah Johnson", "Tyler Johnson", "Samantha Taylor"} <= {customer['name'] for customer in students}
+
+def test_cohort_falls_back_when_search_fails():
+    print("🧪 Testing cohort insights with the embedding model unavailable...")
+
+    rag = build_populated_rag()
+    rag.embedding_function = FailingAfterEmbedding(calls=0)
+    saved = use_rag_instance(rag, "ready")
+    try:
+        segments = rag_system.get_customer_segments_or_fallback("Smart Watch", "budget gear for students", "primary", 50)
+    finally:
+        restore_rag_instance(saved)
+
+    keyword_matches = rag.fallback_customer_search("Smart Watch", "budget gear for students")
+    assert segments['insights']['cohort'] == ChromaRAGSystem.calculate_segment_insights(keyword_matches, "primary")
+    assert segments['segments']['primary']  # The regular segments fell back too
+
+def test_startup_skips_sync_for_an_unchanged_source():
+    print("🧪 Testing that startup only syncs when the customer source changed...")
+
+    source = os.path.join(tempfile.mkdtemp(), "customers.json")
+    shutil.copyfile(rag_system.RAG_CUSTOMER_DATA, source)
+    syncs = []
+    populate = ChromaRAGSystem.populate_chromadb
+    original = (rag_system.RAG_CHROMA_PATH, rag_system.RAG_CUSTOMER_DATA, rag_system.build_embedding_function,
+                rag_system.RAG_FORCE_SYNC)
+    rag_system.RAG_CHROMA_PATH = os.path.join(tempfile.mkdtemp(), "chroma_db")
+    rag_system.RAG_CUSTOMER_DATA = source
+    rag_system.build_embedding_function = HashingEmbeddingFunction
+    ChromaRAGSystem.populate_chromadb = lambda self, customers=None: syncs.append(1) or populate(self, customers)
+    try:
+        first = ChromaRAGSystem()
+        second = ChromaRAGSystem()
+        assert len(syncs) == 1
+        assert len(second.customer_data) == len(first.customer_data) == 20  # Still loaded for keyword search
+
+        stat = os.stat(source)
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+        ChromaRAGSystem()
+        assert len(syncs) == 2
+        ChromaRAGSystem()
+        assert len(syncs) == 2
+
+        rag_system.RAG_FORCE_SYNC = True
+        ChromaRAGSystem()
+        assert len(syncs) == 3
+    finally:
+        ChromaRAGSystem.populate_chromadb = populate
+        (rag_system.RAG_CHROMA_PATH, rag_system.RAG_CUSTOMER_DATA, rag_system.build_embedding_function,
+         rag_system.RAG_FORCE_SYNC) = original
+
+def test_embed_threads_reach_the_onnx_session():
+    print("🧪 Testing RAG_EMBED_THREADS on the default ONNX model...")
+
+    import onnxruntime
+
+    encoder = LocalEmbeddingFunction(backend="default", threads=2, cache_path=None)._load()
+    sessions = []
+    encoder.ort = types.SimpleNamespace(
+        SessionOptions=onnxruntime.SessionOptions, GraphOptimizationLevel=onnxruntime.GraphOptimizationLevel,
+        InferenceSession=lambda path, providers, sess_options: sessions.append(sess_options) or "session"
+    )
+    assert encoder.model == "session" and encoder.model == "session"
+    assert len(sessions) == 1  # One session for the encoder's lifetime, not one per call
+    assert sessions[0].intra_op_num_threads == 2 and sessions[0].inter_op_num_threads == 1
+
+if __name__ == "__main__":
+    test_opens_tracked_chroma_db_with_default_backend()
+    test_segments_built_lazily_without_warm_up()
+    test_lazy_build_probes_the_vector_store()
+    test_fallback_only_while_warming_up()
+    test_warm_up_readiness_requires_a_vector_store()
+    test_prefilter_keeps_every_keyword_match()
+    test_cohort_insights_from_store_columns()
+    test_failed_sync_still_loads_every_customer()
+    test_cohort_falls_back_when_search_fails()
+    test_startup_skips_sync_for_an_unchanged_source()
+    test_embed_threads_reach_the_onnx_session()
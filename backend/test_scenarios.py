@@ -0,0 +1,80 @@
+from scenario_generator import evaluate_scenarios, generate_scenarios, optimize_campaign, simulate_scenarios, sweep_grid
+
+def test_grid_matches_single_scenarios():
+    print("🧪 Testing vectorized what-if engine...")
+    
+    grid = evaluate_scenarios([10, 20], [14, 30], [10000], [5000, 20000])
+    print(f"ROI matrix shape: {grid['roi'].shape}")
+    
+    # Every grid cell must agree with the scalar model
+    for i, discount in enumerate([10, 20]):
+        for j, duration in enumerate([14, 30]):
+            for k, budget in enumerate([5000, 20000]):
+                for s, scenario in enumerate(generate_scenarios(discount, duration, 10000, budget)):
+                    assert round(float(grid["roi"][s, i, j, 0, k]), 2) == scenario["roi"]
+                    assert round(float(grid["conversion_rate"][s, i, j, 0, k]), 2) == scenario["conversion_rate"]
+    
+    sweep = sweep_grid(range(0, 55, 5), range(7, 63, 7), [10000], [5000, 10000, 20000])
+    print(f"Best configuration: {sweep['best']}")
+
+def test_monte_carlo_is_reproducible():
+    print("🧪 Testing Monte Carlo simulation...")
+    
+    first = simulate_scenarios(20, 30, 50000, 20000, trials=100000, seed=42)
+    second = simulate_scenarios(20, 30, 50000, 20000, trials=100000, seed=42)
+    assert first == second
+    
+    # Chunked (histogram) percentiles should land close to the exact ones
+    chunked = simulate_scenarios(20, 30, 50000, 20000, trials=100000, seed=42, chunk_size=10000)
+    for exact, approx in zip(first["scenarios"], chunked["scenarios"]):
+        print(f"{exact['name']}: mean ROI {exact['mean_roi']} (estimate {exact['roi_estimate']}), "
+              f"P(loss) {exact['probability_of_loss']}, p50 {exact['percentiles']['p50']}")
+        assert abs(exact["mean_roi"] - exact["roi_estimate"]) / exact["roi_estimate"] < 0.02
+        assert abs(exact["percentiles"]["p50"] - approx["percentiles"]["p50"]) / exact["percentiles"]["p50"] < 0.02
+
+def test_chunked_percentiles_when_every_roi_is_negative():
+    print("🧪 Testing histogram percentiles for an all-loss campaign...")
+    
+    exact = simulate_scenarios(20, 900, 50000, 20000, trials=100000, seed=42)
+    chunked = simulate_scenarios(20, 900, 50000, 20000, trials=100000, seed=42, chunk_size=10000)
+    for strategy, approx in zip(exact["scenarios"], chunked["scenarios"]):
+        assert strategy["percentiles"]["p95"] < 0
+        spread = strategy["percentiles"]["p95"] - strategy["percentiles"]["p5"]
+        for point, value in strategy["percentiles"].items():
+            assert abs(value - approx["percentiles"][point]) < 0.02 * spread, (strategy["name"], point)
+
+def test_optimizer_respects_limits():
+    print("🧪 Testing budget-constrained optimizer...")
+    
+    result = optimize_campaign(50000, 50000, inventory_limit=1500)
+    for best in result["best_by_strategy"]:
+        print(f"{best['name']}: {best}")
+        if best["feasible"]:
+            assert best["budget"] <= 50000
+            assert best["expected_conversions"] <= 1500
+    print(f"Pareto frontier: {result['pareto_frontier']}")
+    assert result["pareto_frontier"]
+
+def test_refinement_never_loses_the_incumbent():
+    print("🧪 Testing optimizer grid refinement...")
+    
+    # A tight inventory limit leaves few feasible cells, so some refinement rounds find nothing better
+    coarse = optimize_campaign(50000, 50000, inventory_limit=1200, grid_points=9, refine_rounds=0)
+    refined = optimize_campaign(50000, 50000, inventory_limit=1200, grid_points=9, refine_rounds=3)
+    assert any(best["feasible"] for best in refined["best_by_strategy"])
+    for before, after in zip(coarse["best_by_strategy"], refined["best_by_strategy"]):
+        assert before["feasible"] == after["feasible"]
+        if after["feasible"]:
+            assert after["roi"] >= before["roi"]
+            # The reported configuration is the one that produced the reported ROI
+            check = generate_scenarios(after["discount"], after["duration"], 50000, after["budget"])
+            scenario = next(s for s in check if s["name"] == after["name"])
+            assert abs(scenario["roi"] - after["roi"]) < 0.05
+            assert after["expected_conversions"] <= 1200
+
+if __name__ == "__main__":
+    test_grid_matches_single_scenarios()
+    test_monte_carlo_is_reproducible()
+    test_chunked_percentiles_when_every_roi_is_negative()
+    test_optimizer_respects_limits()
+    test_refinement_never_loses_the_incumbent()
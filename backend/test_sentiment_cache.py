@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import llm_cache
+import llm_scheduler
+from llm_cache import LLMResponseCache, get_llm_cache
+from sentiment_trend_analyzer import SentimentTrendAnalyzer
+
+VALID_ITEM = {"sentiment": "positive", "confidence": 0.9,
+              "emotions": {"joy": 0.6, "anger": 0.0, "fear": 0.0, "sadness": 0.0, "surprise": 0.2}}
+
+
+class ScriptedModel:
+    """Stands in for Gemini: answers from a list of canned responses, then repeats the last one"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        text = self.responses[min(self.calls, len(self.responses) - 1)]
+        self.calls += 1
+        return type("Response", (), {"text": text})()
+
+
+def batch_response(count: int) -> str:
+    return json.dumps([dict(VALID_ITEM, index=i) for i in range(count)])
+
+
+def analyzer_with(model) -> SentimentTrendAnalyzer:
+    llm_cache._cache = LLMResponseCache(path=None)  # Memory-only cache, isolated per test
+    analyzer = SentimentTrendAnalyzer.__new__(SentimentTrendAnalyzer)
+    analyzer.model = model
+    return analyzer
+
+
+def test_malformed_batch_response_is_not_cached():
+    print("🧪 Testing that unparseable batch responses never reach the cache...")
+    texts = ["great product", "amazing sound"]
+    analyzer = analyzer_with(ScriptedModel(['[{"index": 0, "sentiment": "posi', batch_response(2)]))
+    prompt = analyzer._build_batch_prompt(texts)
+
+    asyncio.run(analyzer._analyze_batch(texts))
+    assert get_llm_cache().get('gemini-pro', prompt) is None
+
+    # The next identical request asks Gemini again and caches the good answer
+    results = asyncio.run(analyzer._analyze_batch(texts))
+    assert [result.sentiment for result in results] == ["positive", "positive"]
+    assert get_llm_cache().get('gemini-pro', prompt) == batch_response(2)
+
+def test_partial_batch_response_is_not_cached():
+    print("🧪 Testing that batch responses missing items are used but not cached...")
+    texts = ["great product", "terrible battery"]
+    analyzer = analyzer_with(ScriptedModel([json.dumps([dict(VALID_ITEM, index=0)])]))
+
+    results = asyncio.run(analyzer._analyze_batch(texts))
+    assert results[0].confidence == 0.9 and results[1].sentiment == "negative"  # Dynamic fallback for the gap
+    assert get_llm_cache().get('gemini-pro', analyzer._build_batch_prompt(texts)) is None
+
+def test_cached_malformed_response_is_evicted():
+    print("🧪 Testing eviction of a cached response that no longer parses...")
+    texts = ["great product", "amazing sound"]
+    model = ScriptedModel([batch_response(2)])
+    analyzer = analyzer_with(model)
+    prompt = analyzer._build_batch_prompt(texts)
+    get_llm_cache().set('gemini-pro', prompt, "Sorry, I can't help with that.")
+
+    results = asyncio.run(analyzer._analyze_batch(texts))
+    assert model.calls == 1
+    assert all(result.confidence == 0.9 for result in results)
+    assert get_llm_cache().get('gemini-pro', prompt) == batch_response(2)
+
+class QuotaExhaustedModel:
+    """Stands in for Gemini with no quota left: every call fails"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        raise llm_scheduler.RETRYABLE_ERRORS[0]("Quota exceeded")
+
+def test_quota_errors_do_not_split_batches():
+    print("🧪 Testing that persistent quota errors cost one scheduled call per batch...")
+    texts = [f"great product number {i}" for i in range(25)]
+    model = QuotaExhaustedModel()
+    analyzer = analyzer_with(model)
+    original = llm_scheduler.LLM_RETRY_BASE_DELAY
+    llm_scheduler.LLM_RETRY_BASE_DELAY = 0.001
+    try:
+        results = asyncio.run(analyzer.analyze_sentiment_batch(texts, batch_size=25))
+    finally:
+        llm_scheduler.LLM_RETRY_BASE_DELAY = original
+    # The scheduler's own retries only - no halving into ever smaller batches
+    assert model.calls == llm_scheduler.llm_scheduler.max_retries + 1
+    assert [result.sentiment for result in results] == ["positive"] * 25  # Keyword fallback for every text
+
+if __name__ == "__main__":
+    test_malformed_batch_response_is_not_cached()
+    test_partial_batch_response_is_not_cached()
+    test_cached_malformed_response_is_evicted()
+    test_quota_errors_do_not_split_batches()
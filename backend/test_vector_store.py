@@ -0,0 +1,76 @@
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip("faiss")
+
+from vector_store import FaissVectorStore
+
+
+def vector(i: int, dimension: int = 8):
+    rng = np.random.default_rng(i)
+    return rng.standard_normal(dimension).astype(np.float32)
+
+
+def write(store, ids):
+    store.upsert(ids=ids, documents=ids, metadatas=[{"name": doc_id, "state": "CA"} for doc_id in ids],
+                 embeddings=[vector(int(doc_id.split("_")[1])) for doc_id in ids])
+
+
+def test_flush_and_reopen():
+    print("🧪 Testing FAISS flush and reopen...")
+    path = tempfile.mkdtemp()
+    store = FaissVectorStore(path, index_type="flat")
+    write(store, [f"customer_{i}" for i in range(20)])
+    assert store.count() == 0  # Pending writes are invisible until flush
+    store.flush()
+    assert store.count() == 20
+
+    hit = store.query([vector(7)], n_results=1, include=["metadatas", "distances"])
+    assert hit["ids"][0] == ["customer_7"] and hit["metadatas"][0][0]["name"] == "customer_7"
+
+    reopened = FaissVectorStore(path, index_type="flat")
+    assert reopened.count() == 20
+    assert reopened.query([vector(3)], n_results=1, include=["metadatas"])["ids"][0] == ["customer_3"]
+    page = reopened.get(include=["metadatas"], limit=5, offset=18)
+    assert len(page["ids"]) == 2
+
+def test_delete_all():
+    print("🧪 Testing FAISS delete of every row...")
+    path = tempfile.mkdtemp()
+    store = FaissVectorStore(path, index_type="flat")
+    ids = [f"customer_{i}" for i in range(5)]
+    write(store, ids)
+    store.flush()
+    store.delete(ids)
+    store.flush()
+    assert store.count() == 0
+    assert store.query([vector(1)], n_results=3, include=["metadatas"])["ids"] == [[]]
+    assert FaissVectorStore(path, index_type="flat").count() == 0
+
+def test_concurrent_flushes_keep_every_write():
+    print("🧪 Testing concurrent FAISS flushes on one path...")
+    path = tempfile.mkdtemp()
+    # Separate stores stand in for separate worker processes sharing the directory
+    stores = [FaissVectorStore(path, index_type="flat") for _ in range(4)]
+    for n, store in enumerate(stores):
+        write(store, [f"customer_{n * 10 + i}" for i in range(10)])
+    threads = [threading.Thread(target=store.flush) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    reopened = FaissVectorStore(path, index_type="flat")
+    assert reopened.count() == 40
+    assert len(set(reopened.get(include=["metadatas"], limit=100, offset=0)["ids"])) == 40
+    # Only the published generation and the one it replaced stay on disk
+    assert len([entry for entry in os.listdir(path) if entry.startswith("gen-")]) <= 2
+
+if __name__ == "__main__":
+    test_flush_and_reopen()
+    test_delete_all()
+    test_concurrent_flushes_keep_every_write()
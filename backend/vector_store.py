@@ -0,0 +1,517 @@
+import hashlib
+import heapq
+import json
+import math
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: flushes are serialized within one process only
+    fcntl = None
+
+# Vector store selection and FAISS tuning (override via environment)
+RAG_VECTOR_STORE = os.getenv("RAG_VECTOR_STORE", "chroma")  # "chroma" or "faiss"
+RAG_FAISS_PATH = os.getenv(
+    "RAG_FAISS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "faiss_index")
+)
+RAG_FAISS_INDEX = os.getenv("RAG_FAISS_INDEX", "ivf")  # "flat", "ivf" or "hnsw"
+RAG_FAISS_NLIST = int(os.getenv("RAG_FAISS_NLIST", "4096"))
+RAG_FAISS_NPROBE = int(os.getenv("RAG_FAISS_NPROBE", "16"))
+RAG_FAISS_HNSW_M = int(os.getenv("RAG_FAISS_HNSW_M", "32"))
+RAG_FAISS_EF_SEARCH = int(os.getenv("RAG_FAISS_EF_SEARCH", "64"))
+RAG_FAISS_EF_CONSTRUCTION = int(os.getenv("RAG_FAISS_EF_CONSTRUCTION", "80"))
+# Filtered queries fetch this many times top_k candidates before applying the where clause
+RAG_FAISS_FILTER_OVERSAMPLE = int(os.getenv("RAG_FAISS_FILTER_OVERSAMPLE", "10"))
+# Sharded retrieval: RAG_SHARDS > 1 splits customers by id hash or by region (state)
+RAG_SHARDS = int(os.getenv("RAG_SHARDS", "1"))
+RAG_SHARD_BY = os.getenv("RAG_SHARD_BY", "hash")  # "hash" or "region"
+RAG_SHARD_WORKERS = int(os.getenv("RAG_SHARD_WORKERS", "0"))  # 0 = one thread per shard
+# Below this many vectors per IVF list a flat (exact) index is used instead
+MIN_VECTORS_PER_LIST = 39
+TRAIN_VECTORS_PER_LIST = 256
+
+
+def matches_where(metadata: Dict, where: Optional[Dict]) -> bool:
+    """Evaluate a Chroma-style where clause against one metadata dict.
+
+    Supports $and / $or and the $eq, $ne, $in, $nin, $gt, $gte, $lt, $lte
+    operators; a bare value means equality. Missing fields never match.
+    """
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        else:
+            if key not in metadata:
+                return False
+            value = metadata[key]
+            operators = condition if isinstance(condition, dict) else {"$eq": condition}
+            for operator, operand in operators.items():
+                if operator == "$eq" and value != operand:
+                    return False
+                if operator == "$ne" and value == operand:
+                    return False
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$nin" and value in operand:
+                    return False
+                try:
+                    if operator == "$gt" and not value > operand:
+                        return False
+                    if operator == "$gte" and not value >= operand:
+                        return False
+                    if operator == "$lt" and not value < operand:
+                        return False
+                    if operator == "$lte" and not value <= operand:
+                        return False
+                except TypeError:
+                    return False
+    return True
+
+
+class ChromaVectorStore:
+    """Vector store backed by a Chroma collection (the default)"""
+
+    name = "chroma"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def get(self, include: List[str], limit: int, offset: int) -> Dict:
+        return self.collection.get(include=include, limit=limit, offset=offset)
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[Dict], embeddings):
+        self.collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def delete(self, ids: List[str]):
+        self.collection.delete(ids=ids)
+
+    def flush(self):
+        """Chroma persists every write itself"""
+
+    def query(self, query_embeddings, n_results: int, include: List[str], where: Dict = None,
+              search_params: Dict = None) -> Dict:
+        """Nearest neighbours; search_params are FAISS-only and ignored here"""
+        kwargs = {"where": where} if where else {}
+        return self.collection.query(query_embeddings=query_embeddings, n_results=n_results,
+                                     include=include, **kwargs)
+
+    def stats(self) -> Dict:
+        return {"backend": self.name, "count": self.collection.count()}
+
+
+def stable_shard(key: str, shards: int) -> int:
+    """Shard for a key - stable across processes, unlike hash()"""
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big") % shards
+
+
+def where_states(where: Optional[Dict]) -> Optional[set]:
+    """States a where clause is restricted to (None when it does not restrict state)"""
+    if not where:
+        return None
+    if "state" in where:
+        condition = where["state"]
+        if isinstance(condition, dict):
+            if "$in" in condition:
+                return set(condition["$in"])
+            if "$eq" in condition:
+                return {condition["$eq"]}
+            return None
+        return {condition}
+    for clause in where.get("$and", []):
+        states = where_states(clause)
+        if states is not None:
+            return states
+    return None
+
+
+class ShardedVectorStore:
+    """Customers partitioned over several stores, queried in parallel.
+
+    Rows are routed by a stable hash of their id, or by their state when
+    shard_by is "region" (customers without a state are hashed by id).
+    Each shard returns its own top n_results and the lists are merged by
+    distance, so the caller's hybrid scoring sees the same candidates a
+    single store would. Region sharding also prunes shards a where clause
+    on state cannot match. Each shard is an ordinary store with its own
+    directory, so shards can sit on different disks.
+    """
+
+    name = "sharded"
+
+    def __init__(self, shards: List, shard_by: str = RAG_SHARD_BY, workers: int = RAG_SHARD_WORKERS):
+        self.shards = shards
+        self.shard_by = shard_by
+        self.executor = ThreadPoolExecutor(max_workers=workers or len(shards), thread_name_prefix="rag-shard")
+
+    def shard_for(self, doc_id: str, metadata: Dict) -> int:
+        if self.shard_by == "region" and metadata.get("state"):
+            return stable_shard(metadata["state"], len(self.shards))
+        return stable_shard(doc_id, len(self.shards))
+
+    def count(self) -> int:
+        return sum(self.executor.map(lambda shard: shard.count(), self.shards))
+
+    def get(self, include: List[str], limit: int, offset: int) -> Dict:
+        """A page across shards in shard order"""
+        page = {"ids": [], "metadatas": []}
+        for shard in self.shards:
+            if len(page["ids"]) >= limit:
+                break
+            size = shard.count()
+            if offset >= size:
+                offset -= size
+                continue
+            part = shard.get(include=include, limit=limit - len(page["ids"]), offset=offset)
+            page["ids"].extend(part["ids"])
+            page["metadatas"].extend(part["metadatas"])
+            offset = 0
+        return page
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[Dict], embeddings):
+        routed = {}
+        for i, (doc_id, metadata) in enumerate(zip(ids, metadatas)):
+            routed.setdefault(self.shard_for(doc_id, metadata), []).append(i)
+        if self.shard_by == "region":
+            # A customer may have moved region - drop any copy held by another shard
+            for index, shard in enumerate(self.shards):
+                stale = [ids[i] for target, rows in routed.items() if target != index for i in rows]
+                if stale:
+                    shard.delete(ids=stale)
+        for index, rows in routed.items():
+            self.shards[index].upsert(
+                ids=[ids[i] for i in rows],
+                documents=[documents[i] for i in rows],
+                metadatas=[metadatas[i] for i in rows],
+                embeddings=[embeddings[i] for i in rows]
+            )
+
+    def delete(self, ids: List[str]):
+        if self.shard_by == "region":
+            for shard in self.shards:  # The region is not known from the id alone
+                shard.delete(ids=ids)
+            return
+        routed = {}
+        for doc_id in ids:
+            routed.setdefault(stable_shard(doc_id, len(self.shards)), []).append(doc_id)
+        for index, shard_ids in routed.items():
+            self.shards[index].delete(ids=shard_ids)
+
+    def flush(self):
+        list(self.executor.map(lambda shard: shard.flush(), self.shards))
+
+    def query(self, query_embeddings, n_results: int, include: List[str], where: Dict = None,
+              search_params: Dict = None) -> Dict:
+        """Query the relevant shards in parallel and merge each query's top n_results by distance"""
+        shards = self.shards
+        states = where_states(where) if self.shard_by == "region" else None
+        if states is not None:
+            # Only the shards those states hash to can hold a matching customer
+            targets = {stable_shard(state, len(self.shards)) for state in states}
+            shards = [shard for index, shard in enumerate(self.shards) if index in targets]
+
+        def query_shard(shard):
+            count = shard.count()
+            if not count:
+                return None
+            return shard.query(query_embeddings=query_embeddings, n_results=min(n_results, count),
+                               include=include, where=where, search_params=search_params)
+
+        partials = [partial for partial in self.executor.map(query_shard, shards) if partial]
+        merged = {"ids": [], "metadatas": [], "distances": []}
+        for row in range(len(query_embeddings)):
+            candidates = heapq.nsmallest(n_results, (
+                (distance, doc_id, metadata)
+                for partial in partials
+                for doc_id, metadata, distance in zip(partial["ids"][row], partial["metadatas"][row],
+                                                      partial["distances"][row])
+            ), key=lambda candidate: candidate[0])
+            merged["ids"].append([doc_id for _, doc_id, _ in candidates])
+            merged["metadatas"].append([metadata for _, _, metadata in candidates])
+            merged["distances"].append([distance for distance, _, _ in candidates])
+        return merged
+
+    def stats(self) -> Dict:
+        return {
+            "backend": self.name,
+            "shard_by": self.shard_by,
+            "count": self.count(),
+            "shards": [shard.stats() for shard in self.shards]
+        }
+
+
+class FaissGeneration:
+    """One immutable, memory-mapped snapshot of the FAISS store on disk.
+
+    Files: index.faiss (the ANN index), vectors.npy (float32 rows, kept so
+    the index can be rebuilt), meta.bin (UTF-8 JSON [id, metadata] per row,
+    concatenated) and meta.idx (int64 byte offsets into meta.bin). Row i of
+    every file is FAISS label i, and metadata is only decoded for hits.
+    """
+
+    def __init__(self, directory: str):
+        import faiss
+
+        self.directory = directory
+        try:
+            self.index = faiss.read_index(os.path.join(directory, "index.faiss"),
+                                          faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # Index types without mmap support are read into memory
+            self.index = faiss.read_index(os.path.join(directory, "index.faiss"))
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(directory, "meta.idx"), mmap_mode="r")
+        self.blob = np.memmap(os.path.join(directory, "meta.bin"), dtype=np.uint8, mode="r") \
+            if int(self.offsets[-1]) else np.empty(0, dtype=np.uint8)
+        self._rows = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def row(self, i: int):
+        """(id, metadata) for row i"""
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return json.loads(self.blob[start:end].tobytes().decode("utf-8"))
+
+    def row_ids(self) -> Dict[str, int]:
+        """id -> row, built on first write (queries never need it)"""
+        if self._rows is None:
+            self._rows = {self.row(i)[0]: i for i in range(len(self))}
+        return self._rows
+
+
+class FaissVectorStore:
+    """In-process ANN store: a memory-mapped FAISS index plus a sidecar metadata file.
+
+    Loading maps the current generation's files, so start-up cost does not
+    grow with the collection. Writes are buffered and applied by flush(),
+    which rebuilds the index into a new generation directory and switches
+    the CURRENT pointer atomically; queries keep using the generation they
+    started with. Several processes may share one path: flushes take a
+    file lock and merge onto the latest generation. Recall/latency is tunable per query with search_params
+    {"nprobe": ...} (IVF) or {"efSearch": ...} (HNSW).
+    """
+
+    name = "faiss"
+
+    def __init__(self, path: str = RAG_FAISS_PATH, index_type: str = RAG_FAISS_INDEX):
+        import faiss  # Fail fast when faiss-cpu is not installed
+
+        self.faiss = faiss
+        self.path = path
+        self.index_type = index_type
+        self._pending: Dict[str, tuple] = {}  # id -> (embedding, metadata); None marks a delete
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.generation = None
+        os.makedirs(path, exist_ok=True)
+        current = self._read_current()
+        if current:
+            self.generation = FaissGeneration(os.path.join(path, current))
+            print(f"📂 Mapped FAISS index {current}: {len(self.generation)} vectors")
+
+    def _read_current(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.path, "CURRENT")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def count(self) -> int:
+        generation = self.generation
+        return len(generation) if generation else 0
+
+    def get(self, include: List[str], limit: int, offset: int) -> Dict:
+        """A page of flushed rows (pending writes are not visible until flush)"""
+        generation = self.generation
+        rows = [generation.row(i) for i in range(offset, min(offset + limit, len(generation)))] \
+            if generation else []
+        return {"ids": [row[0] for row in rows], "metadatas": [row[1] for row in rows]}
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[Dict], embeddings):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            for doc_id, metadata, vector in zip(ids, metadatas, vectors):
+                self._pending[doc_id] = (vector, metadata)
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            for doc_id in ids:
+                self._pending[doc_id] = None
+
+    def flush(self):
+        """Merge pending writes with the current generation and publish a new one.
+
+        Serialized across threads and processes by an exclusive lock on
+        path/LOCK. Under the lock the latest published generation is the
+        merge base, so concurrent writers never drop each other's rows, and
+        each new generation directory is reserved with mkdtemp. The merge
+        rewrites every row and rebuilds the index, and the first flush after
+        loading decodes every id - O(collection) per flush, which is why the
+        sync calls it once per run rather than once per batch.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        with self._flush_lock, self._file_lock():
+            self._publish(pending)
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on path/LOCK (in-process only where fcntl is unavailable)"""
+        with open(os.path.join(self.path, "LOCK"), "a") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _publish(self, pending: Dict[str, tuple]):
+        current = self._read_current()
+        old = self.generation
+        if current and (old is None or os.path.basename(old.directory) != current):
+            old = FaissGeneration(os.path.join(self.path, current))  # Another process published since we loaded
+        old_rows = old.row_ids() if old else {}
+        kept = [row for doc_id, row in old_rows.items() if doc_id not in pending]
+        added = [(doc_id, entry) for doc_id, entry in pending.items() if entry is not None]
+
+        directory = tempfile.mkdtemp(prefix=f"gen-{int(current.split('-')[1]) + 1 if current else 1:06d}-",
+                                     dir=self.path)
+        name = os.path.basename(directory)
+
+        dimension = old.vectors.shape[1] if old and len(old) else (len(added[0][1][0]) if added else 1)
+        total = len(kept) + len(added)
+        vectors = np.lib.format.open_memmap(os.path.join(directory, "vectors.npy"), mode="w+",
+                                            dtype=np.float32, shape=(total, dimension))
+        offsets = np.zeros(total + 1, dtype=np.int64)
+        with open(os.path.join(directory, "meta.bin"), "wb") as blob:
+            position = 0
+            for i, (doc_id, vector, metadata) in enumerate(self._merged_rows(old, kept, added)):
+                vectors[i] = vector
+                encoded = json.dumps([doc_id, metadata], separators=(",", ":")).encode("utf-8")
+                blob.write(encoded)
+                position += len(encoded)
+                offsets[i + 1] = position
+        vectors.flush()
+        with open(os.path.join(directory, "meta.idx"), "wb") as f:
+            np.save(f, offsets)  # A path would get ".npy" appended
+        self.faiss.write_index(self._build_index(np.asarray(vectors), dimension),
+                               os.path.join(directory, "index.faiss"))
+        del vectors
+
+        # Publish: atomic pointer swap, then map the new generation
+        pointer = os.path.join(self.path, "CURRENT.tmp")
+        with open(pointer, "w") as f:
+            f.write(name)
+        os.replace(pointer, os.path.join(self.path, "CURRENT"))
+        self.generation = FaissGeneration(directory)
+        print(f"✅ FAISS {self.index_type} index {name}: {total} vectors")
+        self._remove_old_generations(keep={name, current})
+
+    def _remove_old_generations(self, keep: set):
+        """Delete generations older than the one just replaced (kept for processes still opening it)"""
+        for entry in os.listdir(self.path):
+            if entry.startswith("gen-") and entry not in keep:
+                shutil.rmtree(os.path.join(self.path, entry), ignore_errors=True)  # Open maps stay valid
+
+    @staticmethod
+    def _merged_rows(old, kept: List[int], added: List):
+        for row in kept:
+            doc_id, metadata = old.row(row)
+            yield doc_id, old.vectors[row], metadata
+        for doc_id, (vector, metadata) in added:
+            yield doc_id, vector, metadata
+
+    def _build_index(self, vectors: np.ndarray, dimension: int):
+        """Flat for small collections, otherwise IVF (trained on a sample) or HNSW"""
+        faiss = self.faiss
+        total = len(vectors)
+        nlist = min(RAG_FAISS_NLIST, max(1, int(4 * math.sqrt(total))))
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dimension, RAG_FAISS_HNSW_M)
+            index.hnsw.efConstruction = RAG_FAISS_EF_CONSTRUCTION
+        elif self.index_type == "ivf" and total >= nlist * MIN_VECTORS_PER_LIST:
+            index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dimension), dimension, nlist)
+            sample = np.random.default_rng(0).choice(total, min(total, nlist * TRAIN_VECTORS_PER_LIST),
+                                                     replace=False)
+            index.train(np.ascontiguousarray(vectors[np.sort(sample)]))
+        else:
+            index = faiss.IndexFlatL2(dimension)
+        if total:
+            index.add(np.ascontiguousarray(vectors))
+        return index
+
+    def _search_params(self, index, search_params: Optional[Dict]):
+        """Per-query nprobe / efSearch"""
+        search_params = search_params or {}
+        if isinstance(index, self.faiss.IndexIVF):
+            return self.faiss.SearchParametersIVF(nprobe=int(search_params.get("nprobe", RAG_FAISS_NPROBE)))
+        if isinstance(index, self.faiss.IndexHNSW):
+            return self.faiss.SearchParametersHNSW(efSearch=int(search_params.get("efSearch", RAG_FAISS_EF_SEARCH)))
+        return None
+
+    def query(self, query_embeddings, n_results: int, include: List[str], where: Dict = None,
+              search_params: Dict = None) -> Dict:
+        """Nearest neighbours (squared L2, like Chroma's default space), filtered by where.
+
+        Filtered queries over-fetch candidates and drop non-matching rows,
+        so a very selective filter can return fewer than n_results.
+        """
+        generation = self.generation
+        if not generation or not len(generation):
+            return {"ids": [[] for _ in query_embeddings], "metadatas": [[] for _ in query_embeddings],
+                    "distances": [[] for _ in query_embeddings]}
+        queries = np.ascontiguousarray(np.asarray(query_embeddings, dtype=np.float32))
+        fetch = min(len(generation), n_results * (RAG_FAISS_FILTER_OVERSAMPLE if where else 1))
+        params = self._search_params(generation.index, search_params)
+        distances, labels = generation.index.search(queries, fetch, params=params) if params \
+            else generation.index.search(queries, fetch)
+
+        results = {"ids": [], "metadatas": [], "distances": []}
+        for row_distances, row_labels in zip(distances, labels):
+            ids, metadatas, kept = [], [], []
+            for distance, label in zip(row_distances, row_labels):
+                if label < 0:
+                    continue
+                doc_id, metadata = generation.row(int(label))
+                if not matches_where(metadata, where):
+                    continue
+                ids.append(doc_id)
+                metadatas.append(metadata)
+                kept.append(float(distance))
+                if len(ids) == n_results:
+                    break
+            results["ids"].append(ids)
+            results["metadatas"].append(metadatas)
+            results["distances"].append(kept)
+        return results
+
+    def stats(self) -> Dict:
+        generation = self.generation
+        return {
+            "backend": self.name,
+            "index_type": type(generation.index).__name__ if generation else None,
+            "count": self.count(),
+            "pending_writes": len(self._pending),
+            "generation": os.path.basename(generation.directory) if generation else None
+        }
@@ -1,6 +1,6 @@
 import asyncio
 import json
-from typing import Dict, List, Set
+from typing import Callable, Dict, List, Optional, Set
 from fastapi import WebSocket
 import time
 
@@ -11,7 +11,8 @@ class AgentWebSocketManager:
         self.agent_states: Dict[str, Dict] = {
             "creative": {"status": "idle", "progress": 0, "message": "Ready"},
             "finance": {"status": "idle", "progress": 0, "message": "Ready"}, 
-            "inventory": {"status": "idle", "progress": 0, "message": "Ready"}
+            "inventory": {"status": "idle", "progress": 0, "message": "Ready"},
+            "lead": {"status": "idle", "progress": 0, "message": "Ready"}
         }
     
     async def connect(self, websocket: WebSocket, client_id: str):
@@ -82,5 +83,83 @@ class AgentWebSocketManager:
             "timestamp": time.time()
         })
 
+    def open_stream(self, client_id: str) -> "ClientStream":
+        """Open an ordered message stream to one client for a campaign run"""
+        return ClientStream(self, client_id)
+
+
+class ClientStream:
+    """Ordered, thread-safe pipe from agent workers to a single client.
+
+    Agents run on executor threads, so they never touch the socket directly:
+    emit() hands messages to the event loop and one sender task delivers
+    them in the order they were produced.
+    """
+
+    def __init__(self, manager: AgentWebSocketManager, client_id: str):
+        self.manager = manager
+        self.client_id = client_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.sender = self.loop.create_task(self._drain())
+
+    def emit(self, message: Optional[dict]):
+        """Queue a message for the client (safe to call from any thread)"""
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, message)
+
+    def agent_status(self, agent_name: str, status: str, progress: int = 0, message: str = ""):
+        """Per-client equivalent of update_agent_status"""
+        self.emit({
+            "type": "agent_update",
+            "agent": agent_name,
+            "data": {
+                "status": status,
+                "progress": progress,
+                "message": message,
+                "timestamp": time.time()
+            }
+        })
+
+    def agent_result(self, agent_name: str, output: str):
+        """Send an agent's final formatted output"""
+        self.emit({
+            "type": "agent_result",
+            "agent": agent_name,
+            "output": output,
+            "timestamp": time.time()
+        })
+
+    def collaboration_event(self, event_type: str, data: dict):
+        """Per-client equivalent of collaboration_event"""
+        self.emit({
+            "type": "collaboration",
+            "event": event_type,
+            "data": data,
+            "timestamp": time.time()
+        })
+
+    def token_callback(self, agent_name: str) -> Callable[[str], None]:
+        """Build an on_token callback that streams LLM chunks for an agent"""
+        def on_token(text: str):
+            self.emit({
+                "type": "agent_token",
+                "agent": agent_name,
+                "text": text,
+                "timestamp": time.time()
+            })
+        return on_token
+
+    async def _drain(self):
+        while True:
+            message = await self.queue.get()
+            if message is None:
+                break
+            await self.manager.send_to_client(self.client_id, message)
+
+    async def close(self):
+        """Flush pending messages and stop the sender"""
+        self.emit(None)
+        await self.sender
+
 # Global WebSocket manager
 ws_manager = AgentWebSocketManager()